@@ -0,0 +1,339 @@
+"""
+read Chrome's localStorage straight from its LevelDB directory, read-only and
+in pure python: the write-ahead .log files, the .ldb tables with their
+Snappy-compressed blocks, and the MANIFEST that says which of them are live.
+Chrome keeps the directory locked, so it is read from a copy
+"""
+
+# core libraries
+import os
+import shutil
+import struct
+import tempfile
+
+# the magic number at the end of every table file
+TABLE_MAGIC = 0xdb4775248b80fb57
+
+# the records of .log and MANIFEST files are written in blocks of this size
+LOG_BLOCK = 32768
+FULL, FIRST, MIDDLE, LAST = 1, 2, 3, 4
+
+# value types in internal keys and write batches
+DELETION, VALUE = 0, 1
+
+# tags of the version edits in the MANIFEST
+LOG_NUMBER, PREV_LOG_NUMBER, DELETED_FILE, NEW_FILE = 2, 9, 6, 7
+
+
+class CorruptionError(ValueError):
+    pass
+
+
+def _crc32c_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ (0x82f63b78 if crc & 1 else 0)
+        table.append(crc)
+    return table
+
+_CRC_TABLE = _crc32c_table()
+
+
+def crc32c(data, crc=0):
+    crc ^= 0xffffffff
+    for byte in data:
+        crc = _CRC_TABLE[(crc ^ byte) & 0xff] ^ (crc >> 8)
+    return crc ^ 0xffffffff
+
+
+def unmask(crc):
+    """ leveldb stores checksums masked, so that checksums of checksums work """
+    rotated = (crc - 0xa282ead8) & 0xffffffff
+    return ((rotated >> 17) | (rotated << 15)) & 0xffffffff
+
+
+def varint(data, position):
+    """ the varint at position, and the position after it """
+    result = shift = 0
+    while True:
+        if position >= len(data):
+            raise CorruptionError('truncated varint')
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+
+def _prefixed(data, position):
+    """ a varint-length-prefixed slice, and the position after it """
+    length, position = varint(data, position)
+    if position + length > len(data):
+        raise CorruptionError('truncated slice')
+    return data[position : position + length], position + length
+
+
+def snappy_decompress(data):
+    """ decompress a raw (unframed) Snappy block """
+    length, position = varint(data, 0)
+    out = bytearray()
+    while position < len(data):
+        tag = data[position]
+        position += 1
+        kind = tag & 3
+        if kind == 0:
+            size = tag >> 2
+            if size >= 60:
+                extra = size - 59
+                size = int.from_bytes(data[position : position + extra], 'little')
+                position += extra
+            size += 1
+            out += data[position : position + size]
+            position += size
+            continue
+        if kind == 1:
+            size = 4 + ((tag >> 2) & 7)
+            offset = ((tag >> 5) << 8) | data[position]
+            position += 1
+        elif kind == 2:
+            size = (tag >> 2) + 1
+            offset = int.from_bytes(data[position : position + 2], 'little')
+            position += 2
+        else:
+            size = (tag >> 2) + 1
+            offset = int.from_bytes(data[position : position + 4], 'little')
+            position += 4
+        if not 0 < offset <= len(out):
+            raise CorruptionError('bad snappy copy offset')
+        start = len(out) - offset
+        if offset >= size:
+            out += out[start : start + size]
+        else:
+            # an overlapping copy repeats the last offset bytes
+            for index in range(size):
+                out.append(out[start + index])
+    if len(out) != length:
+        raise CorruptionError('snappy length mismatch')
+    return bytes(out)
+
+
+def log_records(data, verify=True):
+    """
+    the records of a .log or MANIFEST file. A torn or corrupt record at the end,
+    as left by a writer that is still running, ends the file quietly
+    """
+    position = 0
+    pending = None
+    while position + 7 <= len(data):
+        left = LOG_BLOCK - position % LOG_BLOCK
+        if left < 7:
+            # the tail of a block too short for a header is padding
+            position += left
+            continue
+        checksum, length, kind = struct.unpack_from('<IHB', data, position)
+        start = position + 7
+        payload = data[start : start + length]
+        if kind == 0 and length == 0 or len(payload) < length:
+            return
+        if verify and crc32c(payload, crc32c(bytes([kind]))) != unmask(checksum):
+            return
+        position = start + length
+        if kind == FULL:
+            pending = None
+            yield payload
+        elif kind == FIRST:
+            pending = bytearray(payload)
+        elif kind == MIDDLE and pending is not None:
+            pending += payload
+        elif kind == LAST and pending is not None:
+            pending += payload
+            yield bytes(pending)
+            pending = None
+
+
+def batch_entries(record):
+    """ the (sequence, type, key, value) entries of a write batch """
+    sequence, count = struct.unpack_from('<QI', record, 0)
+    position = 12
+    for index in range(count):
+        kind = record[position]
+        key, position = _prefixed(record, position + 1)
+        value = b''
+        if kind == VALUE:
+            value, position = _prefixed(record, position)
+        elif kind != DELETION:
+            raise CorruptionError('unknown write batch entry')
+        yield sequence + index, kind, key, value
+
+
+def _block(data, offset, size, verify=True):
+    """ the contents of a table block, checked and decompressed """
+    contents = data[offset : offset + size]
+    kind, checksum = struct.unpack_from('<BI', data, offset + size)
+    if verify and crc32c(data[offset : offset + size + 1]) != unmask(checksum):
+        raise CorruptionError('block checksum mismatch')
+    if kind == 1:
+        return snappy_decompress(contents)
+    if kind != 0:
+        raise CorruptionError('unknown block compression')
+    return contents
+
+
+def block_entries(block):
+    """ the (key, value) entries of a table block, undoing the key prefix compression """
+    restarts = struct.unpack_from('<I', block, len(block) - 4)[0]
+    end = len(block) - 4 - 4 * restarts
+    position = 0
+    key = b''
+    while position < end:
+        shared, position = varint(block, position)
+        unshared, position = varint(block, position)
+        size, position = varint(block, position)
+        key = key[:shared] + block[position : position + unshared]
+        position += unshared
+        yield key, block[position : position + size]
+        position += size
+
+
+def _may_hold(low, high, prefixes):
+    """ True if a block whose keys lie between low and high may hold keys starting with any of the prefixes """
+    return any(high >= prefix and (low <= prefix or low.startswith(prefix)) for prefix in prefixes)
+
+
+def table_entries(data, verify=True, prefixes=None):
+    """
+    the (sequence, type, key, value) entries of an .ldb table. Given key
+    prefixes, the data blocks that cannot hold keys starting with any of them
+    are skipped, unread and unchecked
+    """
+    if len(data) < 48 or struct.unpack_from('<Q', data, len(data) - 8)[0] != TABLE_MAGIC:
+        raise CorruptionError('not a table file')
+    footer = data[-48:]
+    _, position = varint(footer, 0)
+    _, position = varint(footer, position)
+    index_offset, position = varint(footer, position)
+    index_size, position = varint(footer, position)
+    low = b''
+    for separator, handle in block_entries(_block(data, index_offset, index_size, verify)):
+        # each block's keys are at most its separator, and at least the one before
+        high = separator[:-8]
+        skip = prefixes is not None and not _may_hold(low, high, prefixes)
+        low = high
+        if skip:
+            continue
+        offset, position = varint(handle, 0)
+        size, position = varint(handle, position)
+        for internal, value in block_entries(_block(data, offset, size, verify)):
+            tag = struct.unpack_from('<Q', internal, len(internal) - 8)[0]
+            yield tag >> 8, tag & 0xff, internal[:-8], value
+
+
+def live_files(directory):
+    """
+    the numbers of the live table files, and the oldest live log number, from
+    the MANIFEST named in CURRENT. None if there is no usable MANIFEST
+    """
+    try:
+        with open(os.path.join(directory, 'CURRENT'), 'r') as infile:
+            manifest = infile.read().strip()
+        with open(os.path.join(directory, manifest), 'rb') as infile:
+            data = infile.read()
+    except OSError:
+        return None
+    tables = set()
+    log_number = 0
+    prev_log_number = None
+    for record in log_records(data):
+        position = 0
+        while position < len(record):
+            tag, position = varint(record, position)
+            if tag in (LOG_NUMBER, PREV_LOG_NUMBER, 3, 4):
+                number, position = varint(record, position)
+                if tag == LOG_NUMBER:
+                    log_number = number
+                elif tag == PREV_LOG_NUMBER:
+                    prev_log_number = number
+            elif tag == 1:
+                _, position = _prefixed(record, position)
+            elif tag == 5:
+                _, position = varint(record, position)
+                _, position = _prefixed(record, position)
+            elif tag == DELETED_FILE:
+                _, position = varint(record, position)
+                number, position = varint(record, position)
+                tables.discard(number)
+            elif tag == NEW_FILE:
+                _, position = varint(record, position)
+                number, position = varint(record, position)
+                _, position = varint(record, position)
+                _, position = _prefixed(record, position)
+                _, position = _prefixed(record, position)
+                tables.add(number)
+            else:
+                raise CorruptionError('unknown MANIFEST tag %d' % tag)
+    if prev_log_number:
+        log_number = min(log_number, prev_log_number)
+    return tables, log_number
+
+
+def read_leveldb(directory, verify=True, prefixes=None):
+    """
+    the live contents of a LevelDB directory, as a dict of key: value. For each
+    key, the entry with the highest sequence number wins, and deletions remove it.
+    Given key prefixes, only the keys starting with one of them are read.
+    With verify, the checksum of every record and block read is checked
+    """
+    live = live_files(directory)
+    newest = {}
+    for name in sorted(os.listdir(directory)):
+        stem, _, extension = name.partition('.')
+        if not stem.isdigit() or extension not in ('log', 'ldb', 'sst'):
+            continue
+        number = int(stem)
+        if live is not None and (number < live[1] if extension == 'log' else number not in live[0]):
+            continue
+        with open(os.path.join(directory, name), 'rb') as infile:
+            data = infile.read()
+        if extension == 'log':
+            entries = (entry for record in log_records(data, verify) for entry in batch_entries(record))
+        else:
+            entries = table_entries(data, verify, prefixes)
+        for sequence, kind, key, value in entries:
+            if prefixes is not None and not key.startswith(prefixes):
+                continue
+            if key not in newest or newest[key][0] < sequence:
+                newest[key] = (sequence, kind, value)
+    return dict((key, value) for (key, (_, kind, value)) in newest.items() if kind == VALUE)
+
+
+def decode_string(value):
+    """ localStorage strings are stored with a leading byte: 0 for UTF-16LE, 1 for Latin-1 """
+    if value[:1] == b'\x00':
+        return value[1:].decode('utf-16le')
+    if value[:1] == b'\x01':
+        return value[1:].decode('latin-1')
+    raise ValueError('unknown Chrome localStorage string format: %r' % value[:16])
+
+
+def local_storage(directory, origins=('https://tenhou.net', 'http://tenhou.net'), copy=True, verify=True):
+    """
+    the localStorage items of the given origins, as a dict of key: value strings,
+    read from a copy of Chrome's Local Storage/leveldb directory, so that it
+    works while Chrome is running. Only the table blocks that may hold the
+    origins' items are read; verify=False skips checking their checksums too
+    """
+    if copy:
+        with tempfile.TemporaryDirectory() as scratch:
+            snapshot = os.path.join(scratch, 'leveldb')
+            shutil.copytree(directory, snapshot, ignore=shutil.ignore_patterns('LOCK'))
+            return local_storage(snapshot, origins, copy=False, verify=verify)
+    prefixes = tuple(b'_' + origin.encode() + b'\x00' for origin in origins)
+    items = {}
+    for key, value in read_leveldb(directory, verify, prefixes).items():
+        for prefix in prefixes:
+            if key.startswith(prefix):
+                items[decode_string(key[len(prefix):])] = decode_string(value)
+    return items
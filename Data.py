@@ -14,6 +14,9 @@ def asdata(obj, asdata):
             return obj
 
 class Data:
+    # no __dict__ of its own, so that subclasses can use __slots__
+    __slots__ = ()
+
     def asdata(self, asdata = asdata):
         return dict((k, asdata(v, asdata)) for (k, v) in self.__dict__.items())
     
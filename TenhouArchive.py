@@ -0,0 +1,166 @@
+"""
+load the archived logs, and fan work on them out over processes in key order
+"""
+
+# core libraries
+from concurrent.futures import ProcessPoolExecutor
+import lzma
+import multiprocessing
+import os
+import pickle
+
+# own imports
+from TenhouConfig import directory_name
+
+_cancel = None
+
+# ordered_map takes the items this many at a time when running in one process
+SERIAL_SHARD = 256
+
+# the archives kept in memory by path, as (mtime, size, logs), once keep_loaded is called
+_resident = None
+
+
+def keep_loaded():
+    """
+    keep each archive in memory once loaded, as a long-running process wants,
+    and only read it again when its file changes. The logs returned by load are
+    then shared between callers, so must not be changed
+    """
+    global _resident
+    if _resident is None:
+        _resident = {}
+
+
+def kept_loaded():
+    """ True if archives are being kept in memory between loads """
+    return _resident is not None
+
+
+def _read(path):
+    with lzma.open(path, 'rb') as infile:
+        return pickle.load(infile)
+
+
+def load(player, directory=directory_name):
+    """ load the archive of logs for one account """
+    path = directory + player + '.pickle.7z'
+    if _resident is None:
+        return _read(path)
+    stat = os.stat(path)
+    held = _resident.get(path)
+    if held is not None and held[:2] == (stat.st_mtime_ns, stat.st_size):
+        return held[2]
+    logs = _read(path)
+    if held is not None:
+        # games never change once archived, so keep the copies already held,
+        # and only the new games take up more memory
+        old = held[2]
+        logs = dict((key, old.get(key, log)) for key, log in logs.items())
+    _resident[path] = (stat.st_mtime_ns, stat.st_size, logs)
+    return logs
+
+
+def in_range(key, since=None, before=None):
+    """
+    True if the game key falls within the date range, both yyyymmdd:
+    games on the since date are included, those on the before date are not
+    """
+    if since and since > key[0:8]:
+        return False
+    if before and before <= key[0:8]:
+        return False
+    return True
+
+
+def shards(items, count):
+    """ split a list of (key, log) pairs into at most count contiguous key ranges """
+    if not items:
+        return []
+    size = -(-len(items) // max(1, count))
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def _init_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+
+def _run_shard(func, items, args, prepare=None):
+    """ apply func to each item in the shard, stopping early if cancelled """
+    if prepare is not None:
+        prepare(items)
+    out = []
+    for key, log in items:
+        if _cancel is not None and _cancel.is_set():
+            break
+        result = func(key, log, *args)
+        if result is not None:
+            out.append(result)
+    return out
+
+
+def map_shards(func, items, jobs=1, args=()):
+    """
+    call func(shard, *args) on contiguous key-range shards of the (key, log) pairs,
+    one shard per job, and yield the results in key order
+    """
+    if jobs <= 1:
+        yield func(items, *args)
+        return
+    with ProcessPoolExecutor(jobs) as pool:
+        for result in pool.map(func, shards(items, jobs), *([arg] * jobs for arg in args)):
+            yield result
+
+
+def ordered_map(func, items, jobs=1, limit=None, args=(), shards_per_job=4, prepare=None):
+    """
+    call func(key, log, *args) for each (key, log) pair and yield the results
+    that are not None, in key order.
+
+    With jobs > 1, the items are split into key-range shards that run in a
+    process pool. The results of a shard are yielded as soon as it and every
+    shard before it have finished. Once limit results have been yielded, the
+    remaining shards are cancelled: queued ones never start, and running ones
+    stop at their next log.
+
+    prepare(shard), if given, is called with each shard's list of items just
+    before func is applied to them, in the same process. With one job, the
+    items are taken SERIAL_SHARD at a time, so that it only sees what is needed
+    """
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    if jobs <= 1:
+        for start in range(0, len(items), SERIAL_SHARD):
+            shard = items[start : start + SERIAL_SHARD]
+            if prepare is not None:
+                prepare(shard)
+            for key, log in shard:
+                result = func(key, log, *args)
+                if result is None:
+                    continue
+                yield result
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+        return
+
+    cancel = multiprocessing.Event()
+    pool = ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(cancel,))
+    futures = []
+    try:
+        futures = [pool.submit(_run_shard, func, shard, args, prepare)
+                   for shard in shards(items, jobs * shards_per_job)]
+        for future in futures:
+            for result in future.result():
+                yield result
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+    finally:
+        cancel.set()
+        # shutdown(cancel_futures=True) is only in python 3.9 and later
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
@@ -0,0 +1,117 @@
+"""
+a persistent cache of raw mjlog2xml.cgi responses, keyed by game ID. Finished
+games never change, so once a game is downloaded it need never be fetched again.
+Responses are stored compressed in one sqlite file, each with a sha256 of its
+content that is checked on every read, and the least recently used are evicted
+once the cache grows beyond its size limit
+"""
+
+# core libraries
+import hashlib
+import sqlite3
+import time
+import zlib
+
+DEFAULT_SIZE = 500 * 1024 * 1024
+
+
+class ResponseCache():
+    """
+            the cache of downloaded games, in the sqlite file at path,
+            holding at most max_bytes of compressed responses
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(path)
+        # so that the rows replaced by INSERT OR REPLACE fire the delete trigger
+        self._db.execute('PRAGMA recursive_triggers = ON')
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, '
+                'sha256 TEXT NOT NULL, used REAL NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+            # the total size of the responses, kept up to date by triggers, so
+            # that it never needs summing over the table
+            if not self._db.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'total'").fetchone():
+                self._db.execute('CREATE TABLE total (bytes INTEGER NOT NULL)')
+                self._db.execute('INSERT INTO total SELECT COALESCE(SUM(size), 0) FROM responses')
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS responses_added AFTER INSERT ON responses '
+                'BEGIN UPDATE total SET bytes = bytes + NEW.size; END')
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS responses_removed AFTER DELETE ON responses '
+                'BEGIN UPDATE total SET bytes = bytes - OLD.size; END')
+
+
+    def get(self, key):
+        """ the cached response for a game, or None if it is missing or fails its hash check """
+        row = self._db.execute('SELECT body, sha256 FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            content = zlib.decompress(row[0])
+        except zlib.error:
+            content = None
+        if content is None or hashlib.sha256(content).hexdigest() != row[1]:
+            print('WARNING: dropping corrupt cache entry for %s' % key)
+            self.discard(key)
+            return None
+        with self._db:
+            self._db.execute('UPDATE responses SET used = ? WHERE key = ?', (time.time(), key))
+        return content
+
+
+    def put(self, key, content):
+        """ store a response, then evict the least recently used until the cache fits """
+        body = zlib.compress(content, 6)
+        if len(body) > self.max_bytes:
+            return
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (key, body, size, sha256, used) VALUES (?, ?, ?, ?, ?)',
+                (key, body, len(body), hashlib.sha256(content).hexdigest(), time.time()))
+            self._evict()
+
+
+    def discard(self, key):
+        with self._db:
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+
+
+    def size(self):
+        """ the total size of the stored (compressed) responses, in bytes """
+        return self._db.execute('SELECT bytes FROM total').fetchone()[0]
+
+
+    def __contains__(self, key):
+        return self._db.execute('SELECT 1 FROM responses WHERE key = ?', (key,)).fetchone() is not None
+
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+    def _evict(self):
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        doomed = []
+        for key, size in self._db.execute('SELECT key, size FROM responses ORDER BY used'):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany('DELETE FROM responses WHERE key = ?', doomed)
+
+
+    def close(self):
+        self._db.close()
+
+
+def is_mjlog(content):
+    """ True if a response looks like a game log, rather than an error page """
+    return b'<mjloggm' in content[:256]
@@ -0,0 +1,189 @@
+"""
+columnar tables of rounds and agari, for numpy statistics over whole archives.
+
+There are three tables, each a dict of equal-length numpy arrays:
+
+    game:   key, seat (of the archive's account, -1 if absent), rounds (count)
+    round:  game (row in the game table), dealer, wind (0=east .. 3=north),
+            number (0-3 within the wind), honba, riichi (sticks left over),
+            deltas (n x 4), reach_turn (n x 4, -1 if no riichi),
+            reach_order (n x 4, 0 for first to riichi, -1 if no riichi),
+            ryuukyoku (0 if won, else 1 + index into RYUUKYOKU)
+    agari:  game, round (row in the round table), winner, from_player (-1 for tsumo),
+            fu, points, limit (index into Game.LIMITS), closed,
+            yaku (bitmask of the ids, as in Game.YAKU, of the yaku worth any han and
+            of the yakuman), han (excluding yakuman)
+
+Stats then become numpy expressions, e.g. the mean win of a closed hand:
+    tables['agari']['points'][tables['agari']['closed']].mean()
+
+Tables are saved either to one .npz file, or to a directory of .npy files
+(one per column, named table.column.npy) that can be memory-mapped. Tables
+saved by an older VERSION are not loaded, so that every game is exported again.
+"""
+
+# core libraries
+import os
+
+# third-party libraries
+import numpy as np
+
+# own imports
+import TenhouDecoder
+
+# bump this whenever a change would make saved tables hold different values
+VERSION = 2
+
+RYUUKYOKU = (True, 'yao9', 'reach4', 'ron3', 'kan4', 'kaze4', 'nm')
+
+COLUMNS = {
+    'game': {'key': None, 'seat': np.int8, 'rounds': np.int16},
+    'round': {
+        'game': np.int64, 'dealer': np.int8, 'wind': np.int8, 'number': np.int8,
+        'honba': np.int16, 'riichi': np.int16, 'deltas': np.int32,
+        'reach_turn': np.int16, 'reach_order': np.int8, 'ryuukyoku': np.int8},
+    'agari': {
+        'game': np.int64, 'round': np.int64, 'winner': np.int8, 'from_player': np.int8,
+        'fu': np.int16, 'points': np.int32, 'limit': np.int8, 'closed': np.bool_,
+        'yaku': np.uint64, 'han': np.int16},
+}
+
+WIDE = ('deltas', 'reach_turn', 'reach_order')
+
+
+def game_rows(key, log, player):
+    """
+    decode one game into rows for the three tables, as plain python tuples.
+    Game and round numbers are local to the game; append() renumbers them
+    """
+    game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=False)
+    game.decode(log['content'])
+    rounds = []
+    agaris = []
+    for round_index, round in enumerate(getattr(game, 'rounds', ())):
+        name, honba, riichi = round.round
+        name_index = TenhouDecoder.Game.ROUND_NAMES.index(name)
+        reach_turn = [-1] * 4
+        reach_order = [-1] * 4
+        for order, (seat, turn) in enumerate(zip(round.reaches, round.reach_turns)):
+            reach_turn[seat] = turn
+            reach_order[seat] = order
+        deltas = list(round.deltas) + [0] * (4 - len(round.deltas))
+        ryuukyoku = 0 if round.ryuukyoku is False else 1 + RYUUKYOKU.index(round.ryuukyoku)
+        rounds.append((0, round.dealer, name_index // 4, name_index % 4, honba, riichi,
+                       deltas, reach_turn, reach_order, ryuukyoku))
+        for agari in round.agari:
+            yaku_mask = 0
+            han = 0
+            for yaku, yaku_han in agari.yaku:
+                # dora, aka and uradora are listed with 0 han when the hand has none
+                if yaku_han:
+                    yaku_mask |= 1 << yaku
+                    han += yaku_han
+            for yakuman in agari.yakuman:
+                yaku_mask |= 1 << yakuman
+            agaris.append((
+                0, round_index, agari.player,
+                agari.fromPlayer if agari.type == 'RON' else -1,
+                agari.fu, agari.points,
+                TenhouDecoder.Game.LIMITS.index(agari.limit),
+                agari.closed, yaku_mask, han))
+    seat = log['uname'].index(player) if player in log['uname'] else -1
+    return (key, seat, len(rounds)), rounds, agaris
+
+
+def empty():
+    """ tables with no rows """
+    tables = {}
+    for table, columns in COLUMNS.items():
+        tables[table] = {}
+        for column, dtype in columns.items():
+            if column == 'key':
+                tables[table][column] = np.array([], dtype='U32')
+            elif column in WIDE:
+                tables[table][column] = np.zeros((0, 4), dtype=dtype)
+            else:
+                tables[table][column] = np.zeros(0, dtype=dtype)
+    return tables
+
+
+def _stack(table, rows):
+    """ turn a list of row tuples into a dict of numpy columns """
+    out = {}
+    for position, (column, dtype) in enumerate(COLUMNS[table].items()):
+        values = [row[position] for row in rows]
+        if column == 'key':
+            out[column] = np.array(values, dtype='U32')
+        elif column in WIDE:
+            out[column] = np.array(values, dtype=dtype).reshape(-1, 4)
+        else:
+            out[column] = np.array(values, dtype=dtype)
+    return out
+
+
+def append(tables, games):
+    """
+    add decoded games (as returned by game_rows) to the tables,
+    renumbering their game and round references, and return the new tables
+    """
+    new_games = []
+    round_rows = []
+    agari_rows = []
+    game_offset = len(tables['game']['key'])
+    round_offset = len(tables['round']['game'])
+    for game, rounds, agaris in games:
+        game_index = game_offset + len(new_games)
+        first_round = round_offset + len(round_rows)
+        new_games.append(game)
+        round_rows.extend((game_index,) + row[1:] for row in rounds)
+        agari_rows.extend((game_index, first_round + row[1]) + row[2:] for row in agaris)
+    new = {'game': _stack('game', new_games),
+           'round': _stack('round', round_rows),
+           'agari': _stack('agari', agari_rows)}
+    return {
+        table: {column: np.concatenate((tables[table][column], new[table][column]))
+                for column in COLUMNS[table]}
+        for table in COLUMNS}
+
+
+def save(tables, path):
+    """ save to a .npz file, or else to a directory of .npy files """
+    flat = {'%s.%s' % (table, column): values
+            for table, columns in tables.items() for column, values in columns.items()}
+    flat['version'] = np.array(VERSION)
+    if path.endswith('.npz'):
+        np.savez(path, **flat)
+        return
+    os.makedirs(path, exist_ok=True)
+    for name, values in flat.items():
+        np.save(os.path.join(path, name + '.npy'), values)
+
+
+def load(path, mmap_mode=None):
+    """
+    load tables saved by save(). Empty tables if there is nothing there yet,
+    or if it was saved by an older VERSION.
+    mmap_mode (e.g. 'r') memory-maps the columns of a .npy directory
+    """
+    tables = empty()
+    if path.endswith('.npz'):
+        if not os.path.exists(path):
+            return tables
+        with np.load(path) as saved:
+            if 'version' not in saved.files or saved['version'] != VERSION:
+                return tables
+            for name in saved.files:
+                if name == 'version':
+                    continue
+                table, column = name.split('.', 1)
+                tables[table][column] = saved[name]
+        return tables
+    version = os.path.join(path, 'version.npy')
+    if not os.path.exists(version) or np.load(version) != VERSION:
+        return tables
+    for table, columns in COLUMNS.items():
+        for column in columns:
+            filename = os.path.join(path, '%s.%s.npy' % (table, column))
+            if os.path.exists(filename):
+                tables[table][column] = np.load(filename, mmap_mode=mmap_mode)
+    return tables
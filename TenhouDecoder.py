@@ -4,8 +4,10 @@
 
 from inspect import getsourcefile
 import json
+import mmap
 import os
 import re
+from time import perf_counter
 import urllib.parse
 import xml.etree.ElementTree as etree
 
@@ -28,9 +30,26 @@ class Tile(Data, int):
         wd gd rd
     """.split()
 
-    def asdata(self, ignored):
+    # tiles are flyweights: Tile(n) gives the one shared instance for each of the
+    # 136 tile IDs, given as an int or a string, so decoding allocates no tiles
+    __slots__ = ()
+    _interned = {}
+
+    def __new__(cls, value):
+        try:
+            return cls._interned[value]
+        except KeyError:
+            return int.__new__(cls, value)
+
+    def asdata(self, ignored=None):
+        if 0 <= self < len(self.NAMES):
+            return self.NAMES[self]
         return self.TILES[self // 4] + str(self % 4)
 
+Tile.NAMES = tuple(Tile.TILES[n // 4] + str(n % 4) for n in range(136))
+for n in range(136):
+    Tile._interned[n] = Tile._interned[str(n)] = int.__new__(Tile, n)
+
 class Player(Data):
     def __init__(self):
         self.name = ""
@@ -48,10 +67,12 @@ class Round(Data):
         self.events = []
         self.ryuukyoku = False # Can also be a string, if it's special
         self.ryuukyoku_tenpai = None
+        self.ryuukyoku_hands = [] # Tile tuples revealed by the players in ryuukyoku_tenpai
         self.reaches = [] # What turn it was when each player reached
         self.reach_turns = [] # What turns reaches happened on
         self.turns = [0, 0, 0, 0] # What turn it is for each player
         self.deltas = [] # Score changes
+        self.scores = tuple() # Scores at the start of the round, in hundreds
 
 class Meld(Data):
     @classmethod
@@ -136,7 +157,9 @@ class Call(Event):
         self.player = 0
 
 class Riichi(Event):
-    pass
+    def __init__(self, events):
+        Event.__init__(self, events)
+        self.player = 0
 
 class Agari(Data):
     def __init__(self):
@@ -152,8 +175,10 @@ class Agari(Data):
         self.closed = True
         self.uradora = tuple() # of Tile
         self.fromPlayer = 0 # only meaningful if type == "RON"
-        self.yaku = tuple() # of strings
-        self.yakuman = tuple() # of strings
+        self.paoPlayer = None # the player liable for the yakuman, if any
+        self.deltas = [] # Score changes from this win, in hundreds
+        self.yaku = tuple() # of (yaku ID, han); see Game.yaku_name for the names, which Game.asdata gives
+        self.yakuman = tuple() # of yaku IDs
 
 class Game(Data):
     RANKS = "新人,9級,8級,7級,6級,5級,4級,3級,2級,1級,初段,二段,三段,四段,五段,六段,七段,八段,九段,十段,天鳳位".split(",")
@@ -228,10 +253,19 @@ class Game(Data):
         54:'赤ドラ',         # akadora
         }
 
+    # the name of each yaku ID, by language; filled in from YAKU_NAMES below
+    YAKU_LABELS = {}
+
     LIMITS = ",mangan,haneman,baiman,sanbaiman,yakuman".split(",")
 
     TAGS = {}
 
+    # a DecoderProfile while decode is being profiled
+    profiler = None
+
+    # a str starting with markup is a log, anything else the name of a file
+    MARKUP = re.compile(r'[\s\ufeff]*<')
+
     def __init__(self, lang, suppress_draws=False):
         self.suppress_draws = suppress_draws
         self.lang = lang
@@ -281,6 +315,8 @@ class Game(Data):
         self.round.dealer = int(data["oya"])
         self.round.hands = tuple(self.decodeList(data[hand], Tile) for hand in self.HANDS if hand in data and data[hand])
         self.round.round = self.ROUND_NAMES[name % len(self.ROUND_NAMES)], combo, riichi
+        if "ten" in data:
+            self.round.scores = self.decodeList(data["ten"])
 
         Dora(self.round.events).tile = Tile(dora)
 
@@ -312,6 +348,7 @@ class Game(Data):
             for index, attr_name in enumerate(self.HANDS):
                 if attr_name in data:
                     tenpai.append(index)
+                    self.round.ryuukyoku_hands.append(self.decodeList(data[attr_name], Tile))
 
     def tagAGARI(self, tag, data):
         agari = Agari()
@@ -321,7 +358,7 @@ class Game(Data):
         agari.hand = self.decodeList(data["hai"], Tile)
 
         deltas = data['sc'].split(',')
-        self.round.deltas = [int(deltas[x]) for x in range(1,8,2)]
+        self.round.deltas = agari.deltas = [int(deltas[x]) for x in range(1,8,2)]
 
         agari.fu, agari.points, limit = self.decodeList(data["ten"])
         if limit:
@@ -333,24 +370,25 @@ class Game(Data):
             agari.closed = all(not hasattr(meld, "fromPlayer") for meld in agari.melds)
         else:
             agari.closed = True
-        if "dorahaiUra" in data:
-            agari.uradora = self.decodeList(data["uradoraHai"], Tile)
+        if "doraHaiUra" in data:
+            agari.uradora = self.decodeList(data["doraHaiUra"], Tile)
         if agari.type == "RON":
             agari.fromPlayer = int(data["fromWho"])
+        if "paoWho" in data:
+            agari.paoPlayer = int(data["paoWho"])
         if "yaku" in data:
             yakuList = self.decodeList(data["yaku"])
-            agari.yaku = tuple(
-                (self.YAKU_NAMES[self.YAKU[yaku]][self.lang], han)
-                for yaku, han in zip(yakuList[::2], yakuList[1::2]))
+            agari.yaku = tuple(zip(yakuList[::2], yakuList[1::2]))
         if "yakuman" in data:
-            agari.yakuman = tuple(
-                self.YAKU_NAMES[self.YAKU[yaku]][self.lang]
-                for yaku in self.decodeList(data["yakuman"]))
+            agari.yakuman = self.decodeList(data["yakuman"])
         if 'owari' in data:
             self.owari = data['owari']
 
     def tagREACH(self, tag, data):
-        if 'ten' in data:
+        if 'ten' not in data:
+            # step 1, the call itself: the next discard is the riichi tile
+            Riichi(self.round.events).player = int(data['who'])
+        else:
             player = int(data['who'])
             self.round.reaches.append(player)
             self.round.reach_turns.append(self.round.turns[player])
@@ -372,24 +410,145 @@ class Game(Data):
         else:
             pass
 
+    @classmethod
+    def yaku_name(cls, yaku, lang='DEFAULT'):
+        """ the name of a yaku ID in a language (see LANGUAGES) """
+        return cls.YAKU_LABELS[lang][yaku]
+
+    @classmethod
+    def yaku_ids(cls, name):
+        """ the IDs of the yaku with this name in any language, ignoring case """
+        name = name.lower()
+        return frozenset(
+            yaku for labels in cls.YAKU_LABELS.values()
+            for (yaku, label) in enumerate(labels) if label.lower() == name)
+
+    def asdata(self, *args):
+        """ as Data.asdata, with the yaku of each win named in the game's language """
+        data = Data.asdata(self, *args)
+        for round in data.get('rounds', ()):
+            for agari in round['agari']:
+                agari['yaku'] = [[self.yaku_name(yaku, self.lang), han] for (yaku, han) in agari['yaku']]
+                agari['yakuman'] = [self.yaku_name(yaku, self.lang) for yaku in agari['yakuman']]
+        return data
+
     @staticmethod
     def decodeList(thislist, dtype=int):
         return tuple(dtype(i) for i in thislist.split(","))
 
-    def decode(self, log):
+    @staticmethod
+    def parse(log):
+        """
+        the root element of a log, and which input path gave it, or None and 'failed'.
+        The log may be the mjlog content as bytes or any buffer over it (bytearray,
+        memoryview, mmap), which is parsed in place without copying ('bytes'),
+        as a str ('string'), as a list or tuple of such pieces, to be parsed as
+        if joined ('parts'), or a file object or file name ('file')
+        """
         try:
-            events = etree.parse(log).getroot()
-        except:
-            try:
-                events = etree.fromstring(log)
-            except:
-                return
+            if isinstance(log, (list, tuple)):
+                parser = etree.XMLParser()
+                for part in log:
+                    parser.feed(part)
+                return parser.close(), 'parts'
+            if isinstance(log, str):
+                if Game.MARKUP.match(log):
+                    return etree.fromstring(log), 'string'
+                return etree.parse(log).getroot(), 'file'
+            if isinstance(log, (bytes, bytearray, memoryview, mmap.mmap)):
+                return etree.fromstring(log), 'bytes'
+            return etree.parse(log).getroot(), 'file'
+        except (etree.ParseError, OSError, TypeError, ValueError):
+            return None, 'failed'
+
+    def decode(self, log):
+        """ decode a log, given in any of the forms parse takes; bytes are quickest """
+        if Game.profiler is None:
+            events = self.parse(log)[0]
+            tags, default = self.TAGS, self.default
+        else:
+            # the same loop, through the profiler's timed parse and handlers
+            events = Game.profiler.parse(self, log)
+            tags, default = Game.profiler.tags, Game.profiler.default
+        if events is None:
+            return
         self.rounds = []
         self.players = []
         for event in events:
-            self.TAGS.get(event.tag, self.default)(self, event.tag, event.attrib)
+            tags.get(event.tag, default)(self, event.tag, event.attrib)
         del self.round
 
+class DecoderProfile():
+    """
+            opt-in instrumentation of Game.decode: calls and cumulative time
+            per tag handler, and per input path, aggregated across games.
+            Enable with Game.profiler = DecoderProfile(), and set it back to
+            None to stop; while it is None, decode only pays one attribute check
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.times = {}
+        self.games = 0
+        # Game.TAGS and Game.default, each wrapped to time itself
+        self.tags = dict((tag, self.timed(tag, handler)) for (tag, handler) in Game.TAGS.items())
+        self.default = self.timed(None, Game.default)
+
+    def _add(self, name, elapsed):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.times[name] = self.times.get(name, 0.0) + elapsed
+
+    @staticmethod
+    def handler_name(tag, handler):
+        """ the name a tag is reported under: its own for tags with a handler, else draw, discard or other """
+        if handler is not None:
+            return tag
+        if tag[0] in "DEFG":
+            return "discard"
+        if tag[0] in "TUVW":
+            return "draw"
+        return "other"
+
+    def timed(self, name, handler):
+        """ a tag handler that adds its time under name, or under handler_name for the default (name None) """
+        def timed_handler(game, tag, data):
+            start = perf_counter()
+            handler(game, tag, data)
+            self._add(name or self.handler_name(tag, None), perf_counter() - start)
+        return timed_handler
+
+    def parse(self, game, log):
+        """ Game.parse, counting the game and timing the parse; the root element, or None """
+        self.games += 1
+        start = perf_counter()
+        events, path = game.parse(log)
+        self._add('parse:' + path, perf_counter() - start)
+        return events
+
+    def merge(self, other):
+        """ add in the counts of another profile, e.g. from a worker process """
+        self.games += other.games
+        for name, calls in other.calls.items():
+            self.calls[name] = self.calls.get(name, 0) + calls
+            self.times[name] = self.times.get(name, 0.0) + other.times[name]
+        return self
+
+    def report(self):
+        """ (name, calls, total seconds, microseconds per call) for each handler and input path, slowest first """
+        return sorted(
+            ((name, self.calls[name], self.times[name], 1e6 * self.times[name] / self.calls[name])
+             for name in self.calls),
+            key=lambda row: -row[2])
+
+    def format(self):
+        total = sum(self.times.values())
+        lines = ['%d games, %.3f s' % (self.games, total),
+                 '%-16s %10s %10s %8s %6s' % ('handler', 'calls', 'seconds', 'us/call', 'share')]
+        for name, calls, seconds, per_call in self.report():
+            lines.append('%-16s %10d %10.3f %8.1f %5.1f%%' % (
+                name, calls, seconds, per_call, 100 * seconds / total if total else 0))
+        return '\n'.join(lines)
+
 # %% get the yaku translations from the tenhou translator ui
 
 thisdir = os.path.dirname(os.path.abspath(getsourcefile(lambda: 0)))
@@ -405,6 +564,14 @@ txt6 = re.sub(r'\n', '', txt5)
 txt7 = re.sub(r"\\'", "'", txt6)
 Game.YAKU_NAMES = json.loads(txt7)
 
+# yaku names are only looked up for output, from one tuple per language,
+# falling back to the default name where a language has none
+LANGUAGES = sorted(set(lang for names in Game.YAKU_NAMES.values() for lang in names))
+for lang in LANGUAGES:
+    Game.YAKU_LABELS[lang] = tuple(
+        Game.YAKU_NAMES[Game.YAKU[yaku]].get(lang, Game.YAKU_NAMES[Game.YAKU[yaku]]['DEFAULT'])
+        for yaku in range(len(Game.YAKU)))
+
 # %%
 
 for key in Game.__dict__:
@@ -0,0 +1,186 @@
+"""
+one fixed-width binary record per discard decision, for training models.
+
+Records are written with the numpy dtype DTYPE, one after another with no
+header, so a file can be opened with np.memmap(path, dtype=DTYPE, mode='r')
+or with open_shard(). Fields:
+
+    key         game key, ascii
+    round       index of the round in the game
+    seat        seat of the player discarding (0-3)
+    turn        number of tiles the player had discarded before this one
+    hand        the player's concealed tiles, as 34 counts, including the drawn tile
+    red         red fives in that hand: bit 0 man, 1 pin, 2 sou
+    rivers      each seat's discards, in seat order: 34-tile index + 1, 0 for none.
+                Only the first RIVER discards are kept
+    river_flags flags of each of those discards (TenhouReplay TSUMOGIRI, RIICHI, CALLED)
+    melded      each seat's melded tiles, as 34 counts
+    visible     tiles seen by everyone, as 34 counts
+    dora        dora indicators: 34-tile index + 1, 0 for none
+    riichi      1 for each seat that has declared riichi
+    scores      each seat's score at the start of the round, in hundreds
+    discard     the tile discarded, as a 34-tile index
+    flags       flags of this discard (TenhouReplay TSUMOGIRI, RIICHI)
+    dealt_in    1 if another player won off this discard
+
+Games are split over shards by a hash of their key, so each shard can be
+written by its own process. Next to each shard file is a .done file with a
+line for each game completely written: its key, and the file length once it
+was. An interrupted run carries on from the last of those lines, and games
+added to the archive later are written whatever their keys.
+"""
+
+# core libraries
+import os
+import zlib
+
+# third-party libraries
+import numpy as np
+
+# own imports
+import TenhouDecoder
+import TenhouReplay
+
+RIVER = 30
+
+DTYPE = np.dtype([
+    ('key', 'S32'),
+    ('round', 'u1'),
+    ('seat', 'u1'),
+    ('turn', 'u1'),
+    ('hand', 'u1', 34),
+    ('red', 'u1'),
+    ('rivers', 'u1', (4, RIVER)),
+    ('river_flags', 'u1', (4, RIVER)),
+    ('melded', 'u1', (4, 34)),
+    ('visible', 'u1', 34),
+    ('dora', 'u1', 5),
+    ('riichi', 'u1', 4),
+    ('scores', '<i4', 4),
+    ('discard', 'u1'),
+    ('flags', 'u1'),
+    ('dealt_in', 'u1'),
+])
+
+
+def shard_of(key, shards):
+    """ which shard a game belongs in; stable between runs and archive updates """
+    return zlib.crc32(key.encode()) % shards
+
+
+def shard_path(directory, shard):
+    return os.path.join(directory, 'features-%03d.bin' % shard)
+
+
+class _Recorder():
+    """ replay analyzer that fills in one record per discard """
+
+    def __init__(self, key, round_index, round):
+        self.key = key.encode()
+        self.round_index = round_index
+        self.scores = (list(round.scores) + [0] * 4)[:4]
+        self.records = []
+
+    def discard(self, replay, player, tile, flags):
+        record = np.zeros((), dtype=DTYPE)
+        record['key'] = self.key
+        record['round'] = self.round_index
+        record['seat'] = player
+        record['turn'] = len(replay.rivers[player])
+        record['hand'] = replay.hands[player]
+        record['red'] = sum(1 << i for i in range(3) if replay.red[player, i])
+        for seat, river in enumerate(replay.rivers):
+            for position, (river_tile, river_flags) in enumerate(river[:RIVER]):
+                record['rivers'][seat, position] = river_tile // 4 + 1
+                record['river_flags'][seat, position] = river_flags
+            for meld in replay.melds[seat]:
+                tiles = meld.tiles if isinstance(meld.tiles, tuple) else (meld.tiles,)
+                for meld_tile in tiles:
+                    record['melded'][seat, meld_tile // 4] += 1
+        record['visible'] = replay.visible
+        for position, indicator in enumerate(replay.dora[:5]):
+            record['dora'][position] = indicator // 4 + 1
+        record['riichi'] = replay.riichi
+        record['scores'] = self.scores
+        record['discard'] = tile // 4
+        record['flags'] = flags
+        self.records.append(record)
+
+    def end(self, replay):
+        # a ron straight off the last discard of the round dealt in; a ron on a kan did not.
+        # Dora and riichi events are not turns: an open or added kan shows its indicator after the discard
+        last = None
+        for event in reversed(replay.round.events):
+            if not isinstance(event, (TenhouDecoder.Dora, TenhouDecoder.Riichi)):
+                last = event
+                break
+        if (self.records and isinstance(last, TenhouDecoder.Discard)
+                and any(agari.type == 'RON' and agari.fromPlayer == last.player
+                        for agari in replay.round.agari)):
+            self.records[-1]['dealt_in'] = 1
+
+
+def game_records(key, log):
+    """ all the records of one game, as an array of DTYPE """
+    game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=False)
+    game.decode(log['content'])
+    records = []
+    for round_index, round in enumerate(getattr(game, 'rounds', ())):
+        recorder = _Recorder(key, round_index, round)
+        TenhouReplay.Replay(round).run(recorder)
+        records.extend(recorder.records)
+    return np.array(records, dtype=DTYPE)
+
+
+def _read_done(path):
+    """
+    the keys of the games completely written to a shard, and its length after
+    the last of them. A line cut short by a crash is dropped
+    """
+    try:
+        with open(path + '.done', 'r+', encoding='utf-8') as infile:
+            text = infile.read()
+            complete = text[: text.rfind('\n') + 1]
+            if complete != text:
+                infile.seek(0)
+                infile.truncate(len(complete.encode()))
+    except FileNotFoundError:
+        return set(), 0
+    keys = set()
+    length = 0
+    for line in complete.splitlines():
+        key, length = line.split()
+        keys.add(key)
+    return keys, int(length)
+
+
+def write_shard(items, directory, shard):
+    """
+    write the records of a shard's (key, log) pairs that are not in it yet,
+    in key order, picking up after the last game completely written.
+    Returns the number of games added
+    """
+    path = shard_path(directory, shard)
+    done, length = _read_done(path)
+    added = 0
+    with open(path, 'ab') as outfile, open(path + '.done', 'a', encoding='utf-8') as progress:
+        # drop anything written after the last completed game
+        outfile.truncate(length)
+        outfile.seek(length)
+        for key, log in sorted(items):
+            if key in done:
+                continue
+            game_records(key, log).tofile(outfile)
+            outfile.flush()
+            length = outfile.tell()
+            progress.write('%s %d\n' % (key, length))
+            progress.flush()
+            added += 1
+    return added
+
+
+def open_shard(path):
+    """ memory-map a shard file as an array of records """
+    if not os.path.getsize(path):
+        return np.zeros(0, dtype=DTYPE)
+    return np.memmap(path, dtype=DTYPE, mode='r')
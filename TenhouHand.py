@@ -0,0 +1,390 @@
+"""
+hand shapes as 34-tile count vectors: parsing, complete hands, waits,
+shanten numbers and tile acceptance
+"""
+
+# core libraries
+from functools import lru_cache
+from itertools import combinations_with_replacement
+import os
+
+# third-party libraries
+import numpy as np
+
+TERMINALS_AND_HONOURS = (0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33)
+
+# bit flags for the forms a hand can be tenpai (or complete) in
+REGULAR = 1
+CHIITOITSU = 2
+KOKUSHI = 4
+
+
+def counts(tiles):
+    """ turn a list of 136-tile ids into a list of 34 counts """
+    out = [0] * 34
+    for tile in tiles:
+        out[tile // 4] += 1
+    return out
+
+
+def parse(text):
+    """
+    turn a hand in mpsz notation, e.g. "14m" or "123p55z", into a list of 34 counts.
+    Honours are 1-7z, in the order east, south, west, north, white, green, red
+    """
+    out = [0] * 34
+    pending = []
+    for char in text.replace(' ', ''):
+        if char.isdigit():
+            pending.append(int(char))
+        elif char in 'mpsz' and pending:
+            base = 'mpsz'.index(char) * 9
+            for number in pending:
+                if not 1 <= number <= (7 if char == 'z' else 9):
+                    raise ValueError('no such tile: %d%s' % (number, char))
+                out[base + number - 1] += 1
+            pending = []
+        else:
+            raise ValueError('cannot parse hand: %s' % text)
+    if pending:
+        raise ValueError('cannot parse hand: %s' % text)
+    return out
+
+
+def mask(tiles34):
+    """ bitmask of a collection of 34-tile indices """
+    out = 0
+    for tile in tiles34:
+        out |= 1 << tile
+    return out
+
+
+@lru_cache(maxsize=None)
+def _suit_decomposes(suit, honours=False):
+    """
+    for one suit's counts, return a pair of booleans:
+    (can be made entirely of sets, can be made of sets plus exactly one pair)
+    """
+    if not any(suit):
+        return True, False
+    first = next(i for i, count in enumerate(suit) if count)
+    sets_only = with_pair = False
+    rest = list(suit)
+    if suit[first] >= 3:
+        rest[first] -= 3
+        a, b = _suit_decomposes(tuple(rest), honours)
+        sets_only, with_pair = sets_only or a, with_pair or b
+        rest[first] += 3
+    if (not honours and first <= 6 and suit[first + 1] and suit[first + 2]):
+        rest[first] -= 1
+        rest[first + 1] -= 1
+        rest[first + 2] -= 1
+        a, b = _suit_decomposes(tuple(rest), honours)
+        sets_only, with_pair = sets_only or a, with_pair or b
+        rest[first] += 1
+        rest[first + 1] += 1
+        rest[first + 2] += 1
+    if suit[first] >= 2:
+        rest[first] -= 2
+        a, b = _suit_decomposes(tuple(rest), honours)
+        with_pair = with_pair or a
+    return sets_only, with_pair
+
+
+def complete_forms(hand):
+    """ bit flags of the forms that a 3n+2 tile hand of 34 counts is complete in """
+    forms = 0
+    total = sum(hand)
+    if total == 14:
+        if sum(1 for count in hand if count == 2) == 7:
+            forms |= CHIITOITSU
+        if (all(hand[i] for i in TERMINALS_AND_HONOURS)
+                and sum(hand[i] for i in TERMINALS_AND_HONOURS) == 14):
+            forms |= KOKUSHI
+    if total % 3 == 2:
+        # the pair must sit in the one suit whose count is 2 mod 3
+        for start, honours in ((0, False), (9, False), (18, False), (27, True)):
+            suit = tuple(hand[start : start + (7 if honours else 9)])
+            sets_only, with_pair = _suit_decomposes(suit, honours)
+            if not (with_pair if sum(suit) % 3 == 2 else sets_only):
+                break
+        else:
+            forms |= REGULAR
+    return forms
+
+
+def waits(hand):
+    """
+    for a 3n+1 tile hand of 34 counts, return (bitmask of tiles that complete it,
+    bit flags of the forms it is tenpai in)
+    """
+    wait_mask = 0
+    forms = 0
+    hand = list(hand)
+    for tile in range(34):
+        if hand[tile] >= 4:
+            continue
+        hand[tile] += 1
+        tile_forms = complete_forms(hand)
+        hand[tile] -= 1
+        if tile_forms:
+            wait_mask |= 1 << tile
+            forms |= tile_forms
+    return wait_mask, forms
+
+
+# %% shanten and tile acceptance
+#
+# For each suit, and for every pattern of counts in it (indexed by the base-5
+# number formed by its counts, first tile most significant), the tables hold
+# the number of tiles that must be drawn into that suit for it to hold exactly
+# m sets (0-4), with or without the pair. The best split of the sets over the
+# four suits then gives the number of tiles a hand is from complete, which is
+# one more than its shanten number.
+
+SHANTEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shanten.npz')
+
+_tables = None
+
+
+def _suit_table(size, runs):
+    """
+    distance table for one suit of the given size, with or without runs.
+    The pattern at distance zero from the most tiles is the largest overlap
+    between the suit and any complete arrangement; the cumulative maxima along
+    each axis find it for every pattern at once
+    """
+    shape = (5,) * size
+    grid = np.indices(shape).sum(axis=0)
+    melds = []
+    for tile in range(size):
+        melds.append(tuple(3 if i == tile else 0 for i in range(size)))
+        if runs and tile <= size - 3:
+            melds.append(tuple(1 if tile <= i <= tile + 2 else 0 for i in range(size)))
+    pairs = [tuple(2 if i == tile else 0 for i in range(size)) for tile in range(size)]
+    table = np.empty((5 ** size, 10), dtype=np.int8)
+    for sets in range(5):
+        for head in range(2):
+            targets = np.zeros(shape, dtype=np.bool_)
+            for chosen in combinations_with_replacement(melds, sets):
+                for pair in (pairs if head else [(0,) * size]):
+                    target = [sum(column) for column in zip(pair, *chosen)]
+                    if max(target, default=0) <= 4:
+                        targets[tuple(target)] = True
+            # every pattern that fits inside some complete arrangement
+            for axis in range(size):
+                targets = np.flip(np.logical_or.accumulate(np.flip(targets, axis), axis), axis)
+            overlap = np.where(targets, grid, -1).astype(np.int8)
+            for axis in range(size):
+                overlap = np.maximum.accumulate(overlap, axis)
+            table[:, sets * 2 + head] = (3 * sets + 2 * head - overlap).reshape(-1)
+    return table
+
+
+def tables():
+    """ the (suit, honour) distance tables, built on first use and cached in SHANTEN_FILE """
+    global _tables
+    if _tables is None:
+        try:
+            with np.load(SHANTEN_FILE) as saved:
+                _tables = saved['suit'], saved['honour']
+        except (OSError, KeyError, ValueError):
+            _tables = _suit_table(9, True), _suit_table(7, False)
+            try:
+                np.savez(SHANTEN_FILE, suit=_tables[0], honour=_tables[1])
+            except OSError:
+                pass
+    return _tables
+
+
+SUIT_POWERS = [5 ** (8 - i) for i in range(9)]
+HONOUR_POWERS = [5 ** (6 - i) for i in range(7)]
+
+
+def codes(hand):
+    """ the table indices of the four suits of a hand of 34 counts """
+    return [sum(count * power for count, power in zip(hand[start : start + 9], SUIT_POWERS))
+            for start in (0, 9, 18)] + [
+            sum(count * power for count, power in zip(hand[27:34], HONOUR_POWERS))]
+
+
+# rows are flattened to 10 entries, sets * 2 + head. These are the pairs of
+# entries that add up to each entry of the combined row
+_COMBINATIONS = [
+    [(sets_a * 2 + head_a, (sets - sets_a) * 2 + head - head_a)
+     for sets_a in range(sets + 1) for head_a in range(head + 1)]
+    for sets in range(5) for head in range(2)]
+
+
+def _combine(a, b):
+    """ min-plus product of two distance rows """
+    return [min(a[i] + b[j] for i, j in pairs) for pairs in _COMBINATIONS]
+
+
+def _regular(rows, sets):
+    """ shanten number of a regular hand with this many sets, from its four suit rows """
+    row = _combine(_combine(rows[0], rows[1]), rows[2])
+    honours = rows[3]
+    return min(row[i] + honours[j] for i, j in _COMBINATIONS[sets * 2 + 1]) - 1
+
+
+def _rows(suit_codes):
+    suit, honour = tables()
+    return [suit[suit_codes[0]].tolist(), suit[suit_codes[1]].tolist(),
+            suit[suit_codes[2]].tolist(), honour[suit_codes[3]].tolist()]
+
+
+def _chiitoitsu(hand):
+    pairs = sum(1 for count in hand if count >= 2)
+    kinds = sum(1 for count in hand if count)
+    return 6 - pairs + max(0, 7 - kinds)
+
+
+def _kokushi(hand):
+    kinds = sum(1 for i in TERMINALS_AND_HONOURS if hand[i])
+    pair = any(hand[i] >= 2 for i in TERMINALS_AND_HONOURS)
+    return 13 - kinds - (1 if pair else 0)
+
+
+def shanten(hand, forms=REGULAR | CHIITOITSU | KOKUSHI):
+    """
+    shanten number of a concealed hand of 34 counts, with 3n+1 or 3n+2 tiles:
+    0 is tenpai, -1 is complete. Chiitoitsu and kokushi only count for
+    hands with no calls, i.e. 13 or 14 tiles
+    """
+    total = sum(hand)
+    best = 8
+    if forms & REGULAR:
+        best = _regular(_rows(codes(hand)), total // 3)
+    if total >= 13:
+        if forms & CHIITOITSU:
+            best = min(best, _chiitoitsu(hand))
+        if forms & KOKUSHI:
+            best = min(best, _kokushi(hand))
+    return best
+
+
+def ukeire(hand, unseen=None):
+    """
+    tile acceptance of a 3n+1 tile hand: returns (bitmask of the tiles that
+    lower its shanten number, how many of those tiles are left).
+    unseen gives how many of each tile are still unseen, by default 4
+    less the ones in the hand
+    """
+    base = shanten(hand)
+    hand = list(hand)
+    accepted = 0
+    count = 0
+    for tile in range(34):
+        left = (4 - hand[tile]) if unseen is None else unseen[tile]
+        if hand[tile] >= 4:
+            continue
+        hand[tile] += 1
+        if shanten(hand) < base:
+            accepted |= 1 << tile
+            count += left
+        hand[tile] -= 1
+    return accepted, count
+
+
+class Shanten():
+    """
+            the shanten number of one concealed hand, kept up to date
+            as tiles are drawn and discarded (34-tile indices)
+    """
+
+    def __init__(self, hand):
+        self.hand = list(hand)
+        self.codes = codes(self.hand)
+        self.rows = _rows(self.codes)
+
+    def _index(self, tile):
+        if tile < 27:
+            return tile // 9, SUIT_POWERS[tile % 9]
+        return 3, HONOUR_POWERS[tile - 27]
+
+    def _update(self, tile, change):
+        self.hand[tile] += change
+        suit, power = self._index(tile)
+        self.codes[suit] += change * power
+        self.rows[suit] = tables()[suit // 3][self.codes[suit]].tolist()
+
+    def draw(self, tile):
+        self._update(tile, 1)
+
+    def discard(self, tile):
+        self._update(tile, -1)
+
+    def meld(self, tiles):
+        """ remove the tiles of a call (including any called tile that was drawn in) from the concealed hand """
+        for tile in tiles:
+            self.discard(tile)
+
+    def value(self):
+        total = sum(self.hand)
+        best = _regular(self.rows, total // 3)
+        if total >= 13:
+            best = min(best, _chiitoitsu(self.hand), _kokushi(self.hand))
+        return best
+
+
+def _combine_batch(a, b, entries=range(10)):
+    """
+    min-plus product of two arrays of distance rows, shaped (10, n),
+    for the given entries of the result only
+    """
+    out = np.full(a.shape, 127, dtype=np.int8)
+    for entry in entries:
+        for i, j in _COMBINATIONS[entry]:
+            np.minimum(out[entry], a[i] + b[j], out=out[entry])
+    return out
+
+
+def shanten_batch(hands, forms=REGULAR | CHIITOITSU | KOKUSHI):
+    """ shanten numbers of an (n, 34) array of concealed hands, as an int8 array """
+    hands = np.asarray(hands, dtype=np.uint8)
+    suit, honour = tables()
+    suit_powers = np.array(SUIT_POWERS, dtype=np.int32)
+    honour_powers = np.array(HONOUR_POWERS, dtype=np.int32)
+    rows = [np.ascontiguousarray(suit[hands[:, start : start + 9].astype(np.int32) @ suit_powers].T)
+            for start in (0, 9, 18)]
+    rows.append(np.ascontiguousarray(honour[hands[:, 27:34].astype(np.int32) @ honour_powers].T))
+    total = hands.sum(axis=1, dtype=np.int32)
+    best = np.full(len(hands), 8, dtype=np.int8)
+    if forms & REGULAR:
+        combined = _combine_batch(_combine_batch(rows[0], rows[1]), rows[2])
+        # only the entries with the pair are needed from the last step
+        combined = _combine_batch(combined, rows[3], range(1, 10, 2))
+        best = combined[(total // 3) * 2 + 1, np.arange(len(hands))] - 1
+    full = total >= 13
+    if forms & CHIITOITSU:
+        pairs = (hands >= 2).sum(axis=1, dtype=np.int8)
+        kinds = (hands >= 1).sum(axis=1, dtype=np.int8)
+        best = np.where(full, np.minimum(best, 6 - pairs + np.maximum(0, 7 - kinds)), best)
+    if forms & KOKUSHI:
+        yaochuu = hands[:, list(TERMINALS_AND_HONOURS)]
+        kokushi = 13 - (yaochuu >= 1).sum(axis=1, dtype=np.int8) - (yaochuu >= 2).any(axis=1)
+        best = np.where(full, np.minimum(best, kokushi), best)
+    return best.astype(np.int8)
+
+
+def ukeire_batch(hands, unseen=None):
+    """
+    tile acceptance of an (n, 34) array of 3n+1 tile hands: returns an (n, 34)
+    boolean array of the tiles that lower each hand's shanten number, and how
+    many of those tiles are left for each hand. unseen is as for ukeire(),
+    an (n, 34) array
+    """
+    hands = np.asarray(hands, dtype=np.uint8)
+    base = shanten_batch(hands)
+    accepted = np.zeros(hands.shape, dtype=np.bool_)
+    for tile in range(34):
+        # a fifth copy of a tile can't be drawn, and would overflow its base-5 digit
+        room = np.flatnonzero(hands[:, tile] < 4)
+        if not len(room):
+            continue
+        plus = hands[room]
+        plus[:, tile] += 1
+        accepted[room, tile] = shanten_batch(plus) < base[room]
+    left = (4 - hands.astype(np.int8)) if unseen is None else np.asarray(unseen)
+    return accepted, (accepted * left).sum(axis=1)
@@ -0,0 +1,188 @@
+"""
+bulk import of mjlog files: find them in directories and in zip and tar
+archives, skip the games already archived before opening anything, and
+parse the rest in worker processes, streaming members out of the archives
+without extracting them. Files may be gzip-compressed, as tenhou's downloads are.
+
+A tar can only be read front to back, so the parent process streams its
+members out, skipping known games, and hands them to the workers a chunk at
+a time. An archive that cannot be read is reported and skipped
+"""
+
+# core libraries
+import gzip
+from pathlib import Path
+import sys
+import tarfile
+import zipfile
+
+# own imports
+from tenhoulogs import TenhouLogs
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# members of an archive are parsed this many to a task
+ZIP_CHUNK = 200
+
+# the errors of an archive that cannot be read
+ARCHIVE_ERRORS = (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError)
+
+
+def key_of(name):
+    """
+    the game key from a file or member name, e.g.
+    2019010100gm-00a9-0000-abcdef01&tw=2.mjlog.gz gives 2019010100gm-00a9-0000-abcdef01
+    """
+    stem = Path(name).name.split('&')[0]
+    for suffix in ('.gz', '.mjlog', '.xml'):
+        if stem.endswith(suffix):
+            stem = stem[: -len(suffix)]
+    return stem
+
+
+def is_log(name):
+    return Path(name).name.endswith(('.mjlog', '.mjlog.gz', '.xml', '.xml.gz'))
+
+
+def is_tar(name):
+    return Path(name).name.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz'))
+
+
+def discover(paths):
+    """
+    the import tasks for files, directories (searched recursively) and archives:
+    tuples of (kind, path, [(key, member name)]) where kind is 'file', 'zip' or
+    'tar'. Loose files are grouped into tasks with no path, the member names being
+    their paths, and a tar has no member list. A zip that cannot be opened is
+    reported and left out
+    """
+    tasks = []
+    files = []
+    for path in map(Path, paths):
+        for found in (sorted(path.rglob('*')) if path.is_dir() else [path]):
+            if not found.is_file():
+                continue
+            if found.suffix == '.zip':
+                try:
+                    with zipfile.ZipFile(found) as archive:
+                        members = [(key_of(name), name) for name in archive.namelist() if is_log(name)]
+                except ARCHIVE_ERRORS as error:
+                    print('cannot read %s: %s' % (found, error), file=sys.stderr)
+                    continue
+                for start in range(0, len(members), ZIP_CHUNK):
+                    tasks.append(('zip', str(found), members[start : start + ZIP_CHUNK]))
+            elif is_tar(found):
+                # tar members can only be listed by reading the whole archive,
+                # so a tar is one task, which expand streams out when it is run
+                tasks.append(('tar', str(found), None))
+            elif is_log(found.name):
+                files.append((key_of(found.name), str(found)))
+    for start in range(0, len(files), ZIP_CHUNK):
+        tasks.append(('file', None, files[start : start + ZIP_CHUNK]))
+    return tasks
+
+
+def skip_known(tasks, known):
+    """
+    drop the games whose keys are in known (e.g. the archive), and repeats of the
+    same game, before anything is opened. Returns the remaining tasks, how many
+    games were skipped, and the keys known or to be imported, for tars to skip
+    """
+    seen = set(known)
+    out = []
+    skipped = 0
+    for kind, path, members in tasks:
+        if members is None:
+            # keys inside a tar are only known once it is read
+            out.append((kind, path, None))
+            continue
+        wanted = []
+        for key, name in members:
+            if key in seen:
+                skipped += 1
+            else:
+                seen.add(key)
+                wanted.append((key, name))
+        if wanted:
+            out.append((kind, path, wanted))
+    return out, skipped, frozenset(seen)
+
+
+def _read_game(key, data, username):
+    """
+    parse one game's bytes: (key, log), where log is None if the file could not
+    be read, and False if the player is not in the game
+    """
+    try:
+        if data[:2] == GZIP_MAGIC:
+            data = gzip.decompress(data)
+        xml = TenhouLogs.parse_xml(data)
+        log = {'content': data}
+        if xml is not None and xml.find('UN') is not None:
+            return key, (log if TenhouLogs.fill_log(xml, key, data, username, log) else False)
+    except Exception as error:
+        print('failed to read %s: %s' % (key, error))
+    return key, None
+
+
+def tar_tasks(path, seen):
+    """
+    stream the game files out of a tar, in this process, as 'data' tasks of up to
+    ZIP_CHUNK (key, bytes) members, skipping the keys in the set seen, and adding
+    the others to it. A tar that cannot be read is reported, and ends early
+    """
+    members = []
+    try:
+        # stream mode, so a compressed tar is read once, front to back
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                key = key_of(member.name)
+                if not member.isfile() or not is_log(member.name) or key in seen:
+                    continue
+                members.append((key, archive.extractfile(member).read()))
+                seen.add(key)
+                if len(members) == ZIP_CHUNK:
+                    yield ('data', path, members)
+                    members = []
+    except ARCHIVE_ERRORS as error:
+        print('cannot read %s: %s' % (path, error), file=sys.stderr)
+    if members:
+        yield ('data', path, members)
+
+
+def expand(tasks, known=frozenset()):
+    """
+    the tasks to run in workers. Tars are streamed out into data tasks here, as
+    they are needed, skipping the keys in known and games already seen in a tar
+    """
+    seen = set(known)
+    for task in tasks:
+        if task[0] == 'tar':
+            yield from tar_tasks(task[1], seen)
+        else:
+            yield task
+
+
+def run_task(task, username):
+    """
+    read and parse the games of one task, in a worker process. Returns a list of
+    (key, log) pairs, as from _read_game. If the archive cannot be read, it is
+    reported, and the games read before that are returned
+    """
+    kind, path, members = task
+    out = []
+    try:
+        if kind == 'data':
+            for key, data in members:
+                out.append(_read_game(key, data, username))
+        elif kind == 'file':
+            for key, name in members:
+                with open(name, 'rb') as infile:
+                    out.append(_read_game(key, infile.read(), username))
+        else:
+            with zipfile.ZipFile(path) as archive:
+                for key, name in members:
+                    out.append(_read_game(key, archive.read(name), username))
+    except ARCHIVE_ERRORS as error:
+        print('cannot read %s: %s' % (path or members[len(out)][1], error), file=sys.stderr)
+    return out
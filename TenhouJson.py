@@ -0,0 +1,453 @@
+"""
+convert decoded games to the tenhou.net/6 JSON log format, as read by the
+tenhou.net/6 viewer and many community tools: the players and rule, then for
+each round its starting hands, each player's draws and discards (with calls,
+riichi and kans written as tenhou.net/6 strings), and its result.
+
+Archives are converted in worker processes a chunk of games at a time, with
+only a few chunks in flight at once, so the output can be streamed out with
+bounded memory however large the archive is
+"""
+
+# core libraries
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
+import json
+import re
+
+# own imports
+import TenhouDecoder
+
+# games are sent to worker processes this many at a time
+CHUNK = 64
+
+# the red fives, by tile ID, as written when the rule has red fives
+RED_FIVES = {16: 51, 52: 52, 88: 53}
+CODES = frozenset(
+    [10 * suit + number for suit in (1, 2, 3) for number in range(1, 10)]
+    + [41 + honour for honour in range(7)] + list(RED_FIVES.values()))
+
+# a discard of the tile just drawn
+TSUMOGIRI = 60
+
+LEVELS = '般上特鳳'
+LIMITS = dict(zip(TenhouDecoder.Game.LIMITS, ('', '満貫', '跳満', '倍満', '三倍満', '役満')))
+DRAWS = {
+    'yao9': '九種九牌',
+    'reach4': '四家立直',
+    'ron3': '三家和了',
+    'kan4': '四槓散了',
+    'kaze4': '四風連打',
+    'nm': '流し満貫',
+}
+
+# the tiles in a call or kan string, each with the letter before it, if any
+CALL_TILES = re.compile(r'([a-z]?)(\d\d)')
+
+# the TenhouDecoder.Meld type of each letter of a call or kan string
+CALL_TYPES = {'c': 'chi', 'p': 'pon', 'm': 'kan', 'k': 'chakan', 'a': 'kan', 'f': 'nuki'}
+# the seat an open call was made from (3 left, 2 opposite, 1 right), by where its letter is
+CALLED_FROM = {'c': {0: 3}, 'p': {0: 3, 2: 2, 4: 1}, 'k': {0: 3, 2: 2, 4: 1}, 'm': {0: 3, 2: 2, 6: 1}}
+
+# the points of a win at the end of its result, e.g. 1000点, 300-500点, or 2600点∀
+POINTS = re.compile(r'(\d+)(?:-(\d+))?点(∀?)$')
+
+
+def tile_code(tile, aka=True):
+    """
+    a tile ID (0-135) as tenhou.net/6 writes it: 11-19, 21-29 and 31-39 for
+    the suits, 41-47 for the honours, and 51-53 for the red fives
+    """
+    if aka and tile in RED_FIVES:
+        return RED_FIVES[tile]
+    kind = tile // 4
+    return 10 * (kind // 9 + 1) + kind % 9 + 1
+
+
+def rule(game_type):
+    """ the rule for a GO type, e.g. 169 gives {'disp': '鳳南喰赤', 'aka': 1, ...} """
+    game_type = int(game_type)
+    aka = 0 if game_type & 0x02 else 1
+    disp = LEVELS[((game_type & 0x20) >> 4) | ((game_type & 0x80) >> 7)]
+    disp += '三' if game_type & 0x10 else ''
+    disp += '南' if game_type & 0x08 else '東'
+    disp += '' if game_type & 0x04 else '喰'
+    disp += '赤' if aka else ''
+    disp += '速' if game_type & 0x40 else ''
+    return {'disp': disp, 'aka': aka, 'aka51': aka, 'aka52': aka, 'aka53': aka}
+
+
+def meld_string(meld, aka=True):
+    """
+    a TenhouDecoder.Meld as tenhou.net/6 writes it. The letter goes before the
+    called tile, and its place shows who it was called from: first for the
+    player on the left, second for the player opposite, last for the right.
+    c is chi, p pon, m an open kan, k an added kan (before the added tile),
+    a a closed kan and f a nukidora
+    """
+    if meld.type == 'nuki':
+        # a nukidora is the one tile
+        return 'f%d' % tile_code(meld.tiles, aka)
+    codes = ['%d' % tile_code(tile, aka) for tile in meld.tiles]
+    if meld.type == 'chi':
+        called = codes.pop(meld.called)
+        return 'c' + called + ''.join(codes)
+    if meld.type == 'kan' and not hasattr(meld, 'fromPlayer'):
+        return ''.join(codes[:3]) + 'a' + codes[3]
+    marked = ''
+    if meld.type == 'chakan':
+        marked = 'k' + codes.pop()
+    called = codes.pop(meld.called)
+    marked = marked + called if marked else ('p' if meld.type == 'pon' else 'm') + called
+    position = {3: 0, 2: 1}.get(meld.fromPlayer, len(codes))
+    codes.insert(position, marked)
+    return ''.join(codes)
+
+
+def parse_call(text):
+    """
+    a call or kan string, as meld_string writes it: the TenhouDecoder.Meld type,
+    the tile codes, the code of the called tile, and the seat it was called
+    from (3 left, 2 opposite, 1 right). The last two are None for closed kans
+    and nukidora. Raises ValueError if the string is not one meld_string writes
+    """
+    tiles = CALL_TILES.findall(text)
+    letters = [letter for (letter, _) in tiles if letter]
+    if len(letters) != 1 or letters[0] not in CALL_TYPES or ''.join(map(''.join, tiles)) != text:
+        raise ValueError('%s is not a call' % text)
+    letter = letters[0]
+    codes = [int(tile) for (_, tile) in tiles]
+    if letter in ('a', 'f'):
+        return CALL_TYPES[letter], codes, None, None
+    position = text.index(letter)
+    if len(codes) != (4 if letter in 'mk' else 3) or position not in CALLED_FROM[letter]:
+        raise ValueError('%s is not a call' % text)
+    # an added kan's letter is before the added tile, and the called tile is next
+    called = codes[position // 2 + (1 if letter == 'k' else 0)]
+    return CALL_TYPES[letter], codes, called, CALLED_FROM[letter][position]
+
+
+def _agari_result(agari, round, players):
+    """ the [who, from who, liable, points, yaku...] list of one win """
+    who = agari.player
+    han = sum(yaku_han for (_, yaku_han) in agari.yaku)
+    if agari.type == 'RON' or agari.paoPlayer is not None:
+        points = '%d点' % agari.points
+    else:
+        # each loser's payment, less the honba
+        honba = round.round[1]
+        pays = dict((seat, -100 * (delta + honba)) for (seat, delta) in enumerate(agari.deltas[:players])
+                    if seat != who)
+        if who == round.dealer:
+            points = '%d点∀' % max(pays.values())
+        else:
+            points = '%d-%d点' % (
+                min(pay for (seat, pay) in pays.items() if seat != round.dealer), pays[round.dealer])
+    limit = LIMITS.get(agari.limit, '')
+    out = [
+        who,
+        agari.fromPlayer if agari.type == 'RON' else who,
+        agari.paoPlayer if agari.paoPlayer is not None else who,
+        limit + points if limit else '%d符%d飜%s' % (agari.fu, han, points),
+    ]
+    out += ['%s(%d飜)' % (TenhouDecoder.Game.YAKU[yaku], yaku_han) for (yaku, yaku_han) in agari.yaku if yaku_han]
+    out += ['%s(役満)' % TenhouDecoder.Game.YAKU[yakuman] for yakuman in agari.yakuman]
+    return out
+
+
+def _result(round, players):
+    """ the result of a round: 和了 with the score changes and details of each win, or how it was drawn """
+    if round.agari:
+        out = ['和了']
+        for agari in round.agari:
+            out.append([100 * delta for delta in agari.deltas[:players]])
+            out.append(_agari_result(agari, round, players))
+        return out
+    if round.ryuukyoku is False:
+        # the log ends before the round did
+        return []
+    deltas = [100 * delta for delta in round.deltas[:players]]
+    if round.ryuukyoku is True:
+        tenpai = len(round.ryuukyoku_tenpai or ())
+        if tenpai == players:
+            return ['全員聴牌']
+        if tenpai == 0:
+            return ['全員不聴']
+        return ['流局', deltas]
+    name = DRAWS.get(round.ryuukyoku, '流局')
+    return [name, deltas] if any(deltas) else [name]
+
+
+def convert_round(round, aka=True):
+    """ one TenhouDecoder.Round, decoded with draws, as a tenhou.net/6 round array """
+    players = len(round.hands)
+    takes = [[] for _ in range(players)]
+    discards = [[] for _ in range(players)]
+    drawn = [None] * players
+    riichi = [False] * players
+    dora = []
+    for event in round.events:
+        if event.type == 'Dora':
+            dora.append(tile_code(event.tile, aka))
+        elif event.type == 'Draw':
+            takes[event.player].append(tile_code(event.tile, aka))
+            drawn[event.player] = event.tile
+        elif event.type == 'Discard':
+            player = event.player
+            discard = TSUMOGIRI if event.tile == drawn[player] else tile_code(event.tile, aka)
+            if riichi[player]:
+                discard = 'r%d' % discard
+                riichi[player] = False
+            discards[player].append(discard)
+            drawn[player] = None
+        elif event.type == 'Riichi':
+            riichi[event.player] = True
+        elif event.type == 'Call':
+            player = event.player
+            meld = event.meld
+            if meld.type in ('chi', 'pon'):
+                takes[player].append(meld_string(meld, aka))
+            elif meld.type == 'kan' and hasattr(meld, 'fromPlayer'):
+                # an open kan takes the place of a draw, and has no discard
+                takes[player].append(meld_string(meld, aka))
+                discards[player].append(0)
+            else:
+                # closed and added kans and nukidora take the place of a discard
+                discards[player].append(meld_string(meld, aka))
+            drawn[player] = None
+    uradora = next((agari.uradora for agari in round.agari if agari.uradora), ())
+    out = [
+        [TenhouDecoder.Game.ROUND_NAMES.index(round.round[0]), round.round[1], round.round[2]],
+        [100 * score for score in round.scores[:players]],
+        dora,
+        [tile_code(tile, aka) for tile in uradora],
+    ]
+    for player in range(players):
+        out += [[tile_code(tile, aka) for tile in round.hands[player]], takes[player], discards[player]]
+    out.append(_result(round, players))
+    return out
+
+
+def convert(game, key=None):
+    """ a TenhouDecoder.Game, decoded with draws, as a tenhou.net/6 log """
+    game_rule = rule(game.gameType)
+    players = len(game.rounds[0].hands) if game.rounds else len(game.players)
+    key = key or ''
+    return {
+        'ref': key,
+        'title': [game_rule['disp'], '%s/%s/%s' % (key[0:4], key[4:6], key[6:8]) if key else ''],
+        'name': [player.name for player in game.players[:players]],
+        'rule': game_rule,
+        'ratingc': 'PF3' if players == 3 else 'PF4',
+        'lobby': int(game.lobby or 0),
+        'dan': [player.rank for player in game.players[:players]],
+        'rate': [player.rate for player in game.players[:players]],
+        'sx': [player.sex for player in game.players[:players]],
+        # the final scores (in hundreds) and uma, as in the log
+        'sc': [float(value) if '.' in value else int(value) for value in game.owari.split(',')] if game.owari else [],
+        'log': [convert_round(round, game_rule['aka']) for round in game.rounds],
+    }
+
+
+def _remove(hand, tile, where):
+    if not hand[tile]:
+        raise ValueError('%s: %d is not in the hand' % (where, tile))
+    hand[tile] -= 1
+
+
+def replay(data):
+    """
+    check a converted game for consistency, by replaying each player's hand
+    through their draws, calls and discards: every tile code must be valid, and
+    every tile discarded or melded from the hand must be in it at the time.
+    Raises ValueError if not
+    """
+    for number, round in enumerate(data['log']):
+        players = (len(round) - 5) // 3
+        tiles = list(round[2]) + list(round[3])
+        for seat in range(players):
+            where = 'round %d, seat %d' % (number, seat)
+            hand = Counter(round[4 + 3 * seat])
+            takes, discards = round[5 + 3 * seat], round[6 + 3 * seat]
+            tiles += round[4 + 3 * seat]
+            if sum(hand.values()) != 13:
+                raise ValueError('%s: the hand has %d tiles' % (where, sum(hand.values())))
+            if not len(takes) - 1 <= len(discards) <= len(takes):
+                raise ValueError('%s: %d draws but %d discards' % (where, len(takes), len(discards)))
+            for turn, take in enumerate(takes):
+                drawn = None
+                open_kan = False
+                if isinstance(take, str):
+                    # the unmarked tiles of a call come from the hand
+                    for letter, tile in CALL_TILES.findall(take):
+                        tiles.append(int(tile))
+                        if not letter:
+                            _remove(hand, int(tile), where)
+                    open_kan = 'm' in take
+                else:
+                    tiles.append(take)
+                    hand[take] += 1
+                    drawn = take
+                if turn >= len(discards):
+                    break
+                discard = discards[turn]
+                if isinstance(discard, str) and discard[0] == 'r':
+                    discard = int(discard[1:])
+                if open_kan != (discard == 0):
+                    raise ValueError('%s: an open kan must be followed by 0, and only then' % where)
+                if isinstance(discard, str):
+                    for letter, tile in CALL_TILES.findall(discard):
+                        tiles.append(int(tile))
+                        if discard[0] == 'f' or 'k' not in discard or letter == 'k':
+                            # every tile of a closed kan, the added tile of an added kan
+                            _remove(hand, int(tile), where)
+                elif discard == TSUMOGIRI:
+                    if drawn is None:
+                        raise ValueError('%s: a tsumogiri with nothing drawn' % where)
+                    _remove(hand, drawn, where)
+                elif discard:
+                    tiles.append(discard)
+                    _remove(hand, discard, where)
+        bad = set(tiles) - CODES
+        if bad:
+            raise ValueError('round %d: invalid tile codes %s' % (number, sorted(bad)))
+
+
+def _expect(where, found, wanted):
+    if found != wanted:
+        raise ValueError('%s: %r, not %r' % (where, found, wanted))
+
+
+def _check_points(where, text, agari, round, players):
+    """ check the points string of a win against its fu, han and limit, and what each loser paid """
+    match = POINTS.search(text)
+    if not match:
+        raise ValueError('%s: no points in %s' % (where, text))
+    han = sum(yaku_han for (_, yaku_han) in agari.yaku)
+    _expect(where + ' limit', text[: match.start()],
+            LIMITS[agari.limit] if agari.limit else '%d符%d飜' % (agari.fu, han))
+    first, second, dealer_tsumo = int(match.group(1)), match.group(2), match.group(3)
+    if agari.type == 'RON' or agari.paoPlayer is not None:
+        _expect(where + ' points', (first, second, dealer_tsumo), (agari.points, None, ''))
+        return
+    who = agari.player
+    _expect(where + ' dealer', bool(dealer_tsumo), who == round.dealer)
+    for seat, delta in enumerate(agari.deltas[:players]):
+        if seat != who:
+            pay = first if dealer_tsumo or seat != round.dealer else int(second or 0)
+            _expect('%s seat %d pays' % (where, seat), pay + 100 * round.round[1], -100 * delta)
+
+
+def compare(game, data):
+    """
+    check a converted game against the TenhouDecoder.Game it was converted
+    from: the players and final scores, and for each round its scores, dora and
+    uradora, hands, every call and kan, and the result, down to the points of
+    each win. Raises ValueError at the first difference
+    """
+    aka = data['rule']['aka']
+    _expect('rounds', len(data['log']), len(game.rounds))
+    players = len(game.rounds[0].hands) if game.rounds else len(game.players)
+    _expect('names', data['name'], [player.name for player in game.players[:players]])
+    _expect('final scores', ','.join('%s' % value for value in data['sc']), game.owari)
+    for number, (round, out) in enumerate(zip(game.rounds, data['log'])):
+        where = 'round %d' % number
+        _expect(where, out[0], [TenhouDecoder.Game.ROUND_NAMES.index(round.round[0]), round.round[1], round.round[2]])
+        _expect(where + ' scores', out[1], [100 * score for score in round.scores[:players]])
+        _expect(where + ' dora', out[2], [tile_code(event.tile, aka) for event in round.events if event.type == 'Dora'])
+        uradora = [agari.uradora for agari in round.agari if agari.uradora]
+        _expect(where + ' uradora', out[3], [tile_code(tile, aka) for tile in (uradora[0] if uradora else ())])
+        for seat in range(players):
+            takes, discards = out[5 + 3 * seat], out[6 + 3 * seat]
+            _expect('%s seat %d hand' % (where, seat), out[4 + 3 * seat],
+                    [tile_code(tile, aka) for tile in round.hands[seat]])
+            # the calls and kans of the player, in the order they were made
+            written = [item for turn in zip_longest(takes, discards) for item in turn
+                       if isinstance(item, str) and item[0] != 'r']
+            melds = [event.meld for event in round.events if event.type == 'Call' and event.player == seat]
+            _expect('%s seat %d calls' % (where, seat), len(written), len(melds))
+            for text, meld in zip(written, melds):
+                kind, codes, called, source = parse_call(text)
+                wanted = [tile_code(tile, aka) for tile in (meld.tiles if meld.type != 'nuki' else [meld.tiles])]
+                opened = hasattr(meld, 'called')
+                _expect('%s seat %d call %s' % (where, seat, text), (kind, sorted(codes), called, source), (
+                    meld.type, sorted(wanted), wanted[meld.called] if opened else None,
+                    meld.fromPlayer if opened else None))
+        result = out[-1]
+        if round.agari:
+            _expect(where + ' result', (result[0], len(result)), ('和了', 1 + 2 * len(round.agari)))
+            for index, agari in enumerate(round.agari):
+                win = '%s win %d' % (where, index)
+                detail = result[2 + 2 * index]
+                _expect(win + ' deltas', result[1 + 2 * index], [100 * delta for delta in agari.deltas[:players]])
+                _expect(win + ' players', detail[:3], [
+                    agari.player, agari.fromPlayer if agari.type == 'RON' else agari.player,
+                    agari.player if agari.paoPlayer is None else agari.paoPlayer])
+                _check_points(win, detail[3], agari, round, players)
+                _expect(win + ' yaku', detail[4:],
+                        ['%s(%d飜)' % (TenhouDecoder.Game.YAKU[yaku], yaku_han)
+                         for (yaku, yaku_han) in agari.yaku if yaku_han]
+                        + ['%s(役満)' % TenhouDecoder.Game.YAKU[yakuman] for yakuman in agari.yakuman])
+        elif round.ryuukyoku is not False:
+            deltas = [100 * delta for delta in round.deltas[:players]]
+            if round.ryuukyoku is True:
+                tenpai = len(round.ryuukyoku_tenpai or ())
+                name = '全員聴牌' if tenpai == players else ('全員不聴' if tenpai == 0 else '流局')
+            else:
+                name = DRAWS.get(round.ryuukyoku, '流局')
+            # with everyone or no one tenpai, nothing changes hands
+            wanted = [name]
+            if name not in ('全員聴牌', '全員不聴') and (round.ryuukyoku is True or any(deltas)):
+                wanted.append(deltas)
+            _expect(where + ' result', result, wanted)
+        else:
+            _expect(where + ' result', result, [])
+
+
+def _convert_chunk(items, check=False):
+    """
+    convert a list of (key, log) pairs, in a worker process. Returns a list of
+    (key, JSON text, rounds, error), where the text is None if the game failed
+    """
+    out = []
+    for key, log in items:
+        try:
+            game = TenhouDecoder.Game(lang='DEFAULT')
+            game.decode(log['content'])
+            data = convert(game, key)
+            text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+            if check:
+                # check what is written, as it reads back
+                data = json.loads(text)
+                replay(data)
+                compare(game, data)
+            out.append((key, text, len(data['log']), None))
+        except Exception as error:
+            out.append((key, None, 0, '%s: %s' % (type(error).__name__, error)))
+    return out
+
+
+def convert_archive(items, jobs=1, chunk=CHUNK, check=False):
+    """
+    convert (key, log) pairs, yielding (key, JSON text, rounds, error) in key
+    order. With jobs > 1, chunks of games are converted in a process pool, with
+    at most two chunks per job queued or waiting to be yielded at any time
+    """
+    chunks = (items[start : start + chunk] for start in range(0, len(items), chunk))
+    if jobs <= 1:
+        for part in chunks:
+            for result in _convert_chunk(part, check):
+                yield result
+        return
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = deque()
+        for part in chunks:
+            pending.append(pool.submit(_convert_chunk, part, check))
+            if len(pending) < 2 * jobs:
+                continue
+            for result in pending.popleft().result():
+                yield result
+        while pending:
+            for result in pending.popleft().result():
+                yield result
@@ -0,0 +1,131 @@
+"""
+search games by what was in the hands: waits, shapes and tiles held.
+
+Each game gets a small index, built once at ingest, with one row for every
+hand that was shown at the end of a round: the winning hands, and the tenpai
+hands revealed at an exhaustive draw. Queries are then numpy expressions over
+those rows for a whole archive at once, with no log decoding.
+"""
+
+# third-party libraries
+import numpy as np
+
+# own imports
+import TenhouDecoder
+import TenhouHand
+
+VERSION = 1
+
+OUTCOMES = ('won', 'dealt-in', 'tenpai', 'other')
+
+
+def index_game(content):
+    """
+    build the shape index of one game from its mjlog content, bytes or text.
+    Plain python types only, so the index can be pickled into the archive
+    without needing numpy to load it again
+    """
+    game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=True)
+    game.decode(content)
+    rows = {'round': [], 'player': [], 'won': [], 'from': [],
+            'riichi': [], 'waits': [], 'forms': []}
+    hands = bytearray()
+
+    def add_row(round_index, player, tenpai_tiles, won, from_player, round):
+        hand = TenhouHand.counts(tenpai_tiles)
+        waits, forms = TenhouHand.waits(hand)
+        rows['round'].append(round_index)
+        rows['player'].append(player)
+        rows['won'].append(won)
+        rows['from'].append(from_player)
+        rows['riichi'].append(player in round.reaches)
+        rows['waits'].append(waits)
+        rows['forms'].append(forms)
+        hands.extend(hand)
+
+    for round_index, round in enumerate(getattr(game, 'rounds', ())):
+        for agari in round.agari:
+            tenpai_tiles = list(agari.hand)
+            if agari.machi and agari.machi[0] in tenpai_tiles:
+                tenpai_tiles.remove(agari.machi[0])
+            add_row(round_index, agari.player, tenpai_tiles, True,
+                    agari.fromPlayer if agari.type == 'RON' else -1, round)
+        for player, hand in zip(round.ryuukyoku_tenpai or (), round.ryuukyoku_hands):
+            add_row(round_index, player, hand, False, -1, round)
+
+    rows['hands'] = bytes(hands)
+    rows['version'] = VERSION
+    return rows
+
+
+def get_index(log):
+    """ the shape index for a log, building it if the archive predates it """
+    index = log.get('shapes')
+    if index is None or index.get('version') != VERSION:
+        index = index_game(log['content'])
+    return index
+
+
+class ShapeTable():
+    """
+            the shape index rows of many games, stacked into numpy columns
+    """
+
+    def __init__(self, keys, indexes, seats):
+        """ seats holds, for each game, the seat of the account we're searching for """
+        lengths = np.array([len(index['round']) for index in indexes], dtype=np.int64)
+        self.keys = list(keys)
+        self.game = np.repeat(np.arange(len(indexes)), lengths)
+        self.seat = np.repeat(np.asarray(seats, dtype=np.int8), lengths)
+
+        def column(name, dtype):
+            return np.fromiter(
+                (value for index in indexes for value in index[name]),
+                dtype=dtype, count=int(lengths.sum()))
+
+        self.player = column('player', np.int8)
+        self.won = column('won', np.bool_)
+        self.from_player = column('from', np.int8)
+        self.riichi = column('riichi', np.bool_)
+        self.waits = column('waits', np.uint64)
+        self.forms = column('forms', np.uint8)
+        self.hands = np.frombuffer(
+            b''.join(index['hands'] for index in indexes), dtype=np.uint8).reshape(-1, 34)
+
+
+    def select(self, waits=None, contains=None, forms=0, outcome=None, riichi=False):
+        """
+        boolean mask of the rows that meet every given criterion:
+            waits:    34 counts; the hand waits on exactly these tiles
+            contains: 34 counts; the hand holds at least these tiles
+            forms:    TenhouHand form flags; the hand is tenpai in all of them
+            outcome:  one of OUTCOMES, from the point of view of the searching account
+            riichi:   the hand's owner had declared riichi
+        """
+        rows = np.ones(len(self.player), dtype=np.bool_)
+        if waits is not None:
+            wanted = np.uint64(TenhouHand.mask(i for i, count in enumerate(waits) if count))
+            rows &= self.waits == wanted
+        if contains is not None:
+            rows &= (self.hands >= np.asarray(contains, dtype=np.uint8)).all(axis=1)
+        if forms:
+            rows &= (self.forms & np.uint8(forms)) == forms
+        # a tsumo has no from_player (-1), as has a game the account wasn't in (seat -1)
+        dealt_in = self.won & (self.from_player == self.seat) & (self.from_player >= 0)
+        if outcome == 'won':
+            rows &= self.won & (self.player == self.seat)
+        elif outcome == 'dealt-in':
+            rows &= dealt_in
+        elif outcome == 'tenpai':
+            rows &= ~self.won
+        elif outcome == 'other':
+            rows &= (self.player != self.seat) & ~dealt_in
+        if riichi:
+            rows &= self.riichi
+        return rows
+
+
+    def matching_keys(self, **criteria):
+        """ the set of game keys with at least one row meeting the criteria """
+        games = np.unique(self.game[self.select(**criteria)])
+        return {self.keys[game] for game in games}
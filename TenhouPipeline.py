@@ -0,0 +1,299 @@
+"""
+run an analysis over a corpus of games too big to hold in memory at once. The
+corpus is a directory of shards: archives (.pickle.7z), zip and tar files of
+mjlog files, and directories of loose mjlog files, any of them gzipped.
+
+Games go through three stages, connected by bounded queues: reader processes
+stream the games out of each shard in batches, worker processes decode each
+batch and count it into a counter of its own, and the main process reduces the
+counters of each shard into one. A stage waits when the queue it feeds is
+full, so only a fixed number of batches is ever in flight, however big the
+corpus is. Only archives are read whole, as each is a single pickle.
+
+Once all of a shard's batches are reduced, its counter is saved as a
+checkpoint. A run that stops part way, for whatever reason, can be started
+again with the same settings, and loads the checkpoints of the shards already
+finished instead of reading them again. A shard that has changed since its
+checkpoint is read again
+"""
+
+# core libraries
+import gzip
+import hashlib
+import multiprocessing
+import os
+import pickle
+import queue
+import sys
+import tarfile
+import zipfile
+
+# own imports
+import TenhouArchive
+import TenhouDecoder
+import TenhouImport
+
+# bump this whenever a change would make saved checkpoints count differently
+VERSION = 1
+
+# games are passed from the readers to the workers this many at a time
+BATCH = 64
+# the batches that may wait in each queue, per worker process
+DEPTH = 4
+# how often, in seconds, the main process checks that the others are still running
+POLL = 1.0
+
+ARCHIVE = '.pickle.7z'
+
+
+def find_shards(directory):
+    """
+    the shards in a directory and its subdirectories, sorted by path: each
+    archive, zip and tar, and each directory with loose log files in it
+    """
+    found = set()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith((ARCHIVE, '.zip')) or TenhouImport.is_tar(name):
+                found.add(os.path.join(root, name))
+            elif TenhouImport.is_log(name):
+                found.add(root)
+    return sorted(found)
+
+
+def _loose_logs(path):
+    """ the log files directly in a directory, sorted by name """
+    return sorted(name for name in os.listdir(path)
+                  if TenhouImport.is_log(name) and os.path.isfile(os.path.join(path, name)))
+
+
+def stamp(path):
+    """ the size and modification time of a shard, to tell whether it has changed """
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+    digest = hashlib.sha1()
+    for name in _loose_logs(path):
+        stat = os.stat(os.path.join(path, name))
+        digest.update(('%s %d %d\n' % (name, stat.st_size, stat.st_mtime_ns)).encode())
+    return digest.hexdigest()
+
+
+def _unzip(data):
+    return gzip.decompress(data) if data[:2] == TenhouImport.GZIP_MAGIC else data
+
+
+def read_games(path):
+    """ the (key, content) of each game in a shard, read one at a time where the format allows """
+    if os.path.isdir(path):
+        for name in _loose_logs(path):
+            with open(os.path.join(path, name), 'rb') as infile:
+                yield TenhouImport.key_of(name), _unzip(infile.read())
+    elif path.endswith(ARCHIVE):
+        logs = TenhouArchive.load(os.path.basename(path)[: -len(ARCHIVE)], os.path.dirname(path) + os.sep)
+        for key, log in logs.items():
+            yield key, log['content']
+    elif path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if TenhouImport.is_log(name):
+                    yield TenhouImport.key_of(name), _unzip(archive.read(name))
+    else:
+        # stream mode, so a compressed tar is read once, front to back
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and TenhouImport.is_log(member.name):
+                    yield TenhouImport.key_of(member.name), _unzip(archive.extractfile(member).read())
+
+
+def count_batch(batch, make_counter):
+    """
+    decode a list of (key, content) pairs and count them into a new counter.
+    Returns the counter and the number of games that could not be decoded
+    """
+    counter = make_counter()
+    failed = 0
+    for key, content in batch:
+        try:
+            game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=False)
+            game.decode(content)
+        except Exception as error:
+            print('failed to decode %s: %s' % (key, error), file=sys.stderr)
+            failed += 1
+            continue
+        counter.addGame(game, key)
+    return counter, failed
+
+
+def _reader(shards, batches, results, since, before):
+    """
+    the first stage: split the games of each shard taken from shards into
+    batches, then tell the main process how many batches the shard made
+    """
+    for index, path in iter(shards.get, None):
+        count = 0
+        batch = []
+        try:
+            for key, content in read_games(path):
+                if not TenhouArchive.in_range(key, since, before):
+                    continue
+                batch.append((key, content))
+                if len(batch) == BATCH:
+                    batches.put((index, batch))
+                    count += 1
+                    batch = []
+            if batch:
+                batches.put((index, batch))
+                count += 1
+        except Exception as error:
+            results.put(('failed', index, '%s: %s' % (type(error).__name__, error)))
+        else:
+            results.put(('read', index, count))
+
+
+def _worker(batches, results, make_counter):
+    """ the second stage: decode and count each batch """
+    for index, batch in iter(batches.get, None):
+        counter, failed = count_batch(batch, make_counter)
+        results.put(('counted', index, counter, failed))
+
+
+def checkpoint_path(checkpoints, path):
+    """ the checkpoint file of a shard, named by a hash of its absolute path """
+    return os.path.join(checkpoints, hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:20] + '.pickle')
+
+
+def save_checkpoint(checkpoints, path, fingerprint, counter, failed):
+    """ save the counter of a finished shard, along with the settings it was counted with """
+    target = checkpoint_path(checkpoints, path)
+    with open(target + '.tmp', 'wb') as outfile:
+        pickle.dump({
+            'version': VERSION,
+            'fingerprint': fingerprint,
+            'shard': os.path.abspath(path),
+            'stamp': stamp(path),
+            'failed': failed,
+            'counter': counter,
+        }, outfile, protocol=4)
+    os.replace(target + '.tmp', target)
+
+
+def load_checkpoint(checkpoints, path, fingerprint):
+    """
+    the saved (counter, failed) of a shard, or None if there isn't a checkpoint
+    of it as it is now, counted with the same settings and VERSION
+    """
+    try:
+        with open(checkpoint_path(checkpoints, path), 'rb') as infile:
+            saved = pickle.load(infile)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    if (saved.get('version') != VERSION or saved.get('fingerprint') != fingerprint
+            or saved.get('shard') != os.path.abspath(path) or saved.get('stamp') != stamp(path)):
+        return None
+    return saved['counter'], saved['failed']
+
+
+def run(directory, make_counter, checkpoints, fingerprint, jobs=1, readers=1,
+        since=None, before=None, rebuild=False, progress=None):
+    """
+    count every game in the shards of a directory, and return the merged
+    counter and the number of games that failed to decode.
+
+    make_counter() makes an empty counter, and must be picklable, e.g. a
+    functools.partial of TenhouYaku.YakuCounter: any counter with addGame(game,
+    key) and + will do. Checkpoints are kept in the checkpoints directory, and
+    must have been made with the same fingerprint to be used; with rebuild,
+    every shard is read again. progress(path, counter, done, total) is called
+    as each shard is finished or loaded from its checkpoint
+    """
+    os.makedirs(checkpoints, exist_ok=True)
+    paths = find_shards(directory)
+    total = make_counter()
+    failed = 0
+    done = 0
+    todo = []
+    for path in paths:
+        saved = None if rebuild else load_checkpoint(checkpoints, path, fingerprint)
+        if saved is None:
+            todo.append(path)
+            continue
+        total += saved[0]
+        failed += saved[1]
+        done += 1
+        if progress:
+            progress(path, saved[0], done, len(paths))
+    if not todo:
+        return total, failed
+
+    jobs = max(1, jobs)
+    readers = max(1, min(readers, len(todo)))
+    shards = multiprocessing.Queue()
+    batches = multiprocessing.Queue(jobs * DEPTH)
+    results = multiprocessing.Queue(jobs * DEPTH)
+    for index, path in enumerate(todo):
+        shards.put((index, path))
+    for _ in range(readers):
+        shards.put(None)
+    processes = [multiprocessing.Process(target=_reader, args=(shards, batches, results, since, before), daemon=True)
+                 for _ in range(readers)]
+    processes += [multiprocessing.Process(target=_worker, args=(batches, results, make_counter), daemon=True)
+                  for _ in range(jobs)]
+    for process in processes:
+        process.start()
+
+    # the shards being counted, by index: [counter, batches counted, games failed, batches in all]
+    pending = {}
+    finished = 0
+    try:
+        while finished < len(todo):
+            try:
+                message = results.get(timeout=POLL)
+            except queue.Empty:
+                for process in processes:
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError(
+                            'a pipeline process died with exit code %d; the finished shards are '
+                            'checkpointed, so run again to carry on' % process.exitcode) from None
+                continue
+            kind, index = message[:2]
+            if kind == 'failed':
+                # a shard that cannot be read is left out, and not checkpointed, so a later run tries it again
+                print('failed to read %s: %s' % (todo[index], message[2]), file=sys.stderr)
+                pending[index] = None
+                finished += 1
+                continue
+            shard = pending.setdefault(index, [make_counter(), 0, 0, None])
+            if shard is None:
+                # what was counted of the failed shard before it failed
+                continue
+            if kind == 'read':
+                shard[3] = message[2]
+            else:
+                shard[0] += message[2]
+                shard[1] += 1
+                shard[2] += message[3]
+            if shard[1] == shard[3]:
+                save_checkpoint(checkpoints, todo[index], fingerprint, shard[0], shard[2])
+                total += shard[0]
+                failed += shard[2]
+                pending[index] = None
+                finished += 1
+                if progress:
+                    progress(todo[index], shard[0], done + finished, len(paths))
+        for _ in range(jobs):
+            batches.put(None)
+        # workers may still be counting batches of a failed shard; what they send is
+        # thrown away, but has to be read for them to finish
+        while any(process.is_alive() for process in processes):
+            try:
+                results.get(timeout=POLL)
+            except queue.Empty:
+                pass
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    return total, failed
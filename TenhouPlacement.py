@@ -0,0 +1,178 @@
+"""
+placement and score statistics, from the metadata stored with each game
+(sc, place, rate, meanrate, lobby), without decoding any logs
+"""
+
+# core libraries
+import os
+import pickle
+
+# third-party libraries
+import numpy as np
+
+# own imports
+from TenhouArchive import in_range
+
+COLUMNS = {
+    'key': 'U32',
+    'lobby': 'U8',
+    'type': 'U4',       # the game type field of the key, e.g. 00a9
+    'seats': np.int8,   # 3 for sanma, else 4
+    'place': np.int8,
+    'score': np.int32,  # final score, before uma
+    'points': np.float64, # final result, with uma
+    'rate': np.float64,
+    'meanrate': np.float64,
+}
+
+
+def game_row(player, key, log):
+    """ one row of the table for a game, or None if its metadata is incomplete """
+    try:
+        seat = log['uname'].index(player)
+        sc = log['sc'].split(',')
+        place = int(log['place'])
+    except (KeyError, ValueError, AttributeError):
+        return None
+    if not place:
+        return None
+    return (key, str(log.get('lobby', '')), key.split('-')[1] if '-' in key else '',
+            3 if '' in log['uname'] else 4, place,
+            int(float(sc[2 * seat]) * 100), float(sc[2 * seat + 1]),
+            float(log.get('rate', 0)), float(log.get('meanrate', 0)))
+
+
+class PlacementStats():
+    """
+            a table of one player's game results, that grows as games arrive,
+            and the stats computed from it
+    """
+    # bump this if the rows would be built differently
+    VERSION = 1
+
+    def __init__(self, player):
+        self.player = player
+        self.columns = dict((name, np.zeros(0, dtype=dtype)) for (name, dtype) in COLUMNS.items())
+        self._keys = set()
+
+
+    def add(self, logs):
+        """ add the games not already in the table. Returns how many were added """
+        rows = []
+        for key, log in logs.items():
+            if key in self._keys:
+                continue
+            row = game_row(self.player, key, log)
+            if row is not None:
+                rows.append(row)
+                self._keys.add(key)
+        if rows:
+            for position, (name, dtype) in enumerate(COLUMNS.items()):
+                self.columns[name] = np.concatenate(
+                    (self.columns[name], np.array([row[position] for row in rows], dtype=dtype)))
+        return len(rows)
+
+
+    def save(self, path):
+        with open(path + '.tmp', 'wb') as outfile:
+            pickle.dump({'version': self.VERSION, 'player': self.player, 'columns': self.columns},
+                        outfile, protocol=4)
+        os.replace(path + '.tmp', path)
+
+
+    @classmethod
+    def load(cls, path, player):
+        """ the saved table, or an empty one if there is none usable """
+        stats = cls(player)
+        try:
+            with open(path, 'rb') as infile:
+                saved = pickle.load(infile)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return stats
+        if saved.get('version') == cls.VERSION and saved.get('player') == player:
+            stats.columns = saved['columns']
+            stats._keys = set(stats.columns['key'].tolist())
+        return stats
+
+
+    def groups(self, by=None, since=None, before=None):
+        """
+        row indices of each group, in sorted group order. by is None (everything),
+        'month', 'year', 'lobby' or 'type'. since and before are yyyymmdd, as for
+        in_range: games on the since date are included, those on the before date are not
+        """
+        keys = self.columns['key']
+        dates = np.array([key[0:8] for key in keys.tolist()], dtype='U8')
+        keep = np.array([in_range(key, since, before) for key in keys.tolist()], dtype=np.bool_)
+        if by is None:
+            labels = np.full(len(keys), 'all', dtype='U3')
+        elif by == 'month':
+            labels = dates.astype('U6')
+        elif by == 'year':
+            labels = dates.astype('U4')
+        else:
+            labels = self.columns[by]
+        out = []
+        for label in np.unique(labels[keep]):
+            out.append((str(label), np.flatnonzero(keep & (labels == label))))
+        return out
+
+
+    def summary(self, rows, bootstrap=0, confidence=0.95, seed=0):
+        """
+        stats for the given rows: games, share of each place, mean place, score
+        and points, and the stable rate: the rate at which the expected change per
+        game is zero, (meanrate - rate) / 200 + 10 - 4 * place, i.e. after 400 games.
+        With bootstrap > 0, each mean also gets a confidence interval from that many
+        resamples, all drawn at once as one array
+        """
+        place = self.columns['place'][rows].astype(np.float64)
+        score = self.columns['score'][rows].astype(np.float64)
+        points = self.columns['points'][rows]
+        meanrate = self.columns['meanrate'][rows]
+        four = self.columns['seats'][rows] == 4
+        out = {
+            'games': len(rows),
+            'places': [float((place == p).mean()) if len(rows) else 0.0 for p in (1, 2, 3, 4)],
+        }
+        samples = {
+            'place': place,
+            'score': score,
+            'points': points,
+        }
+        for name, values in samples.items():
+            out[name] = float(values.mean()) if len(values) else float('nan')
+        # the stable rate only makes sense for four-player games
+        four_place = place[four]
+        four_meanrate = meanrate[four]
+        out['stable_rate'] = (
+            float(four_meanrate.mean() + 200 * (10 - 4 * four_place.mean()))
+            if len(four_place) else float('nan'))
+
+        if bootstrap and len(rows):
+            rng = np.random.default_rng(seed)
+            tail = 100 * (1 - confidence) / 2
+            means = _resample_means(rng, list(samples.values()), bootstrap)
+            for name, resampled in zip(samples, means):
+                out[name + '_ci'] = tuple(np.percentile(resampled, (tail, 100 - tail)).tolist())
+            if len(four_place):
+                resampled_rate, resampled_place = _resample_means(rng, [four_meanrate, four_place], bootstrap)
+                rates = resampled_rate + 200 * (10 - 4 * resampled_place)
+                out['stable_rate_ci'] = tuple(np.percentile(rates, (tail, 100 - tail)).tolist())
+        return out
+
+
+def _resample_means(rng, columns, count, cells=1 << 22):
+    """
+    the means of count bootstrap resamples of equal-length columns, using the same
+    resampled rows for every column. Resamples are drawn as one array, in chunks
+    of about cells entries to bound memory
+    """
+    size = len(columns[0])
+    step = max(1, cells // size)
+    out = [[] for _ in columns]
+    for start in range(0, count, step):
+        draws = rng.integers(0, size, size=(min(step, count - start), size))
+        for means, column in zip(out, columns):
+            means.append(column[draws].mean(axis=1))
+    return [np.concatenate(means) for means in out]
@@ -0,0 +1,122 @@
+"""
+tenhou R-rate: replaying an account's history, checking it against the rates
+stored with each game, and what-if simulations over the whole history.
+
+After each game, the rate changes by
+    factor * (BASE[place] + (meanrate - rate) / 40)
+where meanrate is the mean rate of the table at the start of the game, and
+factor is 1 - 0.002 * (games played before this one), but never below 0.2.
+That makes each step an affine map of the rate, rate * a + c, so the steps are
+composed in blocks with cumulative products, and many scenarios run at once as
+rows of one array.
+"""
+
+# third-party libraries
+import numpy as np
+
+BASE = {
+    4: np.array([0, 30, 10, -10, -30], dtype=np.float64),
+    3: np.array([0, 30, 0, -30], dtype=np.float64),
+}
+
+START_RATE = 1500.0
+
+# rates are stored to two decimal places
+TOLERANCE = 0.02
+
+
+def factor(games):
+    """ the adjustment for how many games have been played before this one """
+    return np.maximum(1 - 0.002 * np.asarray(games, dtype=np.float64), 0.2)
+
+
+def history(logs, player, seats=4):
+    """
+    the player's games with this many seats, in archive order, as arrays of
+    key, place, rate (at the start of the game) and meanrate
+    """
+    rows = [
+        (key, log['place'], log['rate'], log['meanrate'])
+        for key, log in logs.items()
+        if log.get('place') and player in log.get('uname', ())
+        and (3 if '' in log['uname'] else 4) == seats]
+    return {
+        'key': np.array([row[0] for row in rows], dtype='U32'),
+        'place': np.array([row[1] for row in rows], dtype=np.int8),
+        'rate': np.array([row[2] for row in rows], dtype=np.float64),
+        'meanrate': np.array([row[3] for row in rows], dtype=np.float64),
+    }
+
+
+def _steps(places, meanrates, start_games, seats):
+    """ the affine step of each game, rate -> rate * a + c, as arrays shaped like places """
+    places = np.asarray(places)
+    f = factor(start_games + np.arange(places.shape[-1]))
+    a = np.broadcast_to(1 - f / 40, places.shape)
+    c = f * (BASE[seats][places] + np.asarray(meanrates) / 40)
+    return a, c
+
+
+def simulate(places, meanrates, start_rate=START_RATE, start_games=0, seats=4, block=256):
+    """
+    the rate before each game, and after the last one, for one or many scenarios:
+    places is (n,) or (scenarios, n), meanrates broadcasts against it.
+    Returns an array shaped like places, but one longer in the last axis
+    """
+    places = np.asarray(places)
+    single = places.ndim == 1
+    places = np.atleast_2d(places)
+    count = places.shape[-1]
+    a, c = _steps(places, meanrates, start_games, seats)
+    a = np.broadcast_to(a, places.shape)
+    c = np.broadcast_to(c, places.shape)
+    # pad to whole blocks with steps that leave the rate alone
+    blocks = -(-count // block) if count else 0
+    pad = blocks * block - count
+    a = np.pad(a, ((0, 0), (0, pad)), constant_values=1).reshape(len(places), blocks, block)
+    c = np.pad(c, ((0, 0), (0, pad)), constant_values=0).reshape(len(places), blocks, block)
+    # within each block, the composition of its first k steps is rate * A[k] + C[k]
+    cumulative = np.cumprod(a, axis=2)
+    A = np.concatenate((np.ones(a.shape[:2] + (1,)), cumulative), axis=2)
+    C = A[:, :, 1:] * np.cumsum(c / cumulative, axis=2)
+    C = np.concatenate((np.zeros(a.shape[:2] + (1,)), C), axis=2)
+    # then carry the rate from block to block
+    rates = np.empty((len(places), blocks * block + 1))
+    start = np.full(len(places), float(start_rate))
+    for index in range(blocks):
+        rates[:, index * block : (index + 1) * block + 1] = (
+            start[:, None] * A[:, index] + C[:, index])
+        start = rates[:, (index + 1) * block]
+    if not blocks:
+        rates[:, 0] = start
+    rates = rates[:, : count + 1]
+    return rates[0] if single else rates
+
+
+def predict(games, start_games, seats=4):
+    """ the rate expected after each game, from the stored rate before it """
+    f = factor(start_games + np.arange(len(games['place'])))
+    return games['rate'] + f * (BASE[seats][games['place']] + (games['meanrate'] - games['rate']) / 40)
+
+
+def mismatches(games, start_games, seats=4, tolerance=TOLERANCE):
+    """ indices of the games whose successor's stored rate is not what the formula gives """
+    expected = predict(games, start_games, seats)[:-1]
+    return np.flatnonzero(np.abs(expected - games['rate'][1:]) > tolerance)
+
+
+def estimate_start_games(games, seats=4, candidates=401):
+    """
+    how many games the account had played before the first one stored:
+    the count, up to candidates - 1, that best explains the first stored rate changes.
+    Every candidate is tried at once
+    """
+    count = min(len(games['place']), candidates) - 1
+    if count <= 0:
+        return 0
+    tried = np.arange(candidates)[:, None]
+    f = factor(tried + np.arange(count)[None, :])
+    rate = games['rate'][:count]
+    expected = rate + f * (BASE[seats][games['place'][:count]] + (games['meanrate'][:count] - rate) / 40)
+    misses = (np.abs(expected - games['rate'][1 : count + 1]) > TOLERANCE).sum(axis=1)
+    return int(np.argmin(misses))
@@ -0,0 +1,167 @@
+"""
+replay the events of a round, keeping every player's hand, melds and river,
+and the tiles visible to all, up to date as it goes.
+
+Analyzers are objects with any of these methods, which are called with the
+Replay as it stands at that point of the round:
+
+    start(replay)                             before the first event
+    draw(replay, player, tile)                after the tile is in the hand
+    discard(replay, player, tile, flags)      before the tile leaves the hand,
+                                              i.e. at the point of decision
+    call(replay, player, meld)                after the meld is made
+    end(replay)                               after the last event
+
+Several analyzers can share one pass. The state is updated in place, so an
+analyzer that needs to keep it must copy what it needs, e.g. with snapshot().
+"""
+
+# third-party libraries
+import numpy as np
+
+# own imports
+import TenhouDecoder
+
+# flags on river tiles
+TSUMOGIRI = 1 # discarded straight after being drawn
+RIICHI = 2    # the tile that declared riichi
+CALLED = 4    # taken by another player's call
+
+# tile ids of the red fives, in man, pin, sou order
+RED_FIVES = (16, 52, 88)
+
+
+class Replay():
+    """
+            the state of one round, replayed event by event
+    """
+
+    def __init__(self, round):
+        self.round = round
+        self.players = len(round.hands)
+        self.hands = np.zeros((4, 34), dtype=np.int8) # concealed tiles, as counts
+        self.red = np.zeros((4, 3), dtype=np.bool_)   # red fives held in the concealed hand
+        self.melds = [[], [], [], []]
+        self.rivers = [[], [], [], []]                # (tile id, flags)
+        self.visible = np.zeros(34, dtype=np.int8)     # tiles seen by everyone
+        self.dora = []                                  # dora indicators
+        self.riichi = [False] * 4
+        self.last_draw = [None] * 4
+        self.event = -1                                 # index of the current event
+        self._riichi_pending = [False] * 4
+        for player, hand in enumerate(round.hands):
+            for tile in hand:
+                self._take(player, tile)
+
+
+    def _take(self, player, tile):
+        self.hands[player, tile // 4] += 1
+        if tile in RED_FIVES:
+            self.red[player, RED_FIVES.index(tile)] = True
+
+
+    def _give(self, player, tile):
+        self.hands[player, tile // 4] -= 1
+        if tile in RED_FIVES:
+            self.red[player, RED_FIVES.index(tile)] = False
+
+
+    def run(self, *analyzers):
+        """ replay the whole round, calling the analyzers at each step """
+        hooks = {
+            name: [getattr(analyzer, name) for analyzer in analyzers if hasattr(analyzer, name)]
+            for name in ('start', 'draw', 'discard', 'call', 'end')}
+        for hook in hooks['start']:
+            hook(self)
+        for self.event, event in enumerate(self.round.events):
+            if isinstance(event, TenhouDecoder.Draw):
+                self._take(event.player, event.tile)
+                self.last_draw[event.player] = event.tile
+                for hook in hooks['draw']:
+                    hook(self, event.player, event.tile)
+            elif isinstance(event, TenhouDecoder.Discard):
+                player = event.player
+                flags = 0
+                if event.tile == self.last_draw[player]:
+                    flags |= TSUMOGIRI
+                if self._riichi_pending[player]:
+                    flags |= RIICHI
+                    self._riichi_pending[player] = False
+                    self.riichi[player] = True
+                for hook in hooks['discard']:
+                    hook(self, player, event.tile, flags)
+                self._give(player, event.tile)
+                self.rivers[player].append((event.tile, flags))
+                self.visible[event.tile // 4] += 1
+                self.last_draw[player] = None
+            elif isinstance(event, TenhouDecoder.Call):
+                self._call(event.player, event.meld)
+                for hook in hooks['call']:
+                    hook(self, event.player, event.meld)
+            elif isinstance(event, TenhouDecoder.Riichi):
+                self._riichi_pending[event.player] = True
+            elif isinstance(event, TenhouDecoder.Dora):
+                self.dora.append(event.tile)
+                self.visible[event.tile // 4] += 1
+        for hook in hooks['end']:
+            hook(self)
+        return self
+
+
+    def _call(self, player, meld):
+        tiles = meld.tiles if isinstance(meld.tiles, tuple) else (meld.tiles,)
+        if meld.type in ('chi', 'pon') or (meld.type == 'kan' and hasattr(meld, 'fromPlayer')):
+            # the called tile came from the last discard, and is already visible
+            called = tiles[meld.called]
+            for tile in tiles:
+                if tile != called:
+                    self._give(player, tile)
+                    self.visible[tile // 4] += 1
+            discarder = (player + meld.fromPlayer) % 4
+            if self.rivers[discarder]:
+                tile, flags = self.rivers[discarder][-1]
+                self.rivers[discarder][-1] = (tile, flags | CALLED)
+            self.melds[player].append(meld)
+        elif meld.type == 'chakan':
+            # the added tile is the fourth one; the pon is already on the table
+            added = tiles[3]
+            self._give(player, added)
+            self.visible[added // 4] += 1
+            for index, old in enumerate(self.melds[player]):
+                if old.type == 'pon' and old.tiles[0] // 4 == added // 4:
+                    self.melds[player][index] = meld
+                    break
+            else:
+                self.melds[player].append(meld)
+        else:
+            # closed kan, or a nuki'd north
+            for tile in tiles:
+                self._give(player, tile)
+                self.visible[tile // 4] += 1
+            self.melds[player].append(meld)
+        # a call means the next discard is not straight from the wall
+        self.last_draw[player] = None
+
+
+    def snapshot(self, player):
+        """ a copy of what one player can see: their hand, and everything public """
+        return {
+            'hand': self.hands[player].copy(),
+            'red': self.red[player].copy(),
+            'melds': [list(melds) for melds in self.melds],
+            'rivers': [list(river) for river in self.rivers],
+            'visible': self.visible.copy(),
+            'dora': list(self.dora),
+            'riichi': list(self.riichi),
+        }
+
+
+    def unseen(self, player):
+        """ how many of each tile the player has not seen """
+        return 4 - self.visible - self.hands[player]
+
+
+def replay_game(game, *analyzers):
+    """ replay every round of a decoded game (decoded with draws) through the analyzers """
+    for round in game.rounds:
+        Replay(round).run(*analyzers)
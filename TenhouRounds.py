@@ -0,0 +1,100 @@
+"""
+random access to single rounds of the stored games.
+
+Each game gets a small index, built once at ingest, of where its header (the
+tags before the first INIT) ends and where each round starts and ends in the
+stored content: from its INIT to the end of its last AGARI or RYUUKYOKU. It
+also holds each round's name, honba and dealer. One round can then be decoded
+on its own, together with the header for the players and the game type,
+without decoding the rest of the game.
+"""
+
+# core libraries
+import re
+
+# own imports
+from TenhouConfig import account_names
+import TenhouArchive
+import TenhouDecoder
+
+VERSION = 1
+
+TAGS = re.compile(rb'<(INIT|AGARI|RYUUKYOKU)\s[^>]*>')
+SEED = re.compile(rb'\sseed="(\d+),(\d+),')
+OYA = re.compile(rb'\soya="(\d+)"')
+
+FOOTER = b'</mjloggm>'
+
+
+def _content(log):
+    """ the stored content as bytes, which the offsets are into """
+    content = log['content']
+    return content.encode() if isinstance(content, str) else content
+
+
+def index_rounds(content):
+    """
+    build the round index of one game from its mjlog content, with offsets into
+    its bytes. Plain python types only, as for the shape index
+    """
+    if isinstance(content, str):
+        content = content.encode()
+    index = {'version': VERSION, 'header': 0,
+             'start': [], 'end': [], 'name': [], 'honba': [], 'dealer': []}
+    for match in TAGS.finditer(content):
+        if match.group(1) != b'INIT':
+            if index['start']:
+                index['end'][-1] = match.end()
+            continue
+        tag = match.group(0)
+        seed = SEED.search(tag)
+        if not index['start']:
+            index['header'] = match.start()
+        index['start'].append(match.start())
+        index['end'].append(match.end())
+        index['name'].append(TenhouDecoder.Game.ROUND_NAMES[int(seed.group(1)) % len(TenhouDecoder.Game.ROUND_NAMES)])
+        index['honba'].append(int(seed.group(2)))
+        index['dealer'].append(int(OYA.search(tag).group(1)))
+    return index
+
+
+def get_rounds(log):
+    """ the round index for a log, building it if the archive predates it """
+    index = log.get('round_index')
+    if index is None or index.get('version') != VERSION:
+        index = index_rounds(_content(log))
+    return index
+
+
+def find_round(log, name, honba=0):
+    """ the position of a round in a game, by its name (e.g. 南3) and honba """
+    rounds = get_rounds(log)
+    for position, (round_name, round_honba) in enumerate(zip(rounds['name'], rounds['honba'])):
+        if round_name == name and round_honba == honba:
+            return position
+    raise KeyError('%s-%d' % (name, honba))
+
+
+def decode_round(log, position, suppress_draws=False):
+    """
+    decode one round of a game, by its position (0 for the first). Returns a
+    TenhouDecoder.Game with the players and game type from the header, and
+    just that round in its rounds
+    """
+    rounds = get_rounds(log)
+    content = memoryview(_content(log))
+    game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=suppress_draws)
+    game.decode((
+        content[:rounds['header']],
+        content[rounds['start'][position] : rounds['end'][position]],
+        FOOTER))
+    return game
+
+
+def load_round(key, position, players=account_names, suppress_draws=False):
+    """ decode one round of the game with this key, from the first account's archive that holds it """
+    for player in players:
+        logs = TenhouArchive.load(player)
+        if key in logs:
+            return decode_round(logs[key], position, suppress_draws)
+    raise KeyError(key)
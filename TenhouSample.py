@@ -0,0 +1,217 @@
+"""
+approximate stats from a stratified sample of games: the games are split into
+strata by account, month and lobby, a reproducible random sample is drawn from
+each, and every table cell is estimated with a confidence interval
+"""
+
+# core libraries
+import math
+from statistics import NormalDist
+
+# third-party libraries
+import numpy as np
+
+# own imports
+import TenhouArchive
+import TenhouYaku
+
+# a cell seen in fewer sampled games than this is too rare to trust its interval
+MIN_OBSERVED = 10
+
+
+def stratum(player, key, log):
+    """ the stratum of a game: account, month and lobby """
+    return (player, key[0:6], str(log.get('lobby', '')))
+
+
+def game_cells(key, log, player, winner):
+    """
+    count one game in a counter of its own, and return its key and its cells:
+    a dict from cell names to values, without the cells that are zero
+    """
+    counter = TenhouYaku.count_logs([(key, log)], player, winner)
+    out = {('games',): counter.games}
+    for how in ('closed', 'opened'):
+        out[('hands', how)] = counter.hands[how]
+        out[('relevant', how)] = counter.relevantHands[how]
+    out[('hands',)] = out[('hands', 'closed')] + out[('hands', 'opened')]
+    out[('relevant',)] = out[('relevant', 'closed')] + out[('relevant', 'opened')]
+    # yaku cells are by row of the counter's tables, see YakuCounter.row_name
+    for row in np.flatnonzero(counter.yaku_counts.sum(axis=1)).tolist():
+        for column, how in enumerate(('closed', 'opened')):
+            out[('yaku', row, how)] = int(counter.yaku_counts[row, column])
+            out[('han', row, how)] = int(counter.yaku_han[row, column])
+        out[('yaku', row)] = int(counter.yaku_counts[row].sum())
+        out[('han', row)] = int(counter.yaku_han[row].sum())
+    riichi = counter.riichi
+    for row in range(len(riichi.NAMES)):
+        for pursuit in range(riichi.PURSUITS):
+            out[('riichi', row, pursuit)] = int(riichi.counts[row, pursuit])
+            out[('points', row, pursuit)] = int(riichi.points[row, pursuit])
+    for pursuit in range(riichi.PURSUITS):
+        out[('reached', pursuit)] = int(riichi.counts[:, pursuit].sum())
+    return key, dict((cell, value) for (cell, value) in out.items() if value)
+
+
+class StratifiedSample():
+    """
+            a sample that grows in steps: each stratum is shuffled once, from the
+            seed, and a larger sampling rate takes a longer prefix of each, so the
+            games already sampled stay in the sample
+    """
+
+    def __init__(self, labels, seed=0):
+        rng = np.random.default_rng(seed)
+        by_label = {}
+        for index, label in enumerate(labels):
+            by_label.setdefault(label, []).append(index)
+        # shuffle in sorted label order, so the same seed always gives the same sample
+        self.order = dict((label, rng.permutation(by_label[label]).tolist()) for label in sorted(by_label))
+        self.taken = dict((label, 0) for label in self.order)
+
+
+    def grow(self, rate):
+        """
+        the indices newly added to the sample, to take this share of each
+        stratum, but at least two games, for a variance
+        """
+        out = []
+        for label, order in self.order.items():
+            want = min(len(order), max(2, math.ceil(rate * len(order))))
+            out.extend(order[self.taken[label] : want])
+            self.taken[label] = max(want, self.taken[label])
+        return sorted(out)
+
+
+    def sizes(self):
+        return dict((label, len(order)) for (label, order) in self.order.items())
+
+
+class Estimate():
+    """
+            stratified estimates of the totals of game cells over the whole
+            population, from the cells of the sampled games in each stratum
+    """
+
+    def __init__(self, sizes, confidence=0.95):
+        self.sizes = sizes
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.rows = dict((label, []) for label in sizes)
+
+
+    def add(self, label, cells):
+        self.rows[label].append(cells)
+
+
+    def sampled(self):
+        return sum(len(rows) for rows in self.rows.values())
+
+
+    def cells(self):
+        """ every cell seen in the sample """
+        out = set()
+        for rows in self.rows.values():
+            for cells in rows:
+                out.update(cells)
+        return out
+
+
+    def _values(self, cell):
+        return [(label, np.array([cells.get(cell, 0) for cells in rows], dtype=np.float64))
+                for (label, rows) in self.rows.items() if rows]
+
+
+    def _total(self, values):
+        """ the estimated total and its standard error, from each stratum's sampled values """
+        total = variance = 0.0
+        for label, sample in values:
+            size = self.sizes[label]
+            total += size * sample.mean()
+            if len(sample) > 1:
+                variance += size * size * (1 - len(sample) / size) * sample.var(ddof=1) / len(sample)
+        return total, math.sqrt(variance)
+
+
+    def observed(self, cell):
+        """ how many sampled games the cell is not zero in """
+        return sum(1 for rows in self.rows.values() for cells in rows if cells.get(cell))
+
+
+    def total(self, cell):
+        """ the estimated total of a cell over all games, as (estimate, low, high) """
+        total, error = self._total(self._values(cell))
+        return total, total - self.z * error, total + self.z * error
+
+
+    def ratio(self, numerator, denominator):
+        """
+        the estimated ratio of the totals of two cells, as (estimate, low, high),
+        with the linearised variance of the ratio estimator
+        """
+        tops = self._values(numerator)
+        bottoms = self._values(denominator)
+        top = self._total(tops)[0]
+        bottom = self._total(bottoms)[0]
+        if not bottom:
+            return float('nan'), float('nan'), float('nan')
+        ratio = top / bottom
+        residuals = [(label, y - ratio * x) for ((label, y), (_, x)) in zip(tops, bottoms)]
+        error = self._total(residuals)[1] / bottom
+        return ratio, ratio - self.z * error, ratio + self.z * error
+
+
+    def converged(self, error):
+        """
+        True if every count cell is known to within error of its table's total:
+        yaku counts as a share of the relevant hands, riichi outcome counts as a
+        share of the riichis in that pursuit, riichis as a share of all hands, and
+        the other totals as a share of their own value. Han and points are reported,
+        but do not count, and nor do the tables seen in too few sampled games
+        """
+        for cell in self.cells():
+            if cell[0] == 'yaku':
+                reference = ('relevant',)
+            elif cell[0] == 'riichi':
+                reference = ('reached', cell[2])
+            elif cell[0] == 'reached':
+                reference = ('hands',)
+            elif cell[0] in ('games', 'hands', 'relevant'):
+                reference = cell
+            else:
+                continue
+            # a table seen in too few games is warned about instead, as it may never converge
+            if self.observed(reference) < MIN_OBSERVED:
+                continue
+            estimate, low, high = self.total(cell)
+            if (high - low) / 2 > error * self.total(reference)[0]:
+                return False
+        return True
+
+
+def sample_stats(population, winner, rate=0.05, error=None, confidence=0.95, seed=0, jobs=1, progress=None):
+    """
+    estimate the yaku and riichi outcome cells of a population of (player, key, log)
+    games from a stratified sample. The sample starts at rate, and while error is
+    given and not yet met, the rate doubles, decoding only the games added.
+    progress, if given, is called with the estimate after each step
+    """
+    labels = [stratum(*game) for game in population]
+    sample = StratifiedSample(labels, seed)
+    estimate = Estimate(sample.sizes(), confidence)
+    while True:
+        indices = sample.grow(rate)
+        if not indices and estimate.sampled() and rate < 1:
+            # nothing new to decode, so nothing new to check
+            rate = min(1.0, 2 * rate)
+            continue
+        for player in sorted(set(population[i][0] for i in indices)):
+            mine = [i for i in indices if population[i][0] == player]
+            results = TenhouArchive.ordered_map(
+                game_cells, [population[i][1:] for i in mine], jobs, args=(player, winner))
+            for i, (key, cells) in zip(mine, results):
+                estimate.add(labels[i], cells)
+        if progress is not None:
+            progress(estimate)
+        if rate >= 1 or error is None or estimate.converged(error):
+            return estimate
+        rate = min(1.0, 2 * rate)
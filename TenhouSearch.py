@@ -0,0 +1,129 @@
+"""
+criteria for selecting logs from the archive
+"""
+
+# own imports
+import TenhouArchive
+from TenhouArchive import in_range
+import TenhouDecoder
+import TenhouHand
+import TenhouPatterns
+
+SHAPES = {
+    'regular': TenhouHand.REGULAR,
+    'chiitoitsu': TenhouHand.CHIITOITSU,
+    'kokushi': TenhouHand.KOKUSHI,
+}
+
+# the shape tables built for each shard of a player's archive, with the logs
+# they were built from, kept while archives are kept loaded so that a
+# long-running process builds them again only when the archive changes
+_tables = {}
+
+
+class LogFilter():
+    """
+            holds the search criteria, and tests logs against them.
+            Must stay picklable, as it is sent to worker processes
+    """
+
+    def __init__(self, args):
+        self.since = args.since
+        self.before = args.before
+        self.sanma = args.sanma
+        self.no_sanma = args.no_sanma
+        self.lobby = args.lobby
+        self.players = args.player.split(' ') if args.player else None
+        self.yaku = args.yaku.lower() if args.yaku else ''
+        self.yaku_ids = TenhouDecoder.Game.yaku_ids(self.yaku) if self.yaku else frozenset()
+        self.text = args.freetext.lower() if args.freetext else ''
+        self.shape = {}
+        if args.wait:
+            self.shape['waits'] = TenhouHand.parse(args.wait)
+        if args.contains:
+            self.shape['contains'] = TenhouHand.parse(args.contains)
+        if args.shape:
+            self.shape['forms'] = SHAPES[args.shape]
+        if args.outcome:
+            self.shape['outcome'] = args.outcome
+        if args.riichi:
+            self.shape['riichi'] = True
+        self.player = None
+        self.shape_keys = None
+
+
+    def prepare(self, player, logs):
+        """
+        get ready to search one player's archive. The hand-shape criteria are
+        run a shard at a time by prepare_shard, so that games stored before the
+        shape index existed are indexed in the workers, as they are searched
+        """
+        self.player = player
+        self.shape_keys = None
+        if self.shape and TenhouArchive.kept_loaded():
+            held = _tables.get(player)
+            if held is None or held[0] is not logs:
+                _tables[player] = (logs, {})
+
+
+    def prepare_shard(self, items):
+        """ run the hand-shape criteria over a shard of (key, log) pairs at once, keeping the keys of the games that pass """
+        if not self.shape or not items:
+            return
+        held = _tables.get(self.player) if TenhouArchive.kept_loaded() else None
+        name = (self.since, self.before, items[0][0], items[-1][0], len(items))
+        table = held[1].get(name) if held is not None else None
+        if table is None:
+            items = [(key, log) for key, log in items if in_range(key, self.since, self.before)]
+            table = TenhouPatterns.ShapeTable(
+                [key for key, _ in items],
+                [TenhouPatterns.get_index(log) for _, log in items],
+                [log['uname'].index(self.player) if self.player in log['uname'] else -1
+                 for _, log in items])
+            if held is not None:
+                held[1][name] = table
+        self.shape_keys = table.matching_keys(**self.shape)
+
+
+    def _has_yaku(self, log):
+        game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=True)
+        game.decode(log['content'])
+        for round in game.rounds:
+            for agari in round.agari:
+                if hasattr(agari, 'yaku'):
+                    for yaku, han in agari.yaku:
+                        if yaku in self.yaku_ids:
+                            return True
+                if hasattr(agari, 'yakuman'):
+                    for yakuman in agari.yakuman:
+                        if yakuman in self.yaku_ids:
+                            return True
+        return False
+
+
+    def matches(self, key, log):
+        """ True if the log meets all the criteria. Cheap tests go first """
+        if not in_range(key, self.since, self.before):
+            return False
+        if self.shape_keys is not None and key not in self.shape_keys:
+            return False
+        if self.sanma and not '' in log['uname']:
+            return False
+        if self.no_sanma and '' in log['uname']:
+            return False
+        if self.lobby and self.lobby != str(log['lobby']):
+            return False
+        if self.players and not any(player in log['uname'] for player in self.players):
+            return False
+        if self.text and not self.text in log['content'].decode().lower():
+            return False
+        if self.yaku and not self._has_yaku(log):
+            return False
+        return True
+
+
+    def row(self, key, log):
+        """ the output line for a matching log, None otherwise """
+        if self.matches(key, log):
+            return '%s | %s' % (log['log'], log['players'])
+        return None
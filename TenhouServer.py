@@ -0,0 +1,174 @@
+"""
+a resident query server, which keeps the archives loaded between queries. It
+listens on a Unix domain socket and runs the query scripts in its own process
+for each client, streaming their output back as it is printed. An archive is
+reloaded when its file changes on disk, keeping the games it already held.
+
+Each request is one line of JSON, {"script": name, "argv": [arguments]}, and
+each reply is a stream of JSON lines: ["out", text] and ["err", text] as the
+script writes to stdout and stderr, then ["exit", code] at the end.
+Requests are served one at a time, as the scripts' output is redirected for
+the whole process while they run, and each runs with one job, in this process
+with the archives it holds, rather than starting a pool of workers per query
+"""
+
+# core libraries
+import contextlib
+import json
+import os
+import runpy
+import socket
+import socketserver
+import sys
+
+# own imports
+from TenhouConfig import account_names, directory_name
+import TenhouArchive
+
+DEFAULT_SOCKET = directory_name + 'logserver.sock'
+
+# the scripts a client may run: those that only read the archives
+SCRIPTS = ('searchLogs.py', 'analyseMyLogs.py')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# added after the client's arguments, so that it wins over any --jobs they give
+SERVER_ARGV = ['--jobs', '1']
+
+
+class _Stream():
+    """
+            a text file that sends each write to the client as it happens
+    """
+
+    def __init__(self, outfile, name):
+        self.outfile = outfile
+        self.name = name
+
+
+    def write(self, text):
+        if text:
+            self.outfile.write((json.dumps([self.name, text]) + '\n').encode())
+            self.outfile.flush()
+        return len(text)
+
+
+    def flush(self):
+        pass
+
+
+    def isatty(self):
+        return False
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            script = request['script']
+            argv = [str(arg) for arg in request.get('argv', [])]
+        except (ValueError, KeyError, TypeError):
+            self._send(['err', 'bad request\n'], ['exit', 2])
+            return
+        if script not in SCRIPTS:
+            self._send(['err', 'the server does not run %s\n' % script], ['exit', 2])
+            return
+        code = 0
+        saved_argv = sys.argv
+        sys.argv = [script] + argv + SERVER_ARGV
+        try:
+            with contextlib.redirect_stdout(_Stream(self.wfile, 'out')), \
+                    contextlib.redirect_stderr(_Stream(self.wfile, 'err')):
+                try:
+                    runpy.run_path(os.path.join(HERE, script), run_name='__main__')
+                except SystemExit as exit:
+                    code = exit.code if isinstance(exit.code, int) else (0 if exit.code is None else 1)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client went away, e.g. its output was piped into head
+                    return
+                except Exception as error:
+                    print('%s failed: %s: %s' % (script, type(error).__name__, error), file=sys.stderr)
+                    code = 1
+            self._send(['exit', code])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            sys.argv = saved_argv
+
+
+    def _send(self, *messages):
+        for message in messages:
+            self.wfile.write((json.dumps(message) + '\n').encode())
+        self.wfile.flush()
+
+
+def serve(path=DEFAULT_SOCKET, players=account_names):
+    """ load the archives of the players, then answer queries on the socket at path until interrupted """
+    TenhouArchive.keep_loaded()
+    for player in players:
+        print('%s: %d games' % (player, len(TenhouArchive.load(player))))
+    if os.path.exists(path):
+        # a socket left behind by a server that was killed; refuse to take over a live one
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.remove(path)
+        else:
+            raise RuntimeError('a server is already listening on %s' % path)
+        finally:
+            probe.close()
+    # the socket is created readable and writable by its owner only, with no
+    # window in which others could connect
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(path, _Handler)
+    finally:
+        os.umask(umask)
+    with server:
+        print('listening on %s' % path)
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+def client_argv(argv):
+    """ the command-line arguments without --server and its value, to send on to the server """
+    out = []
+    skip = False
+    for index, arg in enumerate(argv):
+        if skip:
+            skip = False
+        elif arg == '--server':
+            # the value is optional, so the next argument is only ours if it isn't an option
+            skip = index + 1 < len(argv) and not argv[index + 1].startswith('-')
+        elif not arg.startswith('--server='):
+            out.append(arg)
+    return out
+
+
+def forward(path, script, argv):
+    """
+    run a script on the server listening at path, copying its output to ours as
+    it arrives. Returns the script's exit code
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError as error:
+        print('cannot reach the log server at %s: %s' % (path, error), file=sys.stderr)
+        return 1
+    with client, client.makefile('rwb') as stream:
+        stream.write((json.dumps({'script': os.path.basename(script), 'argv': client_argv(argv)}) + '\n').encode())
+        stream.flush()
+        for line in stream:
+            kind, value = json.loads(line)
+            if kind == 'exit':
+                return value
+            target = sys.stdout if kind == 'out' else sys.stderr
+            target.write(value)
+            target.flush()
+    print('the log server closed the connection', file=sys.stderr)
+    return 1
@@ -0,0 +1,200 @@
+"""
+watch browser storage and drop directories for new games, and ingest them as
+they appear. Only file metadata (mtime and size) is polled, so an idle watcher
+does almost nothing; changes are collected until things have been quiet for a
+debounce window, then ingested in one batch
+"""
+
+# core libraries
+import configparser
+import json
+import os
+import sqlite3
+import time
+
+# own imports
+import ChromeStorage
+import TenhouImport
+
+
+def firefox_store(profile_dir):
+    """ the webappsstore.sqlite of the first Firefox profile, as getlogs.py finds it """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(profile_dir, 'profiles.ini'))
+    return os.path.join(profile_dir, config['Profile0']['Path'], 'webappsstore.sqlite')
+
+
+def read_firefox(store):
+    """ the tenhou logN localStorage items in Firefox's store, as a dict """
+    with sqlite3.connect('file:%s?mode=ro' % store, uri=True) as db:
+        rows = db.execute(
+            "SELECT key, value FROM webappsstore2 WHERE originKey LIKE 'ten.uohnet%' AND key LIKE 'log%'").fetchall()
+    return dict((key, value) for (key, value) in rows if key[3:].isdigit())
+
+
+def read_chrome(directory):
+    """ the tenhou logN localStorage items in Chrome's leveldb directory, as a dict """
+    return dict((key, value) for (key, value) in ChromeStorage.local_storage(directory).items()
+                if key.startswith('log') and key[3:].isdigit())
+
+
+class FileIndex():
+    """
+            the mtime and size of each file seen, to tell which have changed
+    """
+
+    def __init__(self):
+        self.seen = {}
+
+
+    def changed(self, paths):
+        """ the paths that are new, changed or gone since the last call """
+        out = []
+        current = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            current[path] = (stat.st_mtime_ns, stat.st_size)
+            if self.seen.get(path) != current[path]:
+                out.append(path)
+        out.extend(path for path in self.seen if path not in current)
+        self.seen = current
+        return out
+
+
+def _files(directory):
+    """ every file under a directory """
+    out = []
+    for root, _, names in os.walk(directory):
+        out.extend(os.path.join(root, name) for name in names)
+    return out
+
+
+def _discover(paths):
+    """ the import tasks for the files, as from TenhouImport.discover, leaving out any that cannot be read """
+    tasks = []
+    for path in paths:
+        try:
+            tasks += TenhouImport.discover([path])
+        except Exception as error:
+            print('WARNING: cannot import %s: %s' % (path, error))
+    return tasks
+
+
+class Watcher():
+    """
+            polls the sources every interval seconds, and ingests the changes into
+            each TenhouLogs in loggers once nothing has changed for debounce
+            seconds, or max_wait seconds after the first change, whichever is sooner
+    """
+
+    def __init__(self, loggers, firefox=None, chrome=None, drop_dirs=(),
+                 interval=2.0, debounce=5.0, max_wait=30.0):
+        self.loggers = loggers
+        self.firefox = firefox
+        self.chrome = chrome
+        self.drop_dirs = drop_dirs
+        self.interval = interval
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.index = FileIndex()
+        # the last value seen of each localStorage item, by browser
+        self.entries = {'firefox': {}, 'chrome': {}}
+
+
+    def _watched(self):
+        paths = []
+        if self.firefox:
+            # firefox writes through a write-ahead log first
+            paths += [self.firefox, self.firefox + '-wal']
+        if self.chrome:
+            paths += _files(self.chrome)
+        for directory in self.drop_dirs:
+            paths += _files(directory)
+        return paths
+
+
+    def poll(self):
+        """ the watched files that changed since the last poll """
+        return self.index.changed(self._watched())
+
+
+    def _browser_games(self, browser, items):
+        """ the games among the items that are new or changed since last time """
+        games = []
+        for key, value in items.items():
+            if self.entries[browser].get(key) != value:
+                try:
+                    games.append(json.loads(value))
+                except ValueError:
+                    print('WARNING: unreadable %s localStorage item %s' % (browser, key))
+        self.entries[browser] = items
+        return games
+
+
+    def ingest(self, changed):
+        """ ingest the games behind a set of changed files. Returns how many games were added """
+        games = []
+        files = []
+        if self.firefox and any(path.startswith(self.firefox) for path in changed):
+            try:
+                games += self._browser_games('firefox', read_firefox(self.firefox))
+            except sqlite3.Error as error:
+                print('WARNING: cannot read firefox localStorage: %s' % error)
+        if self.chrome and any(path.startswith(self.chrome) for path in changed):
+            try:
+                games += self._browser_games('chrome', read_chrome(self.chrome))
+            except (OSError, ValueError) as error:
+                print('WARNING: cannot read chrome localStorage: %s' % error)
+        for directory in self.drop_dirs:
+            files += [path for path in changed if path.startswith(directory) and os.path.isfile(path)]
+
+        added = 0
+        for logger in self.loggers:
+            before = len(logger.logs)
+            if games:
+                logger.add_games(games)
+            if files:
+                known = frozenset(logger.logs)
+                tasks, _, known = TenhouImport.skip_known(_discover(files), known)
+                for task in tasks:
+                    # one bad file is skipped rather than stopping the watcher; it
+                    # is tried again when it changes, e.g. once it is fully copied
+                    try:
+                        for part in TenhouImport.expand([task], known):
+                            for key, log in TenhouImport.run_task(part, logger.username):
+                                if log:
+                                    logger.add_parsed(key, log)
+                    except Exception as error:
+                        print('WARNING: cannot import %s: %s' % (task[1] or task[2][0][1], error))
+            if len(logger.logs) != before:
+                added += len(logger.logs) - before
+                logger.save(release=False)
+        return added
+
+
+    def run(self, once=False):
+        """
+        watch until interrupted, or with once, ingest what is there now and stop.
+        The first poll sees every file as new, so it ingests the current state
+        """
+        pending = set()
+        first = last = None
+        while True:
+            changed = self.poll()
+            now = time.monotonic()
+            if changed:
+                pending.update(changed)
+                last = now
+                first = first or now
+            if pending and (once or now - last >= self.debounce or now - first >= self.max_wait):
+                added = self.ingest(pending)
+                print('%s: %d files changed, %d games added' % (
+                    time.strftime('%Y-%m-%d %H:%M:%S'), len(pending), added))
+                pending = set()
+                first = last = None
+            if once:
+                return
+            time.sleep(self.interval)
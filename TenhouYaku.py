@@ -2,23 +2,90 @@
 
 import TenhouDecoder
 import collections
+import os
+import pickle
 from Data import Data
 
+import numpy as np
+
 YakuHanCounter = collections.namedtuple('YakuHanCounter', 'yaku han')
 
+YAKU_COUNT = len(TenhouDecoder.Game.YAKU)
+
+class RiichiOutcomes(Data):
+    """
+    Riichi outcome tables, aggregated in batches from reach_outcomes records.
+    Rows are the outcome classes in NAMES; points and counts are by pursuit
+    (0 = first to riichi), turn_points and turn_counts by the turn of the riichi
+    """
+    NAMES = ('I won', 'Draw', 'Bystander', 'Other tsumod', 'I dealt in')
+    PURSUITS = 4
+    TURNS = 25
+
+    def __init__(self):
+        rows = len(self.NAMES)
+        self.points = np.zeros((rows, self.PURSUITS), dtype=np.int64)
+        self.counts = np.zeros((rows, self.PURSUITS), dtype=np.int64)
+        self.turn_points = np.zeros((rows, self.TURNS), dtype=np.int64)
+        self.turn_counts = np.zeros((rows, self.TURNS), dtype=np.int64)
+
+    @staticmethod
+    def classify(types, points):
+        """ the row in NAMES for each record, from arrays of type and points """
+        return np.select(
+            [types == 'DRAW', points > 0, points == -10, types == 'TSUMO'],
+            [1, 0, 2, 3],
+            4)
+
+    def add(self, records):
+        """ fold a batch of reach_outcomes records into the tables """
+        if not records:
+            return
+        count = len(records)
+        pursuit = np.fromiter((record['pursuit'] for record in records), np.int64, count)
+        turn = np.fromiter((record['turn'] for record in records), np.int64, count)
+        points = np.fromiter((record['points'] for record in records), np.int64, count)
+        types = np.array([record['type'] for record in records])
+        rows = self.classify(types, points)
+        self._accumulate(self.points, self.counts, rows, pursuit, points)
+        # a riichi late enough to be off the end of the turn table still counts above
+        self._accumulate(self.turn_points, self.turn_counts, rows, turn, points)
+
+    @staticmethod
+    def _accumulate(sums, counts, rows, columns, points):
+        keep = columns < sums.shape[1]
+        index = rows[keep] * sums.shape[1] + columns[keep]
+        size = sums.size
+        sums += np.bincount(index, weights=points[keep], minlength=size).astype(np.int64).reshape(sums.shape)
+        counts += np.bincount(index, minlength=size).reshape(counts.shape)
+
 class YakuCounter(Data):
+    # records are buffered, and folded into the tables this many at a time
+    BATCH = 65536
+    # bump this whenever a change would make saved counters count differently
+    VERSION = 2
+    # the rows of the yaku tables: one per yaku ID, then one per yaku ID again
+    # for yakuman, which are named with a ___ prefix
+    ROWS = 2 * YAKU_COUNT
+
     def __init__(self, player = None, winner = None):
         self.player = player
         self.winner = winner
         self.hands = collections.Counter()
         self.relevantHands = collections.Counter()
-        self.closed = YakuHanCounter(collections.Counter(), collections.Counter())
-        self.opened = YakuHanCounter(collections.Counter(), collections.Counter())
-        self.all = YakuHanCounter(collections.Counter(), collections.Counter())
+        self.yaku_counts = np.zeros((self.ROWS, 2), dtype=np.int64) # by row, then closed/opened
+        self.yaku_han = np.zeros((self.ROWS, 2), dtype=np.int64)
+        self.riichi = RiichiOutcomes()
+        self.games = 0
+        self.watermarks = {} # the key of the latest game added, by player
         self.reach_outcomes = []
         self.player_index = 0
+        self._yaku_rows = []
 
-    def addGame(self, game):
+    def addGame(self, game, key=None):
+        self.games += 1
+        if key is not None and key > self.watermarks.get(self.player, ''):
+            self.watermarks[self.player] = key
         try:
             self.player_index = None
             for idx, player in enumerate(game.players):
@@ -29,7 +96,10 @@ class YakuCounter(Data):
                 self.addRound(round)
         except:
             return
-            
+        finally:
+            if len(self.reach_outcomes) + len(self._yaku_rows) >= self.BATCH:
+                self.flush()
+
     def addRound(self, round):
         for agari in round.agari:
             self.addAgari(agari)
@@ -45,10 +115,10 @@ class YakuCounter(Data):
         except ValueError:
             pass
 
+    def _addYaku(self, row, han, closed):
+        self._yaku_rows.append((row * 2 + (0 if closed else 1), han))
 
     def addAgari(self, agari):
-        counterYaku, counterHan = self.closed if agari.closed else self.opened
-        allCounterYaku, allCounterHan = self.all
         self.hands["closed" if agari.closed else "opened"] += 1
         if (
             self.player is not None
@@ -65,19 +135,149 @@ class YakuCounter(Data):
         self.relevantHands["closed" if agari.closed else "opened"] += 1
         if hasattr(agari, 'yaku'):
             for yaku, han in agari.yaku:
-                # yaku is the name, e.g. "Riichi", not an index
+                # yaku is the ID, as in Game.YAKU
                 if han > 0:
-                    counterYaku[yaku] += 1
-                    counterHan[yaku] += han
-                    allCounterYaku[yaku] += 1
-                    allCounterHan[yaku] += han
+                    self._addYaku(yaku, han, agari.closed)
         if hasattr(agari, 'yakuman'):
             for yakuman in agari.yakuman:
-                key = '___'+yakuman
-                counterYaku[key] += 1
-                counterHan[key] += 13
-                allCounterYaku[key] += 1
-                allCounterHan[key] += 13
+                self._addYaku(YAKU_COUNT + yakuman, 13, agari.closed)
+
+    @staticmethod
+    def row_name(row, lang='DEFAULT'):
+        """ the name of a row of the yaku tables, in a language from TenhouDecoder.LANGUAGES """
+        if row < YAKU_COUNT:
+            return TenhouDecoder.Game.yaku_name(row, lang)
+        return '___' + TenhouDecoder.Game.yaku_name(row - YAKU_COUNT, lang)
+
+    def flush(self):
+        """ fold the buffered records into the yaku and riichi outcome tables """
+        self.riichi.add(self.reach_outcomes)
+        self.reach_outcomes = []
+        size = 2 * self.ROWS
+        if self._yaku_rows:
+            rows = np.array(self._yaku_rows, dtype=np.int64)
+            self.yaku_counts += np.bincount(rows[:, 0], minlength=size).reshape(-1, 2)
+            self.yaku_han += np.bincount(rows[:, 0], weights=rows[:, 1], minlength=size).astype(np.int64).reshape(-1, 2)
+            self._yaku_rows = []
+
+    def save(self, path, fingerprint):
+        """
+        save the counter, along with the configuration (e.g. winner mode and
+        date filters) that it was built with
+        """
+        self.flush()
+        with open(path + '.tmp', 'wb') as outfile:
+            pickle.dump({'version': self.VERSION, 'fingerprint': fingerprint, 'counter': self}, outfile, protocol=4)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """
+        load a saved counter, or return None if there isn't one that was built
+        with the same configuration and VERSION
+        """
+        try:
+            with open(path, 'rb') as infile:
+                saved = pickle.load(infile)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        if saved.get('version') != cls.VERSION or saved.get('fingerprint') != fingerprint:
+            return None
+        return saved['counter']
+
+    def merge(self, other):
+        """
+        return a new counter holding the counts of both. An empty counter is the
+        identity, and merging is associative: counting a run of games in pieces
+        and merging the pieces in order gives the same tables as counting them
+        all in one counter
+        """
+        if self.winner != other.winner:
+            raise ValueError('cannot merge counters with different winner settings')
+        self.flush()
+        other.flush()
+        merged = YakuCounter(self.player if self.player is not None else other.player, self.winner)
+        merged.hands = self.hands + other.hands
+        merged.relevantHands = self.relevantHands + other.relevantHands
+        merged.games = self.games + other.games
+        merged.watermarks = dict(self.watermarks)
+        for player, key in other.watermarks.items():
+            merged.watermarks[player] = max(key, merged.watermarks.get(player, ''))
+        merged.yaku_counts = self.yaku_counts + other.yaku_counts
+        merged.yaku_han = self.yaku_han + other.yaku_han
+        for name, table in merged.riichi.__dict__.items():
+            table += getattr(self.riichi, name) + getattr(other.riichi, name)
+        return merged
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def __getstate__(self):
+        # the compact state: just the tables, without buffers
+        self.flush()
+        state = dict(self.__dict__)
+        del state['_yaku_rows'], state['reach_outcomes']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._yaku_rows = []
+        self.reach_outcomes = []
+
+    def counters(self, how='all', lang='DEFAULT'):
+        """
+        the yaku and han counts of the yaku seen, for closed, opened or all hands,
+        keyed by name in a language and in yaku ID order, yakuman last
+        """
+        self.flush()
+        columns = {'closed': [0], 'opened': [1], 'all': [0, 1]}[how]
+        counts = self.yaku_counts[:, columns].sum(axis=1).tolist()
+        han = self.yaku_han[:, columns].sum(axis=1).tolist()
+        out = YakuHanCounter(collections.Counter(), collections.Counter())
+        for row, count in enumerate(counts):
+            if count:
+                # a language may give two yaku the same name; they are counted together
+                name = self.row_name(row, lang)
+                out.yaku[name] += count
+                out.han[name] += han[row]
+        return out
+
+    @property
+    def closed(self):
+        return self.counters('closed')
+
+    @property
+    def opened(self):
+        return self.counters('opened')
+
+    @property
+    def all(self):
+        return self.counters('all')
+
+    def asdata(self, asdata = None):
+        self.flush()
+        return {
+            'player': self.player,
+            'winner': self.winner,
+            'games': self.games,
+            'watermarks': self.watermarks,
+            'hands': dict(self.hands),
+            'relevantHands': dict(self.relevantHands),
+            'closed': self.closed._asdict(),
+            'opened': self.opened._asdict(),
+            'all': self.all._asdict(),
+            'riichi': dict((k, v.tolist()) for (k, v) in self.riichi.__dict__.items()),
+        }
+
+def count_logs(items, player, winner):
+    """ count a list of (key, log) pairs from one player's archive, in a new counter """
+    counter = YakuCounter(player, winner)
+    for key, log in items:
+        game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=False)
+        game.decode(log['content'])
+        counter.addGame(game, key)
+    counter.flush()
+    return counter
 
 if __name__ == '__main__':
     import sys
@@ -1,23 +1,99 @@
 # -*- coding: utf-8 -*-
 """
-Add a directory of mjlog files
+Add directories and archives (zip, tar) of mjlog files, which may be gzipped.
+Run with  -h  on the command line to get help
 @author: ApplySci
 """
 
-from pathlib import Path
+# core libraries
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import os
+from time import time
 from types import SimpleNamespace
 
+# own imports
+from TenhouConfig import account_names, directory_name
+import TenhouImport
 from tenhoulogs import TenhouLogs
 
-in_dir = Path('D:/ZAPS/Rosti/Tokujou/')
-out_dir = 'C:/library/Dropbox/source/tenhou/logs/'
-account = 'RostiLFC'
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    'paths',
+    nargs='+',
+    help='directories (searched recursively), zip or tar archives, or mjlog files',
+    action='store')
+parser.add_argument(
+    '-u', '--user',
+    default=account_names[0],
+    help='ID of the user whose archive to add the games to',
+    action='store')
+parser.add_argument(
+    '-j', '--jobs',
+    help='number of worker processes to parse with (default: one per core)',
+    type=int,
+    default=os.cpu_count() or 1,
+    action='store')
+parser.add_argument(
+    '--batch',
+    help='save the archive after every this many games added (default 5000)',
+    type=int,
+    default=5000,
+    action='store')
+parser.add_argument(
+    '--force',
+    help='import games even if they are already in the archive',
+    action='store_true')
+parser.add_argument(
+    '--web',
+    help='try downloading the games whose files cannot be read',
+    action='store_true')
 
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logger = TenhouLogs(directory_name, args.user, SimpleNamespace(force=args.force, no_web=not args.web))
+    logger.load()
+    known = frozenset() if args.force else frozenset(logger.logs)
+    tasks, skipped, known = TenhouImport.skip_known(TenhouImport.discover(args.paths), known)
+    print('%d games skipped as already archived or repeated, %d tasks to run' % (skipped, len(tasks)))
 
-logger = TenhouLogs(out_dir, account, SimpleNamespace(force=True, no_web=True))
-logger.load()
-try:
-    for filepath in in_dir.glob('*.mjlog'):
-        logger.add_from_file(filepath)
-finally:
-    logger.save()
\ No newline at end of file
+    added = others = unsaved = done = 0
+    failed = []
+    start = time()
+    try:
+        with ProcessPoolExecutor(max(1, args.jobs)) as pool:
+            # tars are read here as their tasks are submitted, so only a few tasks
+            # are kept in flight, to hold only a few chunks of their games at once
+            pending = set()
+            todo = TenhouImport.expand(tasks, known)
+            while True:
+                for task in todo:
+                    pending.add(pool.submit(TenhouImport.run_task, task, args.user))
+                    if len(pending) >= 2 * max(1, args.jobs):
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done += 1
+                    for key, log in future.result():
+                        if log is None:
+                            failed.append(key)
+                        elif log is False:
+                            others += 1
+                        else:
+                            logger.add_parsed(key, log)
+                            added += 1
+                            unsaved += 1
+                print('%d tasks, %d games added, %d without %s, %d unreadable, %.0f games/s' % (
+                    done, added, others, args.user, len(failed),
+                    (added + others + len(failed)) / max(time() - start, 1e-9)))
+                if unsaved >= args.batch:
+                    # the csv is only written once, at the end
+                    logger.save(release=False, csv=False)
+                    unsaved = 0
+        if failed and args.web:
+            print('downloading %d unreadable games' % len(failed))
+            logger.add_games([{'log': key} for key in failed])
+    finally:
+        logger.save()
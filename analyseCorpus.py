@@ -0,0 +1,113 @@
+"""
+count yakus and riichi outcomes over a corpus of games too big to load at once,
+such as the public tenhou logs, shard by shard in worker processes. An
+interrupted run carries on from the last shard it finished
+"""
+
+# core libraries
+import argparse
+import functools
+import os
+import sys
+import time
+
+# third-party libraries
+import yaml
+
+# own imports
+from TenhouConfig import directory_name
+import TenhouPipeline
+import TenhouYaku
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    'corpus',
+    help='directory of shards: .pickle.7z archives, zip and tar files of mjlog files, '
+         'and directories of loose mjlog files',
+    action='store')
+
+parser.add_argument(
+    '-p', '--player',
+    help='name of a player to follow: count their riichi outcomes, and with -w or -l '
+         'only the hands they won or dealt into (default: count every win)',
+    action='store')
+
+group = parser.add_mutually_exclusive_group()
+group.add_argument(
+    '-w', '--winner',
+    help='only count yakus for when the player won the hand (default)',
+    action='store_true')
+group.add_argument(
+    '-l', '--loser',
+    help='only count yakus for when the player lost the hand',
+    action='store_true')
+group.add_argument(
+    '-a', '--all',
+    help='count yakus from all hands',
+    action='store_true')
+
+parser.add_argument(
+    '--since',
+    help='date in yyyymmdd format: only include games since this date',
+    action='store')
+
+parser.add_argument(
+    '--before',
+    help='date in yyyymmdd format: only include games before this date',
+    action='store')
+
+parser.add_argument(
+    '-j', '--jobs',
+    help='number of worker processes to decode and count with (default: one per core)',
+    type=int,
+    default=os.cpu_count() or 1,
+    action='store')
+
+parser.add_argument(
+    '--readers',
+    help='number of processes reading shards, each one shard at a time (default 1)',
+    type=int,
+    default=1,
+    action='store')
+
+parser.add_argument(
+    '--checkpoints',
+    help='directory to keep the count of each finished shard in (default: checkpoints in the logs directory)',
+    default=directory_name + 'checkpoints',
+    action='store')
+
+parser.add_argument(
+    '--rebuild',
+    help='ignore the checkpoints, and count every shard again',
+    action='store_true')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    won_hands_only = False if args.loser is True else (None if args.all is True else True)
+    # any change to these means counting every shard again
+    fingerprint = {
+        'counter': TenhouYaku.YakuCounter.VERSION,
+        'player': args.player,
+        'winner': won_hands_only,
+        'since': args.since,
+        'before': args.before,
+    }
+    start = time.perf_counter()
+
+    def progress(path, counter, done, total):
+        print('%d/%d shards, %.0f s: %s, %d games' % (
+            done, total, time.perf_counter() - start, path, counter.games), file=sys.stderr)
+
+    counter, failed = TenhouPipeline.run(
+        args.corpus,
+        functools.partial(TenhouYaku.YakuCounter, args.player, won_hands_only),
+        args.checkpoints, fingerprint,
+        jobs=args.jobs,
+        readers=args.readers,
+        since=args.since,
+        before=args.before,
+        rebuild=args.rebuild,
+        progress=progress)
+    print('%d games counted, %d failed to decode' % (counter.games, failed), file=sys.stderr)
+    yaml.dump(counter.asdata(), sys.stdout, default_flow_style=False, allow_unicode=True)
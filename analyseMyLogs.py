@@ -4,8 +4,7 @@ sum yakus won and lost by one player, from available logs
 
 # core libraries
 import argparse
-import lzma
-import pickle
+import os
 import sys
 
 # third-party libraries
@@ -13,7 +12,10 @@ import yaml
 
 # own imports
 from TenhouConfig import account_names, directory_name
+import TenhouArchive
 import TenhouDecoder
+import TenhouSample
+import TenhouServer
 import TenhouYaku
 
 parser = argparse.ArgumentParser()
@@ -41,152 +43,268 @@ parser.add_argument(
     help='date in yyyymmdd format: only include games before this date',
     action='store')
 
-args = parser.parse_args()
-
-# %% accumulate stats across logged games
-
-# default to only showing yaku counts for winning hands, unless command-line args specify otherwise
-won_hands_only = False if args.loser is True else (None if args.all is True else True)
-counter = TenhouYaku.YakuCounter(winner = won_hands_only)
-
-TURNS = 25
-
-gamecount = 0
-outcomes = [
-    [[0, 0], [0, 0], [0, 0], [0, 0]],
-    [[0, 0], [0, 0], [0, 0], [0, 0]],
-    [[0, 0], [0, 0], [0, 0], [0, 0]],
-    [[0, 0], [0, 0], [0, 0], [0, 0]],
-    [[0, 0], [0, 0], [0, 0], [0, 0]],
-    [[0, 0], [0, 0], [0, 0], [0, 0]],
-]
-
-reach_turn_points = [[0] * TURNS, [0] * TURNS, [0] * TURNS, [0] * TURNS, [0] * TURNS]
-reach_turn_counts = [[0] * TURNS, [0] * TURNS, [0] * TURNS, [0] * TURNS, [0] * TURNS]
-
-outcome_names = ('I won', 'Draw', 'Bystander', 'Other tsumod', 'I dealt in', 'Averages')
-for player in account_names:
-    counter.player = player
-    with lzma.open(directory_name + player + '.pickle.7z', 'rb') as infile:
-        logs = pickle.load(infile)
-
-    for key, log in logs.items():
-        if args.since and args.since > key[0:8]:
-            continue
-        if args.before and args.before <= key[0:8]:
-            continue
-        gamecount += 1
-        game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=False)
-        game.decode(log['content'].decode())
-        counter.reach_outcomes = []
-        counter.addGame(game)
-
-        for outcome in counter.reach_outcomes:
-            # aggregate counter.reach_outcomes
-            try:
-                if outcome['type'] == 'DRAW':
-                    row = 1                                  # draw
-                elif outcome['points'] > 0:
-                    row = 0                                  # i won
-                elif outcome['points'] == -10:
-                    row = 2                                  # bystander
-                elif outcome['type'] == 'TSUMO':
-                    row = 3                                  # lost to other's tsumo
-                else:
-                    row = 4                                  # dealt in
-
-                outcomes[row][outcome['pursuit']][0] += outcome['points']
-                outcomes[row][outcome['pursuit']][1] += 1
-
-                #if outcome['pursuit']:
-                reach_turn_points[row][outcome['turn']] += outcome['points']
-                reach_turn_counts[row][outcome['turn']] += 1
-            except:
-                pass
-
-# %% outputs
-
-print('%d games' % gamecount)
-total_hands = counter.hands['closed'] + counter.hands['opened']
-
-print('Stats for hands won' if won_hands_only else ('Stats for all hands' if won_hands_only is None else 'Stats for hands dealt into'))
-print('how, all count, all han, closed count, closed han, opened count, opened han')
-if won_hands_only is None:
-    print('Total hands played,%d,,%d,,%d,' % (
-        total_hands,
-        counter.hands['closed'],
-        counter.hands['opened']))
-else:
-    print('%s, %d,, %d,, %d,' % (
+parser.add_argument(
+    '-j', '--jobs',
+    help='number of worker processes to count with (default: one per core)',
+    type=int,
+    default=os.cpu_count() or 1,
+    action='store')
+
+parser.add_argument(
+    '--rebuild',
+    help='ignore the saved counts, and count every game again',
+    action='store_true')
+
+parser.add_argument(
+    '--approx',
+    help='estimate the stats from a stratified sample of the games, with confidence intervals',
+    action='store_true')
+
+parser.add_argument(
+    '--sample-rate',
+    help='share of each month and lobby to sample at first (default 0.05); implies --approx',
+    type=float,
+    action='store')
+
+parser.add_argument(
+    '--error',
+    help='double the sample until each count is known to within this share of its table (default 0.02); implies --approx',
+    type=float,
+    action='store')
+
+parser.add_argument(
+    '--confidence',
+    help='confidence level of the intervals with --approx (default 0.95)',
+    type=float,
+    default=0.95,
+    action='store')
+
+parser.add_argument(
+    '--seed',
+    help='random seed of the sample with --approx, so that runs can be repeated',
+    type=int,
+    default=0,
+    action='store')
+
+parser.add_argument(
+    '--lang',
+    help='language of the yaku names (default: DEFAULT, the romanised Japanese names)',
+    choices=TenhouDecoder.LANGUAGES,
+    default='DEFAULT',
+    action='store')
+
+parser.add_argument(
+    '--server',
+    help='run the analysis on the log server listening on this socket (see serveLogs.py), '
+         'instead of loading the archives here (default socket: %s)' % TenhouServer.DEFAULT_SOCKET,
+    nargs='?',
+    const=TenhouServer.DEFAULT_SOCKET,
+    action='store')
+
+
+def print_approximate(estimate, won_hands_only, confidence, lang):
+    """ print the estimated tables, each cell as estimate,low,high """
+    rare = []
+
+    def cell(name, form='%d'):
+        # a cell seen in too few sampled games is marked with ?
+        values = estimate.total(name)
+        marker = ''
+        if estimate.observed(name) < TenhouSample.MIN_OBSERVED:
+            marker = '?'
+            rare.append(name)
+        return ','.join(form % value for value in values) + marker
+
+    def ratio(top, bottom, scale, form):
+        marker = '?' if estimate.observed(top) < TenhouSample.MIN_OBSERVED else ''
+        return ','.join(form % (scale * value) for value in estimate.ratio(top, bottom)) + marker
+
+    print('%s games, estimated from %d sampled games, with %g%% confidence intervals' % (
+        cell(('games',)), estimate.sampled(), 100 * confidence))
+    print('Stats for hands won' if won_hands_only else ('Stats for all hands' if won_hands_only is None else 'Stats for hands dealt into'))
+    print('how, all count,low,high, all han,low,high, closed count,low,high, closed han,low,high, opened count,low,high, opened han,low,high')
+    if won_hands_only is None:
+        print('Total hands played,%s,,,,%s,,,,%s,,,' % (
+            cell(('hands',)), cell(('hands', 'closed')), cell(('hands', 'opened'))))
+    else:
+        print('%s,%s,,,,%s,,,,%s,,,' % (
             'Won hands' if won_hands_only else 'Hands dealt into',
-            counter.relevantHands['closed'] + counter.relevantHands['opened'],
-            counter.relevantHands['closed'],
-            counter.relevantHands['opened']))
+            cell(('relevant',)), cell(('relevant', 'closed')), cell(('relevant', 'opened'))))
+    for row in sorted(set(name[1] for name in estimate.cells() if name[0] == 'yaku' and len(name) == 2)):
+        print(TenhouYaku.YakuCounter.row_name(row, lang) + ''.join(
+            ',' + cell((column, row) + how) for how in ((), ('closed',), ('opened',)) for column in ('yaku', 'han')))
+
+    print('\n==================================\n')
+
+    outcome_names = TenhouYaku.RiichiOutcomes.NAMES
+    print('first to riichi,,,,,,,,,second to riichi,,,,,,,,,third to riichi,,,,,,,,')
+    print('My outcome' + ',My point change,low,high,hands,low,high,% of hands,low,high' * 3)
+    for row, outcome in enumerate(outcome_names):
+        print(outcome + ''.join(
+            ',%s,%s,%s' % (
+                ratio(('points', row, pursuit), ('riichi', row, pursuit), 100, '%d'),
+                cell(('riichi', row, pursuit)),
+                ratio(('riichi', row, pursuit), ('reached', pursuit), 100, '%.1f%%'))
+            for pursuit in range(3)))
+    print('Riichi rate' + ''.join(
+        ',,,,,,,%s' % ratio(('reached', pursuit), ('hands',), 100, '%.1f%%') for pursuit in range(3)))
+
+    if rare:
+        print('\nwarning: %d cells, marked ?, were seen in fewer than %d sampled games: '
+              'their intervals are not to be trusted' % (len(rare), TenhouSample.MIN_OBSERVED),
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.server:
+        sys.exit(TenhouServer.forward(args.server, __file__, sys.argv[1:]))
+
+    # %% accumulate stats across logged games
+
+    # default to only showing yaku counts for winning hands, unless command-line args specify otherwise
+    won_hands_only = False if args.loser is True else (None if args.all is True else True)
+
+    if args.approx or args.sample_rate is not None or args.error is not None:
+        # estimate from a sample instead, leaving the saved counts alone
+        population = [(player, key, log)
+                      for player in account_names
+                      for key, log in TenhouArchive.load(player).items()
+                      if TenhouArchive.in_range(key, args.since, args.before)]
+        estimate = TenhouSample.sample_stats(
+            population, won_hands_only,
+            rate=args.sample_rate or 0.05,
+            error=args.error or 0.02,
+            confidence=args.confidence,
+            seed=args.seed,
+            jobs=args.jobs,
+            progress=lambda estimate: print('sampled %d of %d games' % (estimate.sampled(), len(population)),
+                                            file=sys.stderr))
+        print_approximate(estimate, won_hands_only, args.confidence, args.lang)
+        sys.exit(0)
+
+    # the counts are saved between runs, so only games newer than the last one counted
+    # need decoding. Any change to the settings here means counting everything again
+    counter_file = directory_name + 'yakucounter-%s.pickle' % (
+        'won' if won_hands_only else ('all' if won_hands_only is None else 'lost'))
+    fingerprint = {
+        'winner': won_hands_only,
+        'players': tuple(account_names),
+        'since': args.since,
+        'before': args.before,
+    }
+    counter = None if args.rebuild else TenhouYaku.YakuCounter.load(counter_file, fingerprint)
+    if counter is None:
+        counter = TenhouYaku.YakuCounter(winner = won_hands_only)
+
+    for player in account_names:
+        watermark = counter.watermarks.get(player, '')
+        logs = TenhouArchive.load(player)
+        todo = [(key, log) for key, log in logs.items()
+                if key > watermark and TenhouArchive.in_range(key, args.since, args.before)]
+        # count key-range shards in parallel, and merge them back in key order
+        for partial in TenhouArchive.map_shards(
+                TenhouYaku.count_logs, todo, args.jobs, args=(player, won_hands_only)):
+            counter += partial
+
+    counter.save(counter_file, fingerprint)
+    gamecount = counter.games
+    TURNS = counter.riichi.TURNS
+    outcome_names = counter.riichi.NAMES + ('Averages',)
+    # outcomes[row][pursuit] is [points, hands]; the last row is filled in below with the totals
+    outcomes = [
+        [list(cell) for cell in zip(points, counts)]
+        for points, counts in zip(
+            counter.riichi.points.tolist() + [[0] * counter.riichi.PURSUITS],
+            counter.riichi.counts.tolist() + [[0] * counter.riichi.PURSUITS])]
+    reach_turn_points = counter.riichi.turn_points.tolist()
+    reach_turn_counts = counter.riichi.turn_counts.tolist()
+
+    # %% outputs
+
+    print('%d games' % gamecount)
+    total_hands = counter.hands['closed'] + counter.hands['opened']
+
+    print('Stats for hands won' if won_hands_only else ('Stats for all hands' if won_hands_only is None else 'Stats for hands dealt into'))
+    print('how, all count, all han, closed count, closed han, opened count, opened han')
+    if won_hands_only is None:
+        print('Total hands played,%d,,%d,,%d,' % (
+            total_hands,
+            counter.hands['closed'],
+            counter.hands['opened']))
+    else:
+        print('%s, %d,, %d,, %d,' % (
+                'Won hands' if won_hands_only else 'Hands dealt into',
+                counter.relevantHands['closed'] + counter.relevantHands['opened'],
+                counter.relevantHands['closed'],
+                counter.relevantHands['opened']))
         
-for key in counter.all.han.keys():
-    print('%s, %d,%d, %d,%d, %d,%d' % (
-        key,counter.all.yaku[key],counter.all.han[key],
-          counter.closed.yaku[key],counter.closed.han[key],
-          counter.opened.yaku[key],counter.opened.han[key],
-          ))
+    # the counts are by yaku ID, and only given names here
+    in_all, in_closed, in_opened = (counter.counters(how, args.lang) for how in ('all', 'closed', 'opened'))
+    for key in in_all.han.keys():
+        print('%s, %d,%d, %d,%d, %d,%d' % (
+            key,in_all.yaku[key],in_all.han[key],
+              in_closed.yaku[key],in_closed.han[key],
+              in_opened.yaku[key],in_opened.han[key],
+              ))
 
-print('\n==================================\n')
+    print('\n==================================\n')
 
-# make column totals and percentages
-for pursuit in range(3):
-    for row in range(5):
-        for col in range(2):
-            outcomes[5][pursuit][col] += outcomes[row][pursuit][col]
-
-# print table
-print('%d hands,first to riichi,,,second to riichi,,,third to riichi,,' % total_hands)
-print('My outcome,My point change,hands,% of hands,My point change,hands,% of hands,My point change,hands,% of hands')
-for row in range(6):
-    print(outcome_names[row], end='')
+    # make column totals and percentages
     for pursuit in range(3):
-        if outcomes[row][pursuit][1]:
-            print(
-                ',%d,%d,%d%%' % (
-                    int(100 * outcomes[row][pursuit][0] / outcomes[row][pursuit][1]),
-                    outcomes[row][pursuit][1],
-                    int(100 * outcomes[row][pursuit][1] / outcomes[5][pursuit][1])
-                ), end=''
-            )
-        else:
-            print(',0,0,0', end='')
-    print('')
+        for row in range(5):
+            for col in range(2):
+                outcomes[5][pursuit][col] += outcomes[row][pursuit][col]
 
-print('Riichi rate,,,%.1f%%,,,%.1f%%,,,%.1f%%' % (
-        100 * outcomes[5][0][1] / total_hands,
-        100 * outcomes[5][1][1] / total_hands,
-        100 * outcomes[5][2][1] / total_hands,
-        ))
+    # print table
+    print('%d hands,first to riichi,,,second to riichi,,,third to riichi,,' % total_hands)
+    print('My outcome,My point change,hands,% of hands,My point change,hands,% of hands,My point change,hands,% of hands')
+    for row in range(6):
+        print(outcome_names[row], end='')
+        for pursuit in range(3):
+            if outcomes[row][pursuit][1]:
+                print(
+                    ',%d,%d,%d%%' % (
+                        int(100 * outcomes[row][pursuit][0] / outcomes[row][pursuit][1]),
+                        outcomes[row][pursuit][1],
+                        int(100 * outcomes[row][pursuit][1] / outcomes[5][pursuit][1])
+                    ), end=''
+                )
+            else:
+                print(',0,0,0', end='')
+        print('')
 
+    print('Riichi rate,,,%.1f%%,,,%.1f%%,,,%.1f%%' % (
+            100 * outcomes[5][0][1] / total_hands,
+            100 * outcomes[5][1][1] / total_hands,
+            100 * outcomes[5][2][1] / total_hands,
+            ))
 
-print('\n==================================\n')
 
-print('Results by hand outcome, by turn I riichid on')
-print('Turn: , ' +  ','.join(map(str, range(1, TURNS))))
+    print('\n==================================\n')
 
-for row in range(5):
-    print('No. of hands - ' + outcome_names[row] + ' , ' + ','.join(map(str, reach_turn_counts[row][1:])))
-    print('Points per hand - ' + outcome_names[row], end='')
-    for turn in range(1, TURNS):
-        if reach_turn_points[row][turn] == 0:
-            print(',0',end='')
-        else:
-            print(',' + str(100 * reach_turn_points[row][turn] // reach_turn_counts[row][turn]), end='')
-    print('')
+    print('Results by hand outcome, by turn I riichid on')
+    print('Turn: , ' +  ','.join(map(str, range(1, TURNS))))
 
-print('average points: ', end='')
-for turn in range(1, TURNS):
-    nHands = 0
-    points = 0
     for row in range(5):
-        nHands += reach_turn_counts[row][turn]
-        points += reach_turn_points[row][turn]
-    if nHands == 0:
-        print(',0', end='')
-    else:
-        print(',', str(100 * points // nHands), end='')
-print('')
\ No newline at end of file
+        print('No. of hands - ' + outcome_names[row] + ' , ' + ','.join(map(str, reach_turn_counts[row][1:])))
+        print('Points per hand - ' + outcome_names[row], end='')
+        for turn in range(1, TURNS):
+            if reach_turn_points[row][turn] == 0:
+                print(',0',end='')
+            else:
+                print(',' + str(100 * reach_turn_points[row][turn] // reach_turn_counts[row][turn]), end='')
+        print('')
+
+    print('average points: ', end='')
+    for turn in range(1, TURNS):
+        nHands = 0
+        points = 0
+        for row in range(5):
+            nHands += reach_turn_counts[row][turn]
+            points += reach_turn_points[row][turn]
+        if nHands == 0:
+            print(',0', end='')
+        else:
+            print(',', str(100 * points // nHands), end='')
+    print('')
\ No newline at end of file
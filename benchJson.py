@@ -0,0 +1,86 @@
+"""
+benchmark the conversion of the archived games to the tenhou.net/6 JSON
+format: the time of each step for one process, then the throughput of the
+whole conversion with each number of worker processes given
+"""
+
+# core libraries
+import argparse
+import json
+import os
+import time
+
+# own imports
+from TenhouConfig import account_names
+import TenhouArchive
+import TenhouDecoder
+import TenhouJson
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '--limit',
+    help='only convert this many games',
+    type=int,
+    action='store')
+parser.add_argument(
+    '-j', '--jobs',
+    help='numbers of worker processes to time the whole conversion with (default: 1 and one per core)',
+    nargs='+',
+    type=int,
+    default=sorted(set([1, os.cpu_count() or 1])),
+    action='store')
+parser.add_argument(
+    '--check',
+    help='also replay and compare each converted game, as convertLogs.py --check does',
+    action='store_true')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    games = {}
+    for player in args.user:
+        for key, log in TenhouArchive.load(player).items():
+            games.setdefault(key, log)
+    items = sorted(games.items())[: args.limit]
+    if not items:
+        raise SystemExit('no games to convert')
+
+    steps = dict((step, 0.0) for step in ('decode', 'convert', 'dumps') + (('check',) if args.check else ()))
+    rounds = size = 0
+    for key, log in items:
+        start = time.perf_counter()
+        game = TenhouDecoder.Game(lang='DEFAULT')
+        game.decode(log['content'])
+        decoded = time.perf_counter()
+        data = TenhouJson.convert(game, key)
+        converted = time.perf_counter()
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        dumped = time.perf_counter()
+        if args.check:
+            data = json.loads(text)
+            TenhouJson.replay(data)
+            TenhouJson.compare(game, data)
+            steps['check'] += time.perf_counter() - dumped
+        steps['decode'] += decoded - start
+        steps['convert'] += converted - decoded
+        steps['dumps'] += dumped - converted
+        rounds += len(data['log'])
+        size += len(text)
+    total = sum(steps.values())
+    print('%d games, %d rounds, %.1f MB of JSON' % (len(items), rounds, size / 1e6))
+    print('%-8s %10s %8s %6s' % ('step', 'seconds', 'us/game', 'share'))
+    for step, seconds in steps.items():
+        print('%-8s %10.3f %8.0f %5.1f%%' % (step, seconds, 1e6 * seconds / len(items), 100 * seconds / total))
+
+    print('%-8s %10s %8s %10s' % ('jobs', 'seconds', 'games/s', 'rounds/s'))
+    for jobs in args.jobs:
+        start = time.perf_counter()
+        for _ in TenhouJson.convert_archive(items, jobs, check=args.check):
+            pass
+        elapsed = time.perf_counter() - start
+        print('%-8d %10.3f %8.0f %10.0f' % (jobs, elapsed, len(items) / elapsed, rounds / elapsed))
@@ -0,0 +1,90 @@
+"""
+convert the archived games to the tenhou.net/6 JSON log format, as one JSON
+line per game or one file per game, in worker processes
+"""
+
+# core libraries
+import argparse
+import os
+import sys
+import time
+
+# own imports
+from TenhouConfig import account_names, directory_name
+import TenhouArchive
+import TenhouJson
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '-o', '--out',
+    help='where to write: a .jsonl file, or - for stdout (the default); '
+         'with --per-game, a directory (default: tenhou6 in the logs directory)',
+    action='store')
+parser.add_argument(
+    '--per-game',
+    help='write one <key>.json file per game, instead of JSON lines',
+    action='store_true')
+parser.add_argument(
+    '--since',
+    help='date in yyyymmdd format: only include games since this date, inclusive',
+    action='store')
+parser.add_argument(
+    '--before',
+    help='date in yyyymmdd format: only include games before this date, exclusive',
+    action='store')
+parser.add_argument(
+    '-j', '--jobs',
+    help='number of worker processes to convert with (default: one per core)',
+    type=int,
+    default=os.cpu_count() or 1,
+    action='store')
+parser.add_argument(
+    '--check',
+    help='replay every converted game to check that its hands are consistent, and compare it with the decoded game',
+    action='store_true')
+parser.add_argument(
+    '--bench',
+    help='convert without writing anything, to measure the throughput',
+    action='store_true')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    outfile = None
+    if args.per_game:
+        args.out = args.out or directory_name + 'tenhou6'
+        os.makedirs(args.out, exist_ok=True)
+    elif not args.bench:
+        outfile = sys.stdout if args.out in (None, '-') else open(args.out, 'w', encoding='utf-8')
+
+    start = time.perf_counter()
+    seen = set()
+    games = rounds = size = failed = 0
+    for player in args.user:
+        items = [(key, log) for key, log in TenhouArchive.load(player).items()
+                 if key not in seen and TenhouArchive.in_range(key, args.since, args.before)]
+        seen.update(key for key, _ in items)
+        for key, text, count, error in TenhouJson.convert_archive(items, args.jobs, check=args.check):
+            if error:
+                print('failed to convert %s: %s' % (key, error), file=sys.stderr)
+                failed += 1
+                continue
+            games += 1
+            rounds += count
+            size += len(text)
+            if args.per_game:
+                with open(os.path.join(args.out, key + '.json'), 'w', encoding='utf-8') as gamefile:
+                    gamefile.write(text)
+            elif outfile is not None:
+                outfile.write(text + '\n')
+    if outfile is not None and outfile is not sys.stdout:
+        outfile.close()
+
+    elapsed = time.perf_counter() - start
+    print('%d games (%d failed), %d rounds, %.1f MB of JSON in %.2f s: %.0f games/s, %.0f rounds/s' % (
+        games, failed, rounds, size / 1e6, elapsed, games / elapsed, rounds / elapsed), file=sys.stderr)
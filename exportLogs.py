@@ -0,0 +1,53 @@
+"""
+export the archived logs to columnar numpy tables of rounds and agari.
+Only games that are not already in the tables are decoded
+"""
+
+# core libraries
+import argparse
+import os
+
+# own imports
+from TenhouConfig import account_names, directory_name
+import TenhouArchive
+import TenhouColumns
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '--npy',
+    help='write a directory of memory-mappable .npy files instead of one .npz file',
+    action='store_true')
+parser.add_argument(
+    '--rebuild',
+    help='discard the existing tables and export every game again',
+    action='store_true')
+parser.add_argument(
+    '-j', '--jobs',
+    help='number of worker processes to decode with (default: one per core)',
+    type=int,
+    default=os.cpu_count() or 1,
+    action='store')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    for player in args.user:
+        path = directory_name + player + ('.columns' if args.npy else '.columns.npz')
+        tables = TenhouColumns.empty() if args.rebuild else TenhouColumns.load(path)
+        done = set(tables['game']['key'].tolist())
+        logs = TenhouArchive.load(player)
+        todo = [(key, log) for key, log in logs.items() if key not in done]
+        print('%s: %d games already exported, %d to add' % (player, len(done), len(todo)))
+        if not todo:
+            continue
+        games = TenhouArchive.ordered_map(TenhouColumns.game_rows, todo, args.jobs, args=(player,))
+        tables = TenhouColumns.append(tables, games)
+        TenhouColumns.save(tables, path)
+        print('%s: %d games, %d rounds, %d agari' % (
+            player, len(tables['game']['key']),
+            len(tables['round']['game']), len(tables['agari']['game'])))
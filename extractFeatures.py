@@ -0,0 +1,56 @@
+"""
+write one fixed-width record per discard decision, for every archived game,
+into sharded memory-mappable files. See TenhouFeatures.py for the format
+"""
+
+# core libraries
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+# own imports
+from TenhouConfig import account_names, directory_name
+import TenhouArchive
+import TenhouFeatures
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '--out',
+    help='directory to write the shards into (default: features/ in the logs directory)',
+    default=directory_name + 'features',
+    action='store')
+parser.add_argument(
+    '--shards',
+    help='number of shards to split games between; keep it the same when resuming',
+    type=int,
+    default=16,
+    action='store')
+parser.add_argument(
+    '-j', '--jobs',
+    help='number of worker processes, each writing its own shards (default: one per core)',
+    type=int,
+    default=os.cpu_count() or 1,
+    action='store')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    games = {}
+    for player in args.user:
+        # a game in more than one account's archive only needs writing once
+        for key, log in TenhouArchive.load(player).items():
+            games.setdefault(key, log)
+    by_shard = [[] for _ in range(args.shards)]
+    for key, log in games.items():
+        by_shard[TenhouFeatures.shard_of(key, args.shards)].append((key, log))
+
+    with ProcessPoolExecutor(max(1, args.jobs)) as pool:
+        added = pool.map(TenhouFeatures.write_shard, by_shard,
+                         [args.out] * args.shards, range(args.shards))
+        print('%d games added to %d shards in %s' % (sum(added), args.shards, args.out))
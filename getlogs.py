@@ -19,7 +19,9 @@ import sys
 from time import sleep
 
 from selenium import webdriver
+import ChromeStorage
 from tenhoulogs import TenhouLogs
+import TenhouMetrics
 from TenhouConfig import account_names, directory_name
 
 outcome = 0
@@ -69,6 +71,17 @@ parser.add_argument(
     '--no-web',
     help='do not retrieve anything from the web',
     action='store_true')
+parser.add_argument(
+    '--cache-size',
+    help='size limit in MB of the cache of downloaded games (default 500, 0 for no cache)',
+    type=int,
+    action='store')
+parser.add_argument(
+    '--profile',
+    nargs='?',
+    const='-',
+    help='write a JSON report of the time spent in each stage, and counts of games and bytes, to this file (default: stderr)',
+    action='store')
 
 args = parser.parse_args()
 if len(sys.argv) < 2:
@@ -100,8 +113,10 @@ def one_browser_logs(thisbrowser):
         thisbrowser.set_window_position(-3000, 0)
         thisbrowser.get('https://tenhou.net/2/')
 
-        for i in range(0, 40):
-            log = thisbrowser.execute_script("return localStorage.getItem('log%d')" % i)
+        # fetch all the logs in one round trip
+        logs = thisbrowser.execute_script(
+            "var out = []; for (var i = 0; i < 40; i++) out.push(localStorage.getItem('log' + i)); return out;")
+        for log in logs:
             if log is not None:
                 games_discovered.append(json.loads(log))
     finally:
@@ -135,20 +150,6 @@ def get_firefox_games(profile_dir):
             print('error during firefox localStorage processing')
 
 
-def decode_chrome_leveldb_bytes(value):
-    """
-    decode the encoded localstorage values from the leveldb file
-    """
-    if value[0] == 0:
-        return value[1:].decode('utf-16le')
-    elif value[0] == 1:
-        return value[1:].decode('utf-8')
-    else:
-        msg = "Unable to process Chrome LevelDB bytes in unknown format: {}".format(value)
-        print(msg)
-        raise ValueError(msg)
-
-
 def get_chrome_games(profile_dir):
     """
     retrieve games from Chrome localStorage
@@ -156,22 +157,15 @@ def get_chrome_games(profile_dir):
     try:
         print('catching chrome config')
         leveldb_directory = os.path.join(profile_dir, 'Default', 'Local Storage', 'leveldb','')
-        import leveldb
-        # the below line fails with a "missing files e.g. 005.sst". This python lib seems
-        # incompatible with the new google chrome leveldb
-        db = leveldb.LevelDB(leveldb_directory)
-        for key, value in db.RangeIter(b'_http://tenhou.net\x00', b'_http://tenhou.net\x01', True):
-            print(key)
-            key = key.split(b'\x00', 1)[1]
-            key = decode_chrome_leveldb_bytes(key)
-            if key.startswith('log') and key != 'lognext':
-                value = decode_chrome_leveldb_bytes(value)
+        # read straight from a copy of the leveldb files, which works while chrome is running
+        for key, value in ChromeStorage.local_storage(leveldb_directory).items():
+            if key.startswith('log') and key[3:].isdigit():
                 game = json.loads(value)
                 print('adding %s' % game['log'])
                 games_discovered.append(game)
 
     except:
-        # can't open chrome db directly, so go via browser
+        # can't read chrome's files directly, so go via browser
         try:
             print('cranking up chrome')
             options = webdriver.ChromeOptions()
@@ -201,13 +195,15 @@ if args.json:
 if args.no_firefox:
     print('finessing firefox')
 elif os.path.isdir(firefoxdir):
-    get_firefox_games(firefoxdir)
+    with TenhouMetrics.stage('harvest.firefox'):
+        get_firefox_games(firefoxdir)
 else:
     print('ERROR: failed to find firefox profile directory from %s' % firefoxdir)
 
 #%%
 if args.chrome:
-    get_chrome_games(chromeProfile)
+    with TenhouMetrics.stage('harvest.chrome'):
+        get_chrome_games(chromeProfile)
 else:
     print('circumventing chrome')
 
@@ -226,7 +222,8 @@ for one_user in args.user:
     print('----- ' + one_user + ' -----')
     logger = TenhouLogs(directory_name, one_user, args)
     logger.load()
-    logger.add_games(games_discovered)
+    with TenhouMetrics.stage('add_games'):
+        logger.add_games(games_discovered)
     logger.save()
 
 try:
@@ -234,4 +231,8 @@ try:
 except:
     pass
 
+TenhouMetrics.count('games.discovered', len(games_discovered))
+if args.profile:
+    TenhouMetrics.write_report(args.profile)
+
 sys.exit(outcome)
\ No newline at end of file
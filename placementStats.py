@@ -0,0 +1,62 @@
+"""
+placement, score and stable rate statistics for each account,
+from the stored game results only
+"""
+
+# core libraries
+import argparse
+
+# own imports
+from TenhouConfig import account_names, directory_name
+import TenhouArchive
+from TenhouPlacement import PlacementStats
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '--group',
+    help='split the stats by this',
+    choices=('month', 'year', 'lobby', 'type'),
+    action='store')
+parser.add_argument(
+    '--since',
+    help='date in yyyymmdd format: only include games since this date, inclusive',
+    action='store')
+parser.add_argument(
+    '--before',
+    help='date in yyyymmdd format: only include games before this date, exclusive',
+    action='store')
+parser.add_argument(
+    '--bootstrap',
+    help='number of bootstrap resamples for the 95%% confidence intervals (default 1000, 0 for none)',
+    type=int,
+    default=1000,
+    action='store')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    for player in args.user:
+        stats_file = directory_name + player + '.placement.pickle'
+        stats = PlacementStats.load(stats_file, player)
+        added = stats.add(TenhouArchive.load(player))
+        if added:
+            stats.save(stats_file)
+
+        print(player)
+        print('%s,games,1st,2nd,3rd,4th,mean place,low,high,mean score,low,high,'
+              'mean points,low,high,stable rate,low,high' % (args.group or 'all'))
+        for label, rows in stats.groups(args.group, args.since, args.before):
+            summary = stats.summary(rows, args.bootstrap)
+            line = '%s,%d,%s' % (
+                label, summary['games'],
+                ','.join('%.1f%%' % (100 * share) for share in summary['places']))
+            for name, form in (('place', '%.3f'), ('score', '%.0f'), ('points', '%.1f'), ('stable_rate', '%.0f')):
+                low, high = summary.get(name + '_ci', (float('nan'), float('nan')))
+                line += ',' + ','.join(form % value for value in (summary[name], low, high))
+            print(line)
+        print('')
@@ -0,0 +1,57 @@
+"""
+profile TenhouDecoder on the archived games: calls and time per tag handler,
+and per input path, sorted by the time spent
+"""
+
+# core libraries
+import argparse
+import io
+
+# own imports
+from TenhouConfig import account_names
+import TenhouArchive
+import TenhouDecoder
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '--limit',
+    help='only decode this many games',
+    type=int,
+    action='store')
+parser.add_argument(
+    '--no-draws',
+    help='decode as the shape index does, skipping draws and discards',
+    action='store_true')
+parser.add_argument(
+    '--input',
+    help='pass each log to decode as the stored bytes (as the analysis scripts do, the default), '
+         'as a string, or as a file',
+    choices=('bytes', 'string', 'file'),
+    default='bytes',
+    action='store')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    games = {}
+    for player in args.user:
+        for key, log in TenhouArchive.load(player).items():
+            games.setdefault(key, log)
+    profile = TenhouDecoder.Game.profiler = TenhouDecoder.DecoderProfile()
+    for count, log in enumerate(games.values()):
+        if args.limit is not None and count >= args.limit:
+            break
+        game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=args.no_draws)
+        content = log['content']
+        if args.input == 'file':
+            content = io.BytesIO(content)
+        elif args.input == 'string':
+            content = content.decode()
+        game.decode(content)
+    TenhouDecoder.Game.profiler = None
+    print(profile.format())
@@ -0,0 +1,95 @@
+"""
+reconstruct each account's R-rate history from its stored results, flag the
+games where the stored rate does not follow, and run what-if scenarios
+"""
+
+# core libraries
+import argparse
+
+# third-party libraries
+import numpy as np
+
+# own imports
+from TenhouConfig import account_names
+import TenhouArchive
+import TenhouRate
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '--sanma',
+    help='use three-player games, which have their own rate',
+    action='store_true')
+parser.add_argument(
+    '--start-games',
+    help='games played before the first stored one (default: estimate it from the stored rates)',
+    type=int,
+    action='store')
+parser.add_argument(
+    '--what-if',
+    nargs='+',
+    default=[],
+    help='scenarios to simulate, each as from:to places, e.g. "4:3" for every 4th being a 3rd, '
+         'or "4:3/2" for every 2nd 4th being a 3rd',
+    action='store')
+parser.add_argument(
+    '--shuffle',
+    help='also simulate this many random reorderings of the same results',
+    type=int,
+    default=0,
+    action='store')
+parser.add_argument(
+    '--show',
+    help='how many mismatched games to list',
+    type=int,
+    default=10,
+    action='store')
+
+
+def scenario(places, spec):
+    """ apply a what-if such as "4:3" or "4:3/2" to an array of places """
+    change, _, every = spec.partition('/')
+    old, new = (int(place) for place in change.split(':'))
+    places = places.copy()
+    hits = np.flatnonzero(places == old)
+    places[hits[int(every) - 1 :: int(every)] if every else hits] = new
+    return places
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    seats = 3 if args.sanma else 4
+    for player in args.user:
+        games = TenhouRate.history(TenhouArchive.load(player), player, seats)
+        count = len(games['place'])
+        print('%s: %d games' % (player, count))
+        if not count:
+            continue
+        start_games = (args.start_games if args.start_games is not None
+                       else TenhouRate.estimate_start_games(games, seats))
+        print('games played before the first stored one: %d' % start_games)
+
+        bad = TenhouRate.mismatches(games, start_games, seats)
+        print('%d games where the next stored rate does not follow' % len(bad))
+        expected = TenhouRate.predict(games, start_games, seats)
+        for index in bad[: args.show]:
+            print('  %s: expected %.2f, next stored %.2f' % (
+                games['key'][index], expected[index], games['rate'][index + 1]))
+
+        names = ['actual'] + args.what_if
+        places = [games['place']] + [scenario(games['place'], spec) for spec in args.what_if]
+        rng = np.random.default_rng(0)
+        for number in range(args.shuffle):
+            names.append('shuffle %d' % (number + 1))
+            places.append(rng.permutation(games['place']))
+        rates = TenhouRate.simulate(
+            np.stack(places), games['meanrate'], games['rate'][0], start_games, seats)
+        print('scenario,final rate,lowest,highest')
+        for name, trajectory in zip(names, rates):
+            print('%s,%.2f,%.2f,%.2f' % (name, trajectory[-1], trajectory.min(), trajectory.max()))
+        print('')
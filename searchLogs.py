@@ -4,21 +4,23 @@ find logs that match given criteria
 
 # core libraries
 import argparse
-import lzma
-import pickle
+import os
+import sys
 
 # own imports
-from TenhouConfig import account_names, directory_name
-import TenhouDecoder
+from TenhouConfig import account_names
+import TenhouArchive
+from TenhouSearch import LogFilter
+import TenhouServer
 
 parser = argparse.ArgumentParser()
 parser.add_argument(
     '--since',
-    help='date in yyyymmdd format: only include games since this date, exclusive',
+    help='date in yyyymmdd format: only include games since this date, inclusive',
     action='store')
 parser.add_argument(
     '--before',
-    help='date in yyyymmdd format: only include games before this date, inclusive',
+    help='date in yyyymmdd format: only include games before this date, exclusive',
     action='store')
 parser.add_argument(
     '--player',
@@ -36,6 +38,46 @@ parser.add_argument(
     '--freetext',
     help='search for text in any part of the log',
     action='store')
+parser.add_argument(
+    '--wait',
+    help='hand shape: the hand waited on exactly these tiles, in mpsz notation, e.g. "14m"',
+    action='store')
+parser.add_argument(
+    '--contains',
+    help='hand shape: the hand held at least these tiles, in mpsz notation, e.g. "55z789p"',
+    action='store')
+parser.add_argument(
+    '--shape',
+    help='hand shape: the hand was tenpai for this form',
+    choices=('regular', 'chiitoitsu', 'kokushi'),
+    action='store')
+parser.add_argument(
+    '--outcome',
+    help='hand shape: what happened to the hand, from the point of view of the account searched',
+    choices=('won', 'dealt-in', 'tenpai', 'other'),
+    action='store')
+parser.add_argument(
+    '--riichi',
+    help='hand shape: the hand was in riichi',
+    action='store_true')
+parser.add_argument(
+    '--limit',
+    help='stop after this many matching games',
+    type=int,
+    action='store')
+parser.add_argument(
+    '-j', '--jobs',
+    help='number of worker processes to search with (default: one per core)',
+    type=int,
+    default=os.cpu_count() or 1,
+    action='store')
+parser.add_argument(
+    '--server',
+    help='run the query on the log server listening on this socket (see serveLogs.py), '
+         'instead of loading the archives here (default socket: %s)' % TenhouServer.DEFAULT_SOCKET,
+    nargs='?',
+    const=TenhouServer.DEFAULT_SOCKET,
+    action='store')
 group = parser.add_mutually_exclusive_group()
 group.add_argument(
     '--sanma',
@@ -46,72 +88,24 @@ group.add_argument(
     help='show no sanma (three-player) games',
     action='store_true')
 
-args = parser.parse_args()
-gamecount = 0
-matchedLogs = []
-
-targetYaku = ''
-targetText = ''
-
-def searchForFreeText(log):
-    return targetText in log['content'].decode().lower()
-    
-def searchForYaku(log):
-    game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=True)
-    game.decode(log['content'].decode())    
-    for round in game.rounds:
-        for agari in round.agari:
-            if hasattr(agari, 'yaku'):
-                for yaku, han in agari.yaku:
-                    if yaku.lower() == targetYaku:
-                        return True
-            if hasattr(agari, 'yakuman'):
-                for yakuman in agari.yakuman:
-                    if yakuman.lower() == targetYaku:
-                        return True
-    return False
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.server:
+        sys.exit(TenhouServer.forward(args.server, __file__, sys.argv[1:]))
+    search = LogFilter(args)
+    gamecount = 0
 
-if args.yaku:
-    targetYaku = args.yaku.lower()
-if args.freetext:
-    targetText = args.freetext.lower()
-
-for player in account_names:
-    with lzma.open(directory_name + player + '.pickle.7z', 'rb') as infile:
-        logs = pickle.load(infile)
-
-    for key, log in logs.items():
-        if args.since and args.since > key[0:8]:
-            continue
-        if args.before and args.before <= key[0:8]:
-            continue
-        if args.sanma and not '' in log['uname']:
-            continue
-        if args.no_sanma and '' in log['uname']:
-            continue
-        if args.lobby and args.lobby != str(log['lobby']):
-            continue
-        if args.player:
-            players = args.player.split(' ')
-            hasPlayer = False
-            for player in players:
-                if player in log['uname']:
-                    hasPlayer = True
-                    break
-            if not hasPlayer:
-                continue
-        if args.freetext and not searchForFreeText(log):
-            continue            
-        if args.yaku and not searchForYaku(log):
-            continue
-        
-        gamecount += 1
-        matchedLogs.append(log)
-
-print('Found %d games' % gamecount)
-
-if gamecount > 0:
     print('Log                             | Results')
     print('--------------------------------|--------------------------------')
-    for log in matchedLogs:
-        print('%s | %s' % (log['log'], log['players']))
\ No newline at end of file
+    for player in account_names:
+        remaining = None if args.limit is None else args.limit - gamecount
+        if remaining is not None and remaining <= 0:
+            break
+        logs = TenhouArchive.load(player)
+        search.prepare(player, logs)
+        for row in TenhouArchive.ordered_map(
+                search.row, list(logs.items()), args.jobs, remaining, prepare=search.prepare_shard):
+            print(row, flush=True)
+            gamecount += 1
+
+    print('Found %d games' % gamecount)
@@ -0,0 +1,31 @@
+"""
+keep the archives loaded, and answer searchLogs.py and analyseMyLogs.py
+queries run with --server, over a Unix domain socket
+"""
+
+# core libraries
+import argparse
+
+# own imports
+from TenhouConfig import account_names
+import TenhouServer
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user whose archives to load at the start, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '-s', '--socket',
+    help='path of the socket to listen on (default: %s)' % TenhouServer.DEFAULT_SOCKET,
+    default=TenhouServer.DEFAULT_SOCKET,
+    action='store')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    try:
+        TenhouServer.serve(args.socket, args.user)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,63 @@
+"""
+decode and show one round of a stored game, without decoding the rest of it
+"""
+
+# core libraries
+import argparse
+import sys
+
+# third-party libraries
+import yaml
+
+# own imports
+from TenhouConfig import account_names
+import TenhouArchive
+import TenhouRounds
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    'key',
+    help='the game key, e.g. 2019010100gm-00a9-0000-abcdef01')
+parser.add_argument(
+    'round',
+    help='the round: its position in the game (0 for the first), '
+         'or its name and honba, e.g. 南3 or 南3-1',
+    nargs='?',
+    action='store')
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user whose archives to look in, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '--no-draws',
+    help='leave out the draws and discards',
+    action='store_true')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    log = None
+    for player in args.user:
+        log = TenhouArchive.load(player).get(args.key)
+        if log is not None:
+            break
+    if log is None:
+        sys.exit('%s is not in the archives' % args.key)
+
+    rounds = TenhouRounds.get_rounds(log)
+    if args.round is None:
+        # list the rounds to choose from
+        for position, (name, honba, dealer) in enumerate(zip(rounds['name'], rounds['honba'], rounds['dealer'])):
+            print('%d: %s-%d, dealer %d' % (position, name, honba, dealer))
+        sys.exit(0)
+    try:
+        if args.round.lstrip('-').isdigit():
+            position = int(args.round)
+        else:
+            name, _, honba = args.round.partition('-')
+            position = TenhouRounds.find_round(log, name, int(honba or 0))
+        game = TenhouRounds.decode_round(log, position, args.no_draws)
+    except (KeyError, IndexError, ValueError):
+        sys.exit('%s has no round %s' % (args.key, args.round))
+    yaml.dump(game.asdata(), sys.stdout, default_flow_style=False, allow_unicode=True)
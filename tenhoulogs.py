@@ -13,6 +13,7 @@ from collections import OrderedDict
 from itertools import chain
 import json
 import lzma
+import os
 import pickle
 from types import SimpleNamespace
 import urllib
@@ -21,6 +22,11 @@ from lxml import etree
 import portalocker
 import requests
 
+import TenhouCache
+import TenhouMetrics
+import TenhouPatterns
+import TenhouRounds
+
 class TenhouLogs():
     """
             stores tenhou logs
@@ -39,54 +45,92 @@ class TenhouLogs():
         self._lockfile = None
         self.logs = OrderedDict()
         self.pickle_file = outdir + username + '.pickle.7z'
+        # finished games never change, so downloads are cached between runs.
+        # args.cache_size is in MB, 0 for no cache
+        cache_size = getattr(args, 'cache_size', None)
+        cache_size = TenhouCache.DEFAULT_SIZE if cache_size is None else cache_size * 1024 * 1024
+        self._cache = TenhouCache.ResponseCache(outdir + 'mjlog-cache.sqlite', cache_size) if cache_size else None
 
 
-    def _get_rates(self, xml, key):
+    @staticmethod
+    def _get_rates(xml, key, username, log):
         """
                 for one game, get the R for each player at the start of the game,
-                and the player names, and add them into the OrderedDict
+                and the player names, and add them into the log
         """
         players = xml.find('UN').attrib
         ratestrings = players['rate'].split(',')
         rates = [float(x) for x in ratestrings]
-        self.logs[key]['meanrate'] = sum(rates)/len(rates)
+        log['meanrate'] = sum(rates)/len(rates)
         names = []
         found_player = False
         for j in range(0, 4):
             nextname = urllib.parse.unquote(players['n%d' % j])
             names.append(nextname)
-            if nextname == self.username:
-                self.logs[key]['rate'] = rates[j]
+            if nextname == username:
+                log['rate'] = rates[j]
                 found_player = True
         if found_player:
-            self.logs[key]['uname'] = names
+            log['uname'] = names
         else:
             print('ignoring, player not in %s' % ','.join(names))
-            del self.logs[key]
 
         return found_player
 
 
+    @staticmethod
+    def parse_xml(text):
+        """ parse mjlog text, recovering what it can from broken files """
+        return etree.XML(text, etree.XMLParser(recover=True)).getroottree().getroot()
+
+
+    @staticmethod
+    def fill_log(xml, key, text, username, log):
+        """
+                add the rates, names, scores, place, hand shape index and round
+                index of a parsed game into its log. False if the player is not in the game
+        """
+        if not TenhouLogs._get_rates(xml, key, username, log):
+            return False
+        with TenhouMetrics.stage('scores'):
+            TenhouLogs._process_scores(xml, key, username, log)
+        try:
+            with TenhouMetrics.stage('shapes'):
+                log['shapes'] = TenhouPatterns.index_game(text)
+        except:
+            print('failed to index hand shapes in %s' % key)
+        try:
+            with TenhouMetrics.stage('rounds'):
+                log['round_index'] = TenhouRounds.index_rounds(text)
+        except:
+            print('failed to index rounds in %s' % key)
+        return True
+
+
     def _load_from_text(self, key, text):
         """ takes an mjlog text string in, and stores it as an xml object """
         try:
-            xml = etree.XML(text, etree.XMLParser(recover=True)).getroottree().getroot()
+            with TenhouMetrics.stage('parse'):
+                xml = self.parse_xml(text)
+            TenhouMetrics.count('bytes.parsed', len(text))
         except:
             print('failed to parse xml in %s' % key)
             print(text)
             return
-        if not self._get_rates(xml, key):
+        if not self.fill_log(xml, key, text, self.username, self.logs[key]):
+            del self.logs[key]
             return
         self._flags.have_new = True
-        self._process_scores(xml, key)
+        TenhouMetrics.count('games.added')
 
 
-    def _process_scores(self, xml, key):
+    @staticmethod
+    def _process_scores(xml, key, username, log):
         """
         for one game, get the scores for each player,
         rank them in descending order,
         and compile into a string to match nodocchi.moe
-        Add this into the self record
+        Add this into the log
         """
         xml_scores = xml.find('AGARI[@owari][last()]')
         draw_test = xml.find('RYUUKYOKU[@owari][last()]')
@@ -95,18 +139,18 @@ class TenhouLogs():
         if xml_scores is None:
             xml_scores = draw_test
         if xml_scores is not None:
-            self.logs[key]['sc'] = xml_scores.attrib['owari']
+            log['sc'] = xml_scores.attrib['owari']
 
         # take only the 0,2,4,6th elements of score
-        scores = [float(x) for x in self.logs[key]['sc'].split(',')][1::2]
+        scores = [float(x) for x in log['sc'].split(',')][1::2]
         sortedscores = sorted(scores, reverse=True)
-        sortedplayers = sorted(self.logs[key]['uname'],
+        sortedplayers = sorted(log['uname'],
                                reverse=True,
-                               key=lambda x: scores[self.logs[key]['uname'].index(x)])
-        self.logs[key]['place'] = sortedplayers.index(self.username) + 1
-        self.logs[key]['players'] = ''
+                               key=lambda x: scores[log['uname'].index(x)])
+        log['place'] = sortedplayers.index(username) + 1
+        log['players'] = ''
         for i, player in enumerate(sortedplayers):
-            self.logs[key]['players'] += '%s(%s%.1f)' % (
+            log['players'] += '%s(%s%.1f)' % (
                 player,
                 "+" if sortedscores[i] > 0 else "",
                 sortedscores[i])
@@ -133,16 +177,9 @@ class TenhouLogs():
             del self.logs[key]
             return
 
-        if not self._flags.no_web:
-            print('gathering game: %s' % key)
-            loghttp = requests.get(
-                self.GAMEURL % key,
-                headers={'referer': 'http://tenhou.net/3/', 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:65.0) Gecko/20100101 Firefox/65.0'}
-            )
-            if loghttp.ok:
-                self.logs[key]['content'] = loghttp.content
-            else:
-                print('WARNING: failed to download %s' % key)
+        content = self._download(key)
+        if content is not None:
+            self.logs[key]['content'] = content
         if 'content' not in self.logs[key] or self.logs[key]['content'] == '':
             del self.logs[key]
             return
@@ -150,6 +187,37 @@ class TenhouLogs():
         self._load_from_text(key, self.logs[key]['content'])
 
 
+    def _download(self, key):
+        """
+                the mjlog of a game, from the response cache if it is there
+                (even with no_web), else from tenhou.net. None if neither has it
+        """
+        if self._cache is not None:
+            with TenhouMetrics.stage('cache'):
+                content = self._cache.get(key)
+            if content is not None:
+                TenhouMetrics.count('cache.hits')
+                return content
+            TenhouMetrics.count('cache.misses')
+        if self._flags.no_web:
+            return None
+        print('gathering game: %s' % key)
+        with TenhouMetrics.stage('fetch'):
+            loghttp = requests.get(
+                self.GAMEURL % key,
+                headers={'referer': 'http://tenhou.net/3/', 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:65.0) Gecko/20100101 Firefox/65.0'}
+            )
+        if not loghttp.ok:
+            TenhouMetrics.count('fetch.failures')
+            print('WARNING: failed to download %s' % key)
+            return None
+        TenhouMetrics.count('games.fetched')
+        TenhouMetrics.count('bytes.fetched', len(loghttp.content))
+        if self._cache is not None and TenhouCache.is_mjlog(loghttp.content):
+            self._cache.put(key, loghttp.content)
+        return loghttp.content
+
+
     def _find_place_and_rate(self, this_log, key_index, logkeys):
         """
         given a particular log, find our score, and check the R rates are consistent
@@ -186,6 +254,11 @@ class TenhouLogs():
         """
                  write out rates csv for excel file
         """
+        with TenhouMetrics.stage('csv'):
+            self._write_csv()
+
+
+    def _write_csv(self):
         redo = True
         if self._flags.need_to_sort:
             print('running re-sort')
@@ -201,6 +274,7 @@ class TenhouLogs():
             for key_index, key in enumerate(logkeys):
                 this_log = self.logs[key]
                 if self._find_place_and_rate(this_log, key_index, logkeys):
+                    TenhouMetrics.count('csv.reorder_restarts')
                     redo = True
                     break
                 this_hour = key[8:10]
@@ -278,8 +352,9 @@ class TenhouLogs():
         """
         self._lockfile = portalocker.Lock(self._lockfile, timeout=10)
         try:
-            with lzma.open(self.pickle_file, 'rb') as infile:
+            with TenhouMetrics.stage('load'), lzma.open(self.pickle_file, 'rb') as infile:
                 self.logs = pickle.load(infile)
+            TenhouMetrics.count('bytes.loaded', os.path.getsize(self.pickle_file))
         except FileNotFoundError:
             pass
 
@@ -305,15 +380,35 @@ class TenhouLogs():
         self._guarantee_defaults()
 
 
-    def save(self):
+    def add_parsed(self, key, log):
         """
-                save sorted self
+                store a game that was parsed elsewhere (see fill_log),
+                e.g. by a bulk import running in worker processes
         """
-        self.write_csv()
+        if self.logs and key < next(reversed(self.logs)):
+            self._flags.need_to_sort = True
+        self.logs[key] = log
+        self._flags.have_new = True
+
+
+    def save(self, release=True, csv=True):
+        """
+                save sorted self. With release=False, keep the lock,
+                to save again later, e.g. after each batch of a bulk import,
+                and with csv=False, leave the rates csv until a later save
+        """
+        if csv:
+            self.write_csv()
         if self._flags.have_new:
             print('saving logs')
-            with lzma.open(self.pickle_file, 'wb') as outfile:
-                pickle.dump(self.logs, outfile, protocol=4)
+            with TenhouMetrics.stage('save'):
+                with lzma.open(self.pickle_file + '.tmp', 'wb') as outfile:
+                    pickle.dump(self.logs, outfile, protocol=4)
+                os.replace(self.pickle_file + '.tmp', self.pickle_file)
+            TenhouMetrics.count('bytes.saved', os.path.getsize(self.pickle_file))
+            self._flags.have_new = False
+        if not release:
+            return
         try:
             del self._lockfile
         except IOError:
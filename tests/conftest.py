@@ -0,0 +1,10 @@
+"""
+the modules live at the top of the repository, so make them importable
+however pytest is run
+"""
+
+# core libraries
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+"""
+write the LevelDB fixture directories that test_chrome_storage.py reads, the
+way Chrome writes its Local Storage/leveldb directory. Needs plyvel, which the
+package itself does not; run it from this directory to make them again
+"""
+
+# core libraries
+import json
+import os
+import shutil
+
+# third-party libraries
+import plyvel
+
+ORIGIN = b'_https://tenhou.net\x00'
+
+
+def latin1(text):
+    return b'\x01' + text.encode('latin-1')
+
+
+def utf16(text):
+    return b'\x00' + text.encode('utf-16le')
+
+
+def game(number):
+    # long and repetitive, so that table blocks are worth compressing
+    return json.dumps({'log': '2019010100gm-00a9-0000-%08x' % number, 'oya': number % 4,
+                       'name': 'Zoé', 'sc': [250, 0] * 4, 'padding': 'ab' * 200}, ensure_ascii=False)
+
+
+def write(directory, compact):
+    shutil.rmtree(directory, ignore_errors=True)
+    db = plyvel.DB(directory, create_if_missing=True, compression='snappy')
+    db.put(b'META:https://tenhou.net', b'\x08\x01')
+    for number in range(4):
+        db.put(ORIGIN + latin1('log%d' % number), latin1(game(number)))
+    db.put(ORIGIN + utf16('名前'), utf16('天鳳'))
+    db.put(b'_https://example.com\x00' + latin1('log0'), latin1('elsewhere'))
+    if compact:
+        db.compact_range()
+    # written after any compaction, so only in the .log
+    db.delete(ORIGIN + latin1('log2'))
+    db.put(ORIGIN + latin1('log1'), latin1('{"log": "updated"}'))
+    db.close()
+    # the lock and leveldb's own text log are not needed to read it
+    for name in ('LOCK', 'LOG'):
+        os.remove(os.path.join(directory, name))
+
+
+if __name__ == '__main__':
+    write('leveldb-log', compact=False)
+    write('leveldb-table', compact=True)
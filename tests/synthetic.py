@@ -0,0 +1,129 @@
+"""
+synthetic mjlogs for the tests: random games, which have draws, discards,
+riichi, wins and draws but no calls, and builders for hand-written rounds and
+the m attribute of their calls
+"""
+
+# core libraries
+import random
+import urllib.parse
+
+
+def header(names=('Aoi', 'Beni', 'Chie', 'Dai'), game_type=169):
+    """ the tags before the first round """
+    return ('<mjloggm ver="2.3"><SHUFFLE seed="x" ref=""/><GO type="%d" lobby="0"/>'
+            '<UN n0="%s" n1="%s" n2="%s" n3="%s" dan="10,11,12,13" rate="1800.00,1700.00,1600.00,1500.00" '
+            'sx="M,F,M,F"/><TAIKYOKU oya="0"/>' % ((game_type,) + tuple(urllib.parse.quote(name) for name in names)))
+
+
+def init(round, honba, dealer, dora, scores, hands, riichi_sticks=0):
+    """ the INIT tag of a round, scores in hundreds, hands as lists of tile IDs """
+    return '<INIT seed="%d,%d,%d,2,3,%d" ten="%s" oya="%d" %s/>' % (
+        round, honba, riichi_sticks, dora, ','.join(map(str, scores)), dealer,
+        ' '.join('hai%d="%s"' % (seat, ','.join(map(str, hand))) for seat, hand in enumerate(hands)))
+
+
+def score_changes(scores, deltas):
+    """ the sc attribute: each seat's score and change, in hundreds """
+    return ','.join('%d,%d' % pair for pair in zip(scores, deltas))
+
+
+def chi(tiles, called):
+    """ the m attribute of a chi of three tile IDs in a run, from the player on the left """
+    kind = tiles[0] // 4
+    data = ((kind // 9 * 7 + kind % 9) * 3 + called) << 10 | 0x4 | 3
+    for index, tile in enumerate(tiles):
+        data |= (tile % 4) << (3 + 2 * index)
+    return data
+
+
+def pon(tiles, called, source, added=False):
+    """
+    the m attribute of a pon of three tile IDs of a kind, in order, called from
+    a relative seat (3 left, 2 opposite, 1 right), or with added, of the kan
+    made by adding the fourth to it
+    """
+    unused = ({0, 1, 2, 3} - set(tile % 4 for tile in tiles)).pop()
+    return (tiles[0] // 4 * 3 + called) << 9 | unused << 5 | (0x10 if added else 0x8) | source
+
+
+def kan(kind, called=0, source=0):
+    """ the m attribute of an open kan of a tile kind from a relative seat, or with no source a closed kan """
+    return (kind * 4 + called) << 8 | source
+
+
+def nuki(tile):
+    """ the m attribute of a nukidora """
+    return tile << 8 | 0x20
+
+
+def random_game(rng, names):
+    """ the mjlog text of a random game, and its final scores """
+    out = [header(names)]
+    scores = [250] * 4
+    rounds = rng.randint(4, 8)
+    for number in range(rounds):
+        wall = list(range(136))
+        rng.shuffle(wall)
+        hands = [sorted(wall[seat * 13 : (seat + 1) * 13]) for seat in range(4)]
+        wall = wall[52:]
+        dealer = number % 4
+        out.append(init(number, 0, dealer, wall.pop(), scores, hands))
+        seat = dealer
+        reached = set()
+        for _ in range(rng.randint(8, 60)):
+            tile = wall.pop()
+            out.append('<%s%d/>' % ('TUVW'[seat], tile))
+            hands[seat].append(tile)
+            if seat not in reached and rng.random() < 0.03:
+                out.append('<REACH who="%d" step="1"/>' % seat)
+                out.append('<%s%d/>' % ('DEFG'[seat], hands[seat].pop(rng.randrange(len(hands[seat])))))
+                scores[seat] -= 10
+                out.append('<REACH who="%d" ten="%s" step="2"/>' % (seat, ','.join(map(str, scores))))
+                reached.add(seat)
+            else:
+                index = -1 if seat in reached else rng.randrange(len(hands[seat]))
+                out.append('<%s%d/>' % ('DEFG'[seat], hands[seat].pop(index)))
+            seat = (seat + 1) % 4
+        kind = rng.choice(['ron', 'tsumo', 'draw'])
+        deltas = [0] * 4
+        if kind == 'draw':
+            deltas = [rng.choice([-15, 15, 0]) for _ in range(4)]
+            tenpai = ' '.join('hai%d="%s"' % (seat, ','.join(map(str, hands[seat])))
+                              for seat in range(4) if deltas[seat] > 0)
+            end = '<RYUUKYOKU ba="0,0" sc="%s" %s' % (score_changes(scores, deltas), tenpai)
+        else:
+            winner = rng.randrange(4)
+            loser = winner if kind == 'tsumo' else (winner + 1 + rng.randrange(3)) % 4
+            points = rng.choice([1000, 2000, 3900, 8000])
+            deltas[winner] = points // 100 + 10 * len(reached)
+            for seat in range(4):
+                if seat != winner and (loser == winner or seat == loser):
+                    deltas[seat] = -(points // 100) if loser != winner else -(points // 300)
+            yaku = [1, 1] if winner in reached else [8, 1]
+            hand = sorted(hands[winner][:13] + [hands[winner][0] ^ 1])
+            end = ('<AGARI ba="0,0" hai="%s" machi="%d" ten="30,%d,%d" yaku="%s" doraHai="7" '
+                   'who="%d" fromWho="%d" sc="%s"' % (
+                       ','.join(map(str, hand)), hand[-1], points, 1 if points >= 8000 else 0,
+                       ','.join(map(str, yaku)), winner, loser, score_changes(scores, deltas)))
+        scores = [score + delta for score, delta in zip(scores, deltas)]
+        if number == rounds - 1:
+            end += ' owari="%s"' % ','.join('%d,%.1f' % (score, (score - 300) / 10) for score in scores)
+        out.append(end + '/>')
+    out.append('</mjloggm>')
+    return ''.join(out), scores
+
+
+def random_logs(count, seed=0, player='Aoi'):
+    """ an archive-like dict of count random games, by key, with the fields searches and exports use """
+    rng = random.Random(seed)
+    logs = {}
+    others = ['Beni', 'Chie', 'Dai', 'Emi', 'Fuji']
+    for number in range(count):
+        names = rng.sample(others, 3) + [player]
+        rng.shuffle(names)
+        text, _ = random_game(rng, names)
+        key = '2019%02d%02d%02dgm-00a9-0000-%08x' % (1 + number % 12, 1 + number % 28, number % 24, rng.getrandbits(32))
+        logs[key] = {'log': key, 'content': text.encode(), 'uname': names, 'lobby': 0,
+                     'players': ' '.join(names)}
+    return dict(sorted(logs.items()))
@@ -0,0 +1,30 @@
+"""
+date ranges and the ordered, cancellable map over archived games
+"""
+
+# own imports
+import TenhouArchive
+
+
+def _even(key, log):
+    return key if log % 2 == 0 else None
+
+
+def test_in_range():
+    key = '2019030512gm-00a9-0000-00000000'
+    assert TenhouArchive.in_range(key)
+    # the since date is included, the before date is not
+    assert TenhouArchive.in_range(key, since='20190305')
+    assert not TenhouArchive.in_range(key, since='20190306')
+    assert TenhouArchive.in_range(key, before='20190306')
+    assert not TenhouArchive.in_range(key, before='20190305')
+
+
+def test_ordered_map():
+    items = [('2019%04d' % number, number) for number in range(1, 201)]
+    wanted = [key for (key, number) in items if number % 2 == 0]
+    assert list(TenhouArchive.ordered_map(_even, items)) == wanted
+    assert list(TenhouArchive.ordered_map(_even, items, jobs=2)) == wanted
+    # stopping early cancels the shards still to run
+    assert list(TenhouArchive.ordered_map(_even, items, jobs=2, limit=5)) == wanted[:5]
+    assert list(TenhouArchive.ordered_map(_even, items, jobs=2, limit=0)) == []
@@ -0,0 +1,93 @@
+"""
+the response cache, and downloads through it from a stub server
+"""
+
+# core libraries
+import http.server
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+# third-party libraries
+import pytest
+
+# own imports
+import TenhouCache
+from tenhoulogs import TenhouLogs
+import synthetic
+
+KEY, LOG = next(iter(synthetic.random_logs(1, seed=5).items()))
+BUSY_KEY = '2019010100gm-0000-0000-busy'
+BUSY_PAGE = b'<html><body>Service Temporarily Unavailable</body></html>'
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """ a local stand-in for mjlog2xml.cgi, serving one game, that counts its requests """
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            found = self.path.endswith('?' + KEY)
+            # an error page sent as a success
+            busy = self.path.endswith('?' + BUSY_KEY)
+            self.send_response(200 if found or busy else 404)
+            self.end_headers()
+            self.wfile.write(LOG['content'] if found else BUSY_PAGE if busy else b'INVALID PATH')
+
+        def log_message(self, *args):
+            pass
+
+    stub = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    monkeypatch.setattr(TenhouLogs, 'GAMEURL', 'http://127.0.0.1:%d/3/mjlog2xml.cgi?%%s' % stub.server_port)
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+    yield hits
+    stub.shutdown()
+    stub.server_close()
+
+
+def _logger(directory):
+    return TenhouLogs(str(directory) + '/', 'Aoi', SimpleNamespace(force=False, no_web=False))
+
+
+def test_fetched_once(server, tmp_path):
+    assert _logger(tmp_path)._download(KEY) == LOG['content']
+    # a later run finds it in the cache
+    assert _logger(tmp_path)._download(KEY) == LOG['content']
+    assert len(server) == 1
+
+
+def test_error_pages_not_cached(server, tmp_path):
+    assert _logger(tmp_path)._download('2019010100gm-0000-0000-missing') is None
+    assert _logger(tmp_path)._download('2019010100gm-0000-0000-missing') is None
+    assert len(server) == 2
+
+
+def test_html_with_200_not_cached(server, tmp_path):
+    logger = _logger(tmp_path)
+    assert logger._download(BUSY_KEY) == BUSY_PAGE
+    assert BUSY_KEY not in logger._cache
+    assert _logger(tmp_path)._download(BUSY_KEY) == BUSY_PAGE
+    assert len(server) == 2
+    assert TenhouCache.ResponseCache(str(tmp_path / 'mjlog-cache.sqlite')).size() == 0
+
+
+def test_size_and_eviction(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = TenhouCache.ResponseCache(path, max_bytes=10 ** 9)
+    games = synthetic.random_logs(6, seed=6)
+    for key, log in games.items():
+        cache.put(key, log['content'])
+    # replacing an entry counts its size once
+    cache.put(KEY, LOG['content'])
+    cache.put(KEY, LOG['content'])
+    cache.discard(next(iter(games)))
+    total = sqlite3.connect(path).execute('SELECT SUM(size) FROM responses').fetchone()[0]
+    assert cache.size() == total
+    limit = cache.size() // 2
+    small = TenhouCache.ResponseCache(path, max_bytes=limit)
+    small.put('new', LOG['content'])
+    assert 'new' in small and small.size() <= limit
+    assert small.get(KEY) == LOG['content'] or KEY not in small
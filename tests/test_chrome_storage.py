@@ -0,0 +1,89 @@
+"""
+reading Chrome's localStorage from LevelDB fixture directories, made by
+fixtures/make_leveldb.py. leveldb-log has everything in its .log file;
+leveldb-table has the first writes compacted into an .ldb table with a
+Snappy-compressed block, and the later ones in its .log
+"""
+
+# core libraries
+import json
+import os
+import shutil
+
+# third-party libraries
+import pytest
+
+# own imports
+import ChromeStorage
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ORIGIN = b'_https://tenhou.net\x00'
+
+
+def _game(number):
+    return {'log': '2019010100gm-00a9-0000-%08x' % number, 'oya': number % 4,
+            'name': 'Zoé', 'sc': [250, 0] * 4, 'padding': 'ab' * 200}
+
+
+EXPECTED = {
+    'log0': _game(0),
+    'log1': {'log': 'updated'},
+    'log3': _game(3),
+}
+
+
+@pytest.mark.parametrize('name', ['leveldb-log', 'leveldb-table'])
+def test_local_storage(name):
+    items = ChromeStorage.local_storage(os.path.join(FIXTURES, name))
+    assert items.pop('名前') == '天鳳'
+    # log2 was deleted, and the example.com item is another origin's
+    assert dict((key, json.loads(value)) for (key, value) in items.items()) == EXPECTED
+
+
+def test_manifest():
+    assert ChromeStorage.live_files(os.path.join(FIXTURES, 'leveldb-log')) == (set(), 3)
+    assert ChromeStorage.live_files(os.path.join(FIXTURES, 'leveldb-table')) == ({5}, 4)
+
+
+def test_snappy_table():
+    with open(os.path.join(FIXTURES, 'leveldb-table', '000005.ldb'), 'rb') as infile:
+        data = infile.read()
+    entries = dict((key, value) for (_, kind, key, value) in ChromeStorage.table_entries(data))
+    assert len(entries) == 7
+    # the values are stored in format 1, Latin-1 after a leading byte
+    value = entries[ORIGIN + b'\x01log2']
+    assert value[:1] == b'\x01'
+    assert json.loads(ChromeStorage.decode_string(value)) == _game(2)
+    # a block that cannot hold the prefix is not read at all
+    assert len(list(ChromeStorage.table_entries(data, prefixes=(ORIGIN,)))) == 7
+    assert list(ChromeStorage.table_entries(data, prefixes=(b'zzz',))) == []
+
+
+def test_decode_string():
+    assert ChromeStorage.decode_string(b'\x01caf\xe9') == 'café'
+    assert ChromeStorage.decode_string(b'\x00' + '天鳳'.encode('utf-16le')) == '天鳳'
+    with pytest.raises(ValueError):
+        ChromeStorage.decode_string(b'\x02x')
+
+
+def test_corrupt_table(tmp_path):
+    directory = str(tmp_path / 'leveldb')
+    shutil.copytree(os.path.join(FIXTURES, 'leveldb-table'), directory)
+    path = os.path.join(directory, '000005.ldb')
+    with open(path, 'r+b') as outfile:
+        outfile.seek(20)
+        byte = outfile.read(1)
+        outfile.seek(20)
+        outfile.write(bytes([byte[0] ^ 0xff]))
+    with pytest.raises(ChromeStorage.CorruptionError):
+        ChromeStorage.local_storage(directory, copy=False)
+
+
+def test_torn_log(tmp_path):
+    # a writer still running can leave the last record cut short, which is ignored
+    directory = str(tmp_path / 'leveldb')
+    shutil.copytree(os.path.join(FIXTURES, 'leveldb-log'), directory)
+    path = os.path.join(directory, '000003.log')
+    os.truncate(path, os.path.getsize(path) - 5)
+    items = ChromeStorage.local_storage(directory, copy=False)
+    assert items['log1'] != '{"log": "updated"}'
@@ -0,0 +1,80 @@
+"""
+the columnar tables of rounds and agari, and saving them
+"""
+
+# third-party libraries
+import numpy as np
+
+# own imports
+import TenhouColumns
+import synthetic
+from synthetic import header, init, score_changes
+
+HANDS = [list(range(13 * seat, 13 * seat + 13)) for seat in range(4)]
+GAME = ''.join([
+    header(),
+    init(0, 0, 0, 130, [250] * 4, HANDS),
+    '<T52/><D52/><U56/>',
+    # a riichi and aka win, with dora and uradora listed at 0 han
+    '<AGARI ba="0,0" hai="13,14,56" machi="56" ten="30,2000,0" yaku="1,1,52,0,53,0,54,1" doraHai="130" '
+    'doraHaiUra="131" who="1" fromWho="0" sc="%s"/>' % score_changes([250] * 4, [-20, 20, 0, 0]),
+    init(1, 0, 1, 130, [230, 270, 250, 250], HANDS),
+    '<U52/>',
+    '<AGARI ba="0,0" hai="13,14,52" machi="52" ten="40,48000,5" yakuman="39" doraHai="130" '
+    'who="1" fromWho="1" sc="%s" owari="70,-33.0,750,75.0,90,-21.0,90,-21.0"/>'
+    % score_changes([230, 270, 250, 250], [-160, 480, -160, -160]),
+    '</mjloggm>',
+])
+
+
+def test_game_rows():
+    log = {'content': GAME.encode(), 'uname': ['Aoi', 'Beni', 'Chie', 'Dai']}
+    game, rounds, agaris = TenhouColumns.game_rows('2019010100gm-00a9-0000-00000001', log, 'Beni')
+    assert game == ('2019010100gm-00a9-0000-00000001', 1, 2)
+    assert [row[1:6] for row in rounds] == [(0, 0, 0, 0, 0), (1, 0, 1, 0, 0)]
+    assert rounds[0][6] == [-20, 20, 0, 0]
+    assert [row[1:8] for row in agaris] == [(0, 1, 0, 30, 2000, 0, True), (1, 1, -1, 40, 48000, 5, True)]
+    # only riichi and aka: the 0-han dora and uradora are left out of the mask
+    assert agaris[0][8:] == ((1 << 1) | (1 << 54), 2)
+    assert agaris[1][8:] == (1 << 39, 0)
+
+
+def _tables():
+    logs = synthetic.random_logs(12, seed=11)
+    return TenhouColumns.append(TenhouColumns.empty(), (
+        TenhouColumns.game_rows(key, log, 'Aoi') for key, log in logs.items()))
+
+
+def _same(first, second):
+    assert first.keys() == second.keys()
+    for table, columns in first.items():
+        assert columns.keys() == second[table].keys()
+        for column, values in columns.items():
+            assert values.dtype == second[table][column].dtype
+            assert np.array_equal(values, second[table][column])
+
+
+def test_append_renumbers():
+    tables = _tables()
+    assert len(tables['game']['key']) == 12
+    assert (tables['game']['seat'] >= 0).all()
+    # each round points at its game, and each agari at a round of the same game
+    assert np.array_equal(np.bincount(tables['round']['game'], minlength=12), tables['game']['rounds'])
+    agari = tables['agari']
+    assert np.array_equal(tables['round']['game'][agari['round']], agari['game'])
+
+
+def test_save_and_load(tmp_path):
+    tables = _tables()
+    for path in (str(tmp_path / 'tables.npz'), str(tmp_path / 'tables')):
+        assert len(TenhouColumns.load(path)['game']['key']) == 0
+        TenhouColumns.save(tables, path)
+        _same(TenhouColumns.load(path), tables)
+    _same(TenhouColumns.load(str(tmp_path / 'tables'), mmap_mode='r'), tables)
+
+
+def test_old_version_not_loaded(tmp_path, monkeypatch):
+    path = str(tmp_path / 'tables.npz')
+    TenhouColumns.save(_tables(), path)
+    monkeypatch.setattr(TenhouColumns, 'VERSION', TenhouColumns.VERSION + 1)
+    _same(TenhouColumns.load(path), TenhouColumns.empty())
@@ -0,0 +1,78 @@
+"""
+decoding, with and without the profiler, and the shared tile instances
+"""
+
+# core libraries
+import pickle
+import random
+import re
+
+# third-party libraries
+import pytest
+
+# own imports
+import TenhouDecoder
+import synthetic
+
+
+def _decode(text):
+    game = TenhouDecoder.Game('DEFAULT')
+    game.decode(text.encode())
+    return game.asdata()
+
+
+def test_profiled_decode_matches(monkeypatch):
+    text, _ = synthetic.random_game(random.Random(7), ['Aoi', 'Beni', 'Chie', 'Dai'])
+    plain = _decode(text)
+    profile = TenhouDecoder.DecoderProfile()
+    monkeypatch.setattr(TenhouDecoder.Game, 'profiler', profile)
+    assert _decode(text) == plain
+    assert _decode(text) == plain
+    assert profile.games == 2
+    assert profile.calls['parse:bytes'] == 2
+    assert profile.calls['INIT'] == 2 * len(plain['rounds'])
+    assert profile.calls['draw'] == 2 * len(re.findall(r'<[TUVW]\d', text))
+    assert profile.calls['discard'] == 2 * len(re.findall(r'<[DEFG]\d', text))
+    names = set(name for (name, _, _, _) in profile.report())
+    assert {'GO', 'UN', 'TAIKYOKU', 'draw', 'discard'} <= names
+
+
+def test_asdata_names_yaku():
+    text, _ = synthetic.random_game(random.Random(8), ['Aoi', 'Beni', 'Chie', 'Dai'])
+    game = TenhouDecoder.Game('DEFAULT')
+    game.decode(text.encode())
+    wins = [agari for round in game.rounds for agari in round.agari]
+    assert wins
+    named = [agari for round in game.asdata()['rounds'] for agari in round['agari']]
+    for agari, data in zip(wins, named):
+        assert data['yaku'] == [[TenhouDecoder.Game.yaku_name(yaku), han] for (yaku, han) in agari.yaku]
+    assert {'Riichi', 'Tanyao'} & set(name for data in named for (name, _) in data['yaku'])
+
+
+def test_tiles_interned():
+    Tile = TenhouDecoder.Tile
+    assert Tile(5) is Tile('5') is Tile(Tile(5))
+    assert Tile(135) is Tile('135')
+    assert Tile(5).asdata() == '2m1' and Tile(5) // 4 == 1
+    # outside the 136 IDs, each is a new tile, but still an int of that value
+    for value in (-1, 136, '136'):
+        tile = Tile(value)
+        assert type(tile) is Tile and tile == int(value) and tile is not Tile(value)
+    with pytest.raises(ValueError):
+        Tile('5m')
+    # tiles have no __dict__, since Data adds none
+    assert not hasattr(Tile(5), '__dict__')
+
+
+def test_tiles_pickled():
+    Tile = TenhouDecoder.Tile
+    for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+        assert pickle.loads(pickle.dumps(Tile(5), protocol)) is Tile(5)
+        tile = pickle.loads(pickle.dumps(Tile(200), protocol))
+        assert type(tile) is Tile and tile == 200
+    text, _ = synthetic.random_game(random.Random(9), ['Aoi', 'Beni', 'Chie', 'Dai'])
+    game = TenhouDecoder.Game('DEFAULT')
+    game.decode(text.encode())
+    copy = pickle.loads(pickle.dumps(game))
+    assert copy.asdata() == game.asdata()
+    assert all(tile is Tile(int(tile)) for hand in copy.rounds[0].hands for tile in hand)
@@ -0,0 +1,64 @@
+"""
+writing the discard records into shards, and carrying on after an interruption
+"""
+
+# third-party libraries
+import numpy as np
+
+# own imports
+import TenhouFeatures
+import synthetic
+from synthetic import init, kan, score_changes
+
+
+def _records(directory):
+    return TenhouFeatures.open_shard(TenhouFeatures.shard_path(directory, 0))
+
+
+def test_resume_writes_older_keys(tmp_path):
+    items = sorted(synthetic.random_logs(6, seed=1).items())
+    later, earlier = items[3:], items[:3]
+    assert TenhouFeatures.write_shard(later, str(tmp_path), 0) == 3
+    # games with older keys, added to the archive after the first run
+    assert TenhouFeatures.write_shard(items, str(tmp_path), 0) == 3
+    assert TenhouFeatures.write_shard(items, str(tmp_path), 0) == 0
+    written = _records(str(tmp_path))
+    expected = np.concatenate([TenhouFeatures.game_records(key, log) for key, log in later + earlier])
+    assert len(written) == len(expected)
+    assert sorted(set(written['key'].tolist())) == sorted(key.encode() for key, _ in items)
+
+
+def test_resume_after_torn_write(tmp_path):
+    items = sorted(synthetic.random_logs(4, seed=2).items())
+    TenhouFeatures.write_shard(items[:2], str(tmp_path), 0)
+    path = TenhouFeatures.shard_path(str(tmp_path), 0)
+    whole = _records(str(tmp_path)).copy()
+    # a crash part way through the third game: some of its records, and half its .done line
+    with open(path, 'ab') as outfile:
+        TenhouFeatures.game_records(*items[2])[:3].tofile(outfile)
+    with open(path + '.done', 'a', encoding='utf-8') as progress:
+        progress.write(items[2][0][:10])
+    assert TenhouFeatures.write_shard(items, str(tmp_path), 0) == 2
+    written = _records(str(tmp_path))
+    assert (written[: len(whole)] == whole).all()
+    expected = sum(len(TenhouFeatures.game_records(key, log)) for key, log in items)
+    assert len(written) == expected
+
+
+def test_ron_after_open_kan_deals_in():
+    # seat 1 calls a kan on the dealer's discard, and the ron on its next discard
+    # comes after the new dora indicator, which is only shown once it is discarded
+    hands = [list(range(13 * seat, 13 * seat + 13)) for seat in range(4)]
+    text = ''.join([
+        synthetic.header(),
+        init(0, 0, 0, 130, [250] * 4, hands),
+        '<T52/><D12/><N who="1" m="%d"/><U56/><E56/><DORA hai="97"/>' % kan(3, 0, 3),
+        '<AGARI ba="0,0" hai="26,27,56" machi="56" ten="30,1000,0" yaku="8,1" doraHai="130,97" '
+        'who="2" fromWho="1" sc="%s" owari="250,0.0,240,0.0,260,0.0,250,0.0"/>'
+        % score_changes([250] * 4, [0, -10, 10, 0]),
+        '</mjloggm>',
+    ])
+    records = TenhouFeatures.game_records('2019010100gm-00a9-0000-00000001', {'content': text.encode()})
+    assert records['seat'].tolist() == [0, 1]
+    assert records['discard'].tolist() == [3, 14]
+    assert records['dealt_in'].tolist() == [0, 1]
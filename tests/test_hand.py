@@ -0,0 +1,44 @@
+"""
+the batch shanten and ukeire functions give the same answers as the scalar ones
+"""
+
+# third-party libraries
+import numpy as np
+
+# own imports
+import TenhouHand
+
+HANDS = [
+    '1111m234p567s78s1z',
+    '1111m2222p3333s4z',
+    '123m456p789s1122z',
+    '1199m1199p1199s1z',
+    '19m19p19s1234567z',
+    '2345m3456p4567s7z',
+    '1111222233m444z',
+]
+
+
+def _counts(text):
+    return np.array(TenhouHand.parse(text), dtype=np.uint8)
+
+
+def test_shanten_batch_matches_scalar():
+    hands = np.array([_counts(text) for text in HANDS])
+    assert TenhouHand.shanten_batch(hands).tolist() == [TenhouHand.shanten(hand.tolist()) for hand in hands]
+
+
+def test_ukeire_batch_matches_scalar():
+    hands = np.array([_counts(text) for text in HANDS])
+    accepted, left = TenhouHand.ukeire_batch(hands)
+    for hand, row, count in zip(hands, accepted, left):
+        mask, expected = TenhouHand.ukeire(hand.tolist())
+        assert TenhouHand.mask(int(tile) for tile in np.flatnonzero(row)) == mask
+        assert count == expected
+
+
+def test_ukeire_batch_with_quads():
+    accepted, left = TenhouHand.ukeire_batch(np.array([_counts('1111m234p567s78s1z')]))
+    # the fifth 1m can't be drawn
+    assert not accepted[0, 0]
+    assert left[0] == TenhouHand.ukeire(TenhouHand.parse('1111m234p567s78s1z'))[1]
@@ -0,0 +1,53 @@
+"""
+finding and streaming games out of archives for the bulk import
+"""
+
+# core libraries
+import gzip
+import io
+import tarfile
+import zipfile
+
+# own imports
+import TenhouImport
+import synthetic
+
+
+def _tar(path, logs):
+    with tarfile.open(path, 'w:gz') as archive:
+        for key, log in logs.items():
+            data = gzip.compress(log['content'])
+            member = tarfile.TarInfo(key + '.mjlog.gz')
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+
+
+def test_tar_streamed_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(TenhouImport, 'ZIP_CHUNK', 4)
+    logs = synthetic.random_logs(10, seed=3)
+    _tar(str(tmp_path / 'games.tar.gz'), logs)
+    known = frozenset(list(logs)[:3])
+    tasks = list(TenhouImport.expand(TenhouImport.discover([str(tmp_path)]), known))
+    assert [len(members) for (_, _, members) in tasks] == [4, 3]
+    keys = [key for (_, _, members) in tasks for (key, _) in members]
+    assert keys == list(logs)[3:]
+    games = TenhouImport.run_task(tasks[0], 'Aoi')
+    assert [key for (key, log) in games if log] == keys[:4]
+
+
+def test_bad_archives_are_skipped(tmp_path, capsys):
+    logs = synthetic.random_logs(6, seed=4)
+    (tmp_path / 'bad.zip').write_bytes(b'PK not a zip')
+    with zipfile.ZipFile(str(tmp_path / 'good.zip'), 'w') as archive:
+        for key, log in list(logs.items())[:2]:
+            archive.writestr(key + '.mjlog', log['content'])
+    _tar(str(tmp_path / 'whole.tar.gz'), logs)
+    data = (tmp_path / 'whole.tar.gz').read_bytes()
+    (tmp_path / 'cut.tar.gz').write_bytes(data[: len(data) // 2])
+    tasks, _, known = TenhouImport.skip_known(TenhouImport.discover([str(tmp_path)]), frozenset())
+    keys = [key for task in TenhouImport.expand(tasks, known)
+            for (key, log) in TenhouImport.run_task(task, 'Aoi') if log]
+    # every game once, even those in the part of the cut tar that was read
+    assert sorted(keys) == sorted(logs)
+    errors = capsys.readouterr().err
+    assert 'bad.zip' in errors and 'cut.tar.gz' in errors
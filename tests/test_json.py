@@ -0,0 +1,194 @@
+"""
+converting games to the tenhou.net/6 JSON format, checked against arrays
+worked out by hand, and round-tripped back to the decoded games
+"""
+
+# core libraries
+import json
+
+# third-party libraries
+import pytest
+
+# own imports
+import TenhouDecoder
+import TenhouJson
+import synthetic
+from synthetic import chi, init, kan, nuki, pon, score_changes
+
+KEY = '2019010100gm-00a9-0000-00000001'
+
+# a hanchan of five rounds. The first has every kind of call but nukidora,
+# riichi and a double ron; then an exhaustive draw with two players tenpai, a
+# nine-terminals draw, and a non-dealer and a dealer tsumo, with honba
+HANDS = [
+    [4, 36, 37, 38, 100, 104, 108, 112, 113, 120, 124, 128, 132],
+    [5, 6, 9, 19, 40, 41, 44, 48, 55, 56, 60, 64, 72],
+    [12, 16, 20, 24, 28, 32, 80, 84, 92, 96, 116, 117, 118],
+    [1, 2, 17, 18, 45, 49, 53, 54, 57, 61, 65, 76, 77],
+]
+PLAIN = [list(range(13 * seat, 13 * seat + 13)) for seat in range(4)]
+GAME = ''.join([
+    synthetic.header(),
+    init(0, 1, 0, 130, [250] * 4, HANDS),
+    '<T39/><N who="0" m="%d"/><DORA hai="97"/><T101/><D4/>' % kan(9),
+    '<N who="1" m="%d"/><E9/>' % pon([4, 5, 6], 0, 3),
+    '<N who="2" m="%d"/><F20/>' % chi([9, 12, 16], 0),
+    '<W0/><G0/>',
+    '<T102/><REACH who="0" step="1"/><D132/><REACH who="0" ten="240,250,250,250" step="2"/>',
+    '<U68/><E55/>',
+    '<N who="3" m="%d"/><G45/>' % pon([53, 54, 55], 2, 2),
+    '<T103/><D103/><U69/><E69/><V81/><F81/>',
+    '<W52/><N who="3" m="%d"/><DORA hai="10"/><W119/><G119/>' % pon([53, 54, 55], 2, 2, added=True),
+    '<N who="2" m="%d"/><DORA hai="11"/><V85/><F85/>' % kan(29, 3, 1),
+    '<W86/><G86/><T105/><D105/><U106/><E106/>',
+    '<AGARI ba="1,1" hai="100,101,102,103,104,105,106,108,112,113" machi="106" ten="30,2900,0" '
+    'yaku="1,1,53,1,52,0" doraHai="130,97,10,11" doraHaiUra="131,98,14,15" who="0" fromWho="1" sc="%s"/>'
+    % score_changes([240, 250, 250, 250], [42, -32, 0, 0]),
+    '<AGARI ba="0,0" hai="1,2,45,49,57,61,65,86,106,119" machi="106" ten="30,1000,0" yaku="8,1" '
+    'doraHai="130,97,10,11" who="3" fromWho="1" sc="%s"/>' % score_changes([282, 218, 250, 250], [0, -10, 0, 10]),
+    init(0, 2, 0, 130, [282, 208, 250, 260], PLAIN),
+    '<T52/><D52/><U56/><E56/><V60/><F60/><W64/><G64/>',
+    '<RYUUKYOKU ba="2,0" sc="%s" hai0="0,1,2" hai3="39,40,41"/>' % score_changes(
+        [282, 208, 250, 260], [15, -15, -15, 15]),
+    init(0, 3, 0, 130, [297, 193, 235, 275], PLAIN),
+    '<T52/><RYUUKYOKU type="yao9" ba="3,0" sc="%s" hai0="0,1,2"/>' % score_changes([297, 193, 235, 275], [0] * 4),
+    init(1, 4, 1, 130, [297, 193, 235, 275], PLAIN),
+    '<U52/><E52/><V56/>',
+    '<AGARI ba="4,0" hai="26,27,56" machi="56" ten="30,2000,0" yaku="0,1,8,1" doraHai="130" '
+    'who="2" fromWho="2" sc="%s"/>' % score_changes([297, 193, 235, 275], [-9, -14, 32, -9]),
+    init(2, 0, 2, 130, [288, 179, 267, 266], PLAIN),
+    '<V52/>',
+    '<AGARI ba="0,0" hai="26,27,52" machi="52" ten="40,12000,1" yaku="0,1,7,1,52,3" doraHai="130" '
+    'who="2" fromWho="2" sc="%s" owari="248,-5.2,139,-16.1,387,48.7,226,-27.4"/>'
+    % score_changes([288, 179, 267, 266], [-40, -40, 120, -40]),
+    '</mjloggm>',
+])
+
+FIRST_ROUND = [
+    [0, 1, 0],
+    [25000, 25000, 25000, 25000],
+    [46, 37, 13, 13],
+    [46, 37, 14, 14],
+    [12, 21, 21, 21, 38, 39, 41, 42, 42, 44, 45, 46, 47],
+    [21, 38, 38, 38, 39],
+    ['212121a21', 12, 'r47', 60, 60],
+    [12, 12, 13, 15, 22, 22, 23, 24, 25, 26, 27, 28, 31],
+    ['p121212', 29, 29, 39],
+    [13, 25, 60, 60],
+    [14, 51, 16, 17, 18, 19, 33, 34, 36, 37, 43, 43, 43],
+    ['c131451', 33, '434343m43', 34],
+    [16, 60, 0, 60],
+    [11, 11, 15, 15, 23, 24, 25, 25, 26, 27, 28, 32, 32],
+    [11, '25p2525', 52, 43, 34],
+    [60, 23, '25k522525', 60, 60],
+    ['和了',
+     [4200, -3200, 0, 0], [0, 1, 0, '30符2飜2900点', '立直(1飜)', '裏ドラ(1飜)'],
+     [0, -1000, 0, 1000], [3, 1, 3, '30符1飜1000点', '断幺九(1飜)']],
+]
+
+# a sanma round with a nukidora, drawn with no one tenpai
+SANMA = ''.join([
+    synthetic.header(('Aoi', 'Beni', 'Chie', ''), 185),
+    init(0, 0, 0, 130, [350, 350, 350, 0], PLAIN[:3] + [[]]),
+    '<T120/><N who="0" m="%d"/><T121/><D121/><U56/><E56/><V60/><F60/>' % nuki(120),
+    '<RYUUKYOKU ba="0,0" sc="350,0,350,0,350,0,0,0" owari="350,15.0,350,5.0,350,-20.0,0,0.0"/>',
+    '</mjloggm>',
+])
+
+
+def _decode(text):
+    game = TenhouDecoder.Game('DEFAULT')
+    game.decode(text.encode())
+    return game
+
+
+def test_calls_and_results():
+    game = _decode(GAME)
+    data = TenhouJson.convert(game, KEY)
+    assert data['title'] == ['鳳南喰赤', '2019/01/01']
+    assert data['name'] == ['Aoi', 'Beni', 'Chie', 'Dai']
+    assert data['dan'] == ['初段', '二段', '三段', '四段']
+    assert data['ratingc'] == 'PF4'
+    assert data['sc'] == [248, -5.2, 139, -16.1, 387, 48.7, 226, -27.4]
+    assert data['log'][0] == FIRST_ROUND
+    assert [round[0] for round in data['log']] == [[0, 1, 0], [0, 2, 0], [0, 3, 0], [1, 4, 0], [2, 0, 0]]
+    assert [round[1] for round in data['log']][1:] == [
+        [28200, 20800, 25000, 26000], [29700, 19300, 23500, 27500],
+        [29700, 19300, 23500, 27500], [28800, 17900, 26700, 26600]]
+    assert [round[-1] for round in data['log']][1:] == [
+        ['流局', [1500, -1500, -1500, 1500]],
+        ['九種九牌'],
+        ['和了', [-900, -1400, 3200, -900], [2, 2, 2, '30符2飜500-1000点', '門前清自摸和(1飜)', '断幺九(1飜)']],
+        ['和了', [-4000, -4000, 12000, -4000],
+         [2, 2, 2, '満貫4000点∀', '門前清自摸和(1飜)', '平和(1飜)', 'ドラ(3飜)']],
+    ]
+    TenhouJson.replay(data)
+    TenhouJson.compare(game, data)
+
+
+def test_sanma_nukidora():
+    game = _decode(SANMA)
+    data = TenhouJson.convert(game, KEY)
+    assert data['rule']['disp'] == '鳳三南喰赤'
+    assert data['name'] == ['Aoi', 'Beni', 'Chie']
+    assert data['ratingc'] == 'PF3'
+    round = data['log'][0]
+    assert len(round) == 4 + 3 * 3 + 1
+    assert round[5:7] == [[44, 44], ['f44', 60]]
+    assert round[-1] == ['全員不聴']
+    TenhouJson.replay(data)
+    TenhouJson.compare(game, data)
+
+
+@pytest.mark.parametrize('text, parsed', [
+    ('c131451', ('chi', [13, 14, 51], 13, 3)),
+    ('p121212', ('pon', [12, 12, 12], 12, 3)),
+    ('25p2525', ('pon', [25, 25, 25], 25, 2)),
+    ('4545p45', ('pon', [45, 45, 45], 45, 1)),
+    ('434343m43', ('kan', [43, 43, 43, 43], 43, 1)),
+    ('m15151515', ('kan', [15, 15, 15, 15], 15, 3)),
+    ('25k522525', ('chakan', [25, 52, 25, 25], 25, 2)),
+    ('1515k5115', ('chakan', [15, 15, 51, 15], 15, 1)),
+    ('212121a21', ('kan', [21, 21, 21, 21], None, None)),
+    ('f44', ('nuki', [44], None, None)),
+])
+def test_parse_call(text, parsed):
+    assert TenhouJson.parse_call(text) == parsed
+
+
+@pytest.mark.parametrize('text', ['p1212', '1212p1212', 'p12m1212', 'x121212', 'p12121', '121212'])
+def test_parse_call_rejects(text):
+    with pytest.raises(ValueError):
+        TenhouJson.parse_call(text)
+
+
+def test_compare_finds_differences():
+    game = _decode(GAME)
+    for change in (
+            lambda round: round[15].__setitem__(2, '2525k5225'),  # the added kan from the wrong seat
+            lambda round: round[3].pop(),  # an uradora lost
+            lambda round: round[16][2].__setitem__(3, '30符2飜2000点'),
+            lambda round: round[1].__setitem__(0, 24000)):
+        data = json.loads(json.dumps(TenhouJson.convert(game, KEY)))
+        change(data['log'][0])
+        with pytest.raises(ValueError):
+            TenhouJson.compare(game, data)
+
+
+def test_tsumo_points_checked_against_payments():
+    game = _decode(GAME)
+    data = TenhouJson.convert(game, KEY)
+    data['log'][3][-1][2][3] = '30符2飜400-1000点'
+    with pytest.raises(ValueError, match='seat 0 pays'):
+        TenhouJson.compare(game, data)
+
+
+def test_archive_round_trip():
+    logs = synthetic.random_logs(20, seed=9)
+    logs[KEY] = {'content': GAME.encode()}
+    items = sorted(logs.items())
+    results = list(TenhouJson.convert_archive(items, jobs=1, chunk=8, check=True))
+    assert [key for (key, _, _, _) in results] == [key for (key, _) in items]
+    assert [error for (_, _, _, error) in results] == [None] * len(items)
+    text = dict((key, text) for (key, text, _, _) in results)[KEY]
+    assert json.loads(text) == TenhouJson.convert(_decode(GAME), KEY)
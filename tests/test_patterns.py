@@ -0,0 +1,36 @@
+"""
+the outcome criteria of the hand-shape search
+"""
+
+# own imports
+import TenhouPatterns
+
+
+def _index(player, won, from_player):
+    return {'round': [0], 'player': [player], 'won': [won], 'from': [from_player],
+            'riichi': [False], 'waits': [0], 'forms': [0], 'hands': bytes(34)}
+
+
+def _table(seat):
+    # a ron off seat 1, a tsumo by seat 2, and a tenpai hand of seat 3
+    games = [_index(0, True, 1), _index(2, True, -1), _index(3, False, -1)]
+    return TenhouPatterns.ShapeTable(['ron', 'tsumo', 'tenpai'], games, [seat] * 3)
+
+
+def test_dealt_in():
+    assert _table(1).matching_keys(outcome='dealt-in') == {'ron'}
+    assert _table(2).matching_keys(outcome='dealt-in') == set()
+
+
+def test_not_in_game():
+    # a tsumo has no from_player, which must not match an account that wasn't in the game
+    table = _table(-1)
+    assert table.matching_keys(outcome='dealt-in') == set()
+    assert table.matching_keys(outcome='won') == set()
+    assert table.matching_keys(outcome='other') == {'ron', 'tsumo', 'tenpai'}
+
+
+def test_won_and_other():
+    table = _table(2)
+    assert table.matching_keys(outcome='won') == {'tsumo'}
+    assert table.matching_keys(outcome='other') == {'ron', 'tenpai'}
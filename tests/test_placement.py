@@ -0,0 +1,67 @@
+"""
+the placement table: rows from game metadata, and grouping by date
+"""
+
+# third-party libraries
+import pytest
+
+# own imports
+from TenhouPlacement import PlacementStats
+
+
+def _log(place, score, points):
+    sc = ['0'] * 8
+    sc[0], sc[1] = str(score), str(points)
+    return {'uname': ['Aoi', 'Beni', 'Chie', 'Dai'], 'sc': ','.join(sc), 'place': str(place),
+            'rate': '1600.00', 'meanrate': '1700.00', 'lobby': '0000'}
+
+
+LOGS = {
+    '2019013123gm-00a9-0000-00000001': _log(1, 420, 62.0),
+    '2019020100gm-00a9-0000-00000002': _log(2, 310, 11.0),
+    '2019021523gm-00a9-0000-00000003': _log(3, 200, -10.0),
+    '2019022800gm-00a9-0000-00000004': _log(4, 70, -63.0),
+    '2019030100gm-00a9-0000-00000005': _log(1, 500, 70.0),
+}
+
+
+def _stats():
+    stats = PlacementStats('Aoi')
+    assert stats.add(LOGS) == 5
+    assert stats.add(LOGS) == 0
+    return stats
+
+
+def _keys(stats, rows):
+    return [key[-1] for key in stats.columns['key'][rows].tolist()]
+
+
+@pytest.mark.parametrize('since, before, expected', [
+    (None, None, '12345'),
+    ('20190201', None, '2345'),
+    (None, '20190301', '1234'),
+    ('20190201', '20190228', '23'),
+    ('20190201', '20190201', ''),
+])
+def test_date_range_includes_since_excludes_before(since, before, expected):
+    stats = _stats()
+    groups = stats.groups(None, since, before)
+    assert ''.join(''.join(_keys(stats, rows)) for _, rows in groups) == expected
+
+
+def test_groups_by_month():
+    stats = _stats()
+    groups = stats.groups('month', since='20190201')
+    assert [(label, _keys(stats, rows)) for label, rows in groups] == [
+        ('201902', ['2', '3', '4']), ('201903', ['5'])]
+
+
+def test_summary():
+    stats = _stats()
+    summary = stats.summary(stats.groups('month', before='20190301')[1][1])
+    assert summary['games'] == 3
+    assert summary['places'] == [0.0, 1 / 3, 1 / 3, 1 / 3]
+    assert summary['score'] == pytest.approx(19333.33, abs=0.01)
+    assert summary['points'] == pytest.approx(-62 / 3)
+    # 1700 + 200 * (10 - 4 * 3)
+    assert summary['stable_rate'] == pytest.approx(1300)
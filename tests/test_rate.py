@@ -0,0 +1,97 @@
+"""
+the R-rate formula: simulated and predicted rates against values worked out
+by hand, and against a plain game-by-game loop
+"""
+
+# third-party libraries
+import numpy as np
+import pytest
+
+# own imports
+import TenhouRate
+
+
+def _loop(places, meanrates, start_rate, start_games, seats):
+    """ the formula applied one game at a time """
+    rates = [start_rate]
+    for games, (place, meanrate) in enumerate(zip(places, meanrates), start_games):
+        factor = max(1 - 0.002 * games, 0.2)
+        rates.append(rates[-1] + factor * (TenhouRate.BASE[seats][place] + (meanrate - rates[-1]) / 40))
+    return np.array(rates)
+
+
+def _games(places, meanrates, start_games, seats, start_rate=1500.0):
+    """ a history as stored, with each game's rate rounded to two places """
+    rates = np.round(_loop(places, meanrates, start_rate, start_games, seats), 2)
+    return {
+        'place': np.array(places, dtype=np.int8),
+        'rate': rates[:-1],
+        'meanrate': np.array(meanrates, dtype=np.float64),
+    }
+
+
+def test_factor_floor():
+    assert TenhouRate.factor([0, 1, 100, 399, 400, 401, 1000]).tolist() == pytest.approx(
+        [1.0, 0.998, 0.8, 0.202, 0.2, 0.2, 0.2])
+
+
+def test_simulate_four_player():
+    # 1500 + 30; then 0.998 * (-30 + (1610 - 1530) / 40); then 0.996 * 10
+    rates = TenhouRate.simulate([1, 4, 2], [1500, 1610, 1502.056])
+    assert rates.tolist() == pytest.approx([1500, 1530, 1502.056, 1512.016])
+
+
+def test_simulate_three_player():
+    # 3rd: -30; then 0.998 * (30 + (1550 - 1470) / 40); 2nd in sanma is 0
+    rates = TenhouRate.simulate([3, 1, 2], [1500, 1550, 1501.936], seats=3)
+    assert rates.tolist() == pytest.approx([1500, 1470, 1501.936, 1501.936])
+
+
+def test_simulate_past_the_floor():
+    # after 400 games, every step is a fifth of the base
+    rates = TenhouRate.simulate([1, 4, 4], [1500, 1506, 1500], start_games=600)
+    assert rates.tolist() == pytest.approx([1500, 1506, 1500, 1494])
+
+
+@pytest.mark.parametrize('seats', [3, 4])
+def test_simulate_across_blocks(seats):
+    rng = np.random.default_rng(seats)
+    places = rng.integers(1, seats + 1, size=(3, 23))
+    meanrates = rng.normal(1700, 100, size=23)
+    rates = TenhouRate.simulate(places, meanrates, 1600, 390, seats, block=4)
+    assert rates.shape == (3, 24)
+    for row, scenario in zip(rates, places):
+        assert row == pytest.approx(_loop(scenario, meanrates, 1600, 390, seats))
+    assert rates == pytest.approx(TenhouRate.simulate(places, meanrates, 1600, 390, seats))
+    # a history of exactly two blocks, and of none
+    assert TenhouRate.simulate(places[0, :8], meanrates[:8], 1600, 390, seats, block=4) == pytest.approx(rates[0, :9])
+    assert TenhouRate.simulate(np.zeros(0, dtype=np.int8), [], 1600).tolist() == [1600]
+
+
+@pytest.mark.parametrize('seats, start_games', [(4, 0), (4, 123), (3, 37), (3, 450)])
+def test_predict_and_mismatches(seats, start_games):
+    rng = np.random.default_rng(start_games)
+    games = _games(rng.integers(1, seats + 1, size=40), np.round(rng.normal(1700, 100, size=40), 2),
+                   start_games, seats)
+    assert TenhouRate.predict(games, start_games, seats)[:-1] == pytest.approx(games['rate'][1:], abs=0.01)
+    assert TenhouRate.mismatches(games, start_games, seats).tolist() == []
+    # a stored rate that is off breaks the step into it and the step out of it
+    games['rate'][10] += 5
+    assert TenhouRate.mismatches(games, start_games, seats).tolist() == [9, 10]
+
+
+def test_predict_by_hand():
+    games = {'place': np.array([2, 3]), 'rate': np.array([1800.0, 1810.0]), 'meanrate': np.array([1600.0, 1810.0])}
+    # 0.9 * (10 + (1600 - 1800) / 40), 0.898 * -10
+    assert TenhouRate.predict(games, 50).tolist() == pytest.approx([1804.5, 1801.02])
+    # sanma: 0.9 * (0 - 5), 0.898 * -30
+    assert TenhouRate.predict(games, 50, seats=3).tolist() == pytest.approx([1795.5, 1783.06])
+
+
+@pytest.mark.parametrize('seats, start_games', [(4, 0), (4, 123), (3, 37), (3, 399)])
+def test_estimate_start_games(seats, start_games):
+    rng = np.random.default_rng(seats + start_games)
+    games = _games(rng.integers(1, seats + 1, size=60), np.round(rng.normal(1700, 100, size=60), 2),
+                   start_games, seats)
+    assert TenhouRate.estimate_start_games(games, seats) == start_games
+    assert TenhouRate.estimate_start_games(dict((name, column[:1]) for name, column in games.items()), seats) == 0
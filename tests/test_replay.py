@@ -0,0 +1,81 @@
+"""
+replaying a round through analyzers
+"""
+
+# own imports
+import TenhouDecoder
+import TenhouReplay
+from TenhouReplay import CALLED, RIICHI, TSUMOGIRI
+from synthetic import chi, header, init
+
+HANDS = [list(range(13 * seat, 13 * seat + 13)) for seat in range(4)]
+ROUND = ''.join([
+    header(),
+    init(0, 0, 0, 130, [250] * 4, HANDS),
+    '<T52/><D52/><U56/><E25/>',
+    '<N who="2" m="%d"/><F26/>' % chi([25, 28, 32], 0),
+    '<W64/><REACH who="3" step="1"/><G39/><REACH who="3" ten="250,250,250,240" step="2"/>',
+    '<T65/><D65/>',
+    '<RYUUKYOKU ba="0,0" sc="250,0,250,0,250,0,240,0"/>',
+    '</mjloggm>',
+])
+
+
+class _Recorder():
+    """ the hooks called, in order, and whether each discard was still in the hand """
+
+    def __init__(self):
+        self.calls = []
+
+
+    def start(self, replay):
+        self.calls.append(('start',))
+
+
+    def draw(self, replay, player, tile):
+        self.calls.append(('draw', player, tile))
+
+
+    def discard(self, replay, player, tile, flags):
+        self.calls.append(('discard', player, tile, flags, bool(replay.hands[player, tile // 4])))
+
+
+    def call(self, replay, player, meld):
+        self.calls.append(('call', player, meld.type))
+
+
+    def end(self, replay):
+        self.calls.append(('end',))
+
+
+def _round():
+    game = TenhouDecoder.Game('DEFAULT')
+    game.decode(ROUND.encode())
+    return game.rounds[0]
+
+
+def test_riichi_event_before_its_discard():
+    events = [(event.type, getattr(event, 'player', None)) for event in _round().events]
+    assert events[events.index(('Riichi', 3)) + 1] == ('Discard', 3)
+
+
+def test_hooks_and_flags():
+    recorder = _Recorder()
+    replay = TenhouReplay.Replay(_round()).run(recorder)
+    assert recorder.calls == [
+        ('start',),
+        ('draw', 0, 52), ('discard', 0, 52, TSUMOGIRI, True),
+        ('draw', 1, 56), ('discard', 1, 25, 0, True),
+        ('call', 2, 'chi'), ('discard', 2, 26, 0, True),
+        ('draw', 3, 64), ('discard', 3, 39, RIICHI, True),
+        ('draw', 0, 65), ('discard', 0, 65, TSUMOGIRI, True),
+        ('end',),
+    ]
+    assert replay.rivers == [[(52, TSUMOGIRI), (65, TSUMOGIRI)], [(25, CALLED)], [(26, 0)], [(39, RIICHI)]]
+    assert replay.riichi == [False, False, False, True]
+    assert replay.hands.sum(axis=1).tolist() == [13, 13, 10, 13]
+    assert [len(melds) for melds in replay.melds] == [0, 0, 1, 0]
+    # the dora indicator, the discards, and the chi's tiles from the hand
+    visible = [130, 52, 25, 28, 32, 26, 39, 65]
+    assert replay.visible.sum() == len(visible)
+    assert all(replay.visible[tile // 4] for tile in visible)
@@ -0,0 +1,93 @@
+"""
+decoding single rounds through the round index, against decoding whole games
+"""
+
+# core libraries
+import random
+
+# third-party libraries
+import pytest
+
+# own imports
+import TenhouDecoder
+import TenhouRounds
+import synthetic
+from synthetic import init, score_changes
+
+PLAIN = [list(range(13 * seat, 13 * seat + 13)) for seat in range(4)]
+
+# the dealer is tenpai at the first draw, so 東1 is played again with a honba
+REPEATS = ''.join([
+    synthetic.header(),
+    init(0, 0, 0, 130, [250] * 4, PLAIN),
+    '<T52/><D52/><RYUUKYOKU ba="0,0" sc="%s" hai0="0,1,2"/>' % score_changes([250] * 4, [30, -10, -10, -10]),
+    init(0, 1, 0, 130, [280, 240, 240, 240], PLAIN),
+    '<T52/><D52/><RYUUKYOKU ba="1,0" sc="%s" hai1="13,14,15"/>' % score_changes(
+        [280, 240, 240, 240], [-10, 30, -10, -10]),
+    init(1, 2, 1, 130, [270, 270, 230, 230], PLAIN),
+    '<U52/><E52/><RYUUKYOKU ba="2,0" sc="%s" owari="270,7.0,270,7.0,230,-7.0,230,-7.0"/>' % score_changes(
+        [270, 270, 230, 230], [0] * 4),
+    '</mjloggm>',
+])
+
+
+def _whole(content):
+    game = TenhouDecoder.Game(lang='DEFAULT', suppress_draws=False)
+    game.decode(content)
+    return game
+
+
+def test_each_round_matches_whole_game():
+    rng = random.Random(11)
+    for _ in range(20):
+        text, _ = synthetic.random_game(rng, ['Aoi', 'Beni', 'Chie', 'Dai'])
+        log = {'content': text.encode()}
+        game = _whole(log['content'])
+        whole = game.asdata()
+        rounds = TenhouRounds.get_rounds(log)
+        assert len(rounds['start']) == len(game.rounds)
+        for position, round in enumerate(game.rounds):
+            single = TenhouRounds.decode_round(log, position)
+            assert [player.asdata() for player in single.players] == [player.asdata() for player in game.players]
+            assert single.asdata()['rounds'] == [whole['rounds'][position]]
+            assert (rounds['name'][position], rounds['honba'][position]) == round.round[:2]
+            assert rounds['dealer'][position] == round.dealer
+
+
+def test_find_round():
+    log = {'content': REPEATS}
+    assert TenhouRounds.find_round(log, '東1') == 0
+    assert TenhouRounds.find_round(log, '東1', 1) == 1
+    assert TenhouRounds.find_round(log, '東2', 2) == 2
+    for name, honba in (('東2', 0), ('東1', 2), ('南1', 0)):
+        with pytest.raises(KeyError):
+            TenhouRounds.find_round(log, name, honba)
+    round = TenhouRounds.decode_round(log, TenhouRounds.find_round(log, '東1', 1)).rounds[0]
+    assert round.round == ('東1', 1, 0)
+    assert round.deltas == [-10, 30, -10, -10]
+
+
+def test_out_of_range():
+    log = {'content': REPEATS.encode()}
+    with pytest.raises(IndexError):
+        TenhouRounds.decode_round(log, 3)
+
+
+def test_stored_index_used_and_old_one_rebuilt():
+    content = REPEATS.encode()
+    index = TenhouRounds.index_rounds(content)
+    # an index saved with the log is used as it is
+    assert TenhouRounds.get_rounds({'content': content, 'round_index': index}) is index
+    stale = dict(index, version=TenhouRounds.VERSION - 1, name=['北4'] * 3)
+    assert TenhouRounds.get_rounds({'content': content, 'round_index': stale}) == index
+
+
+def test_parse_parts():
+    content = REPEATS.encode()
+    middle = len(content) // 2
+    parts = [memoryview(content)[:100], bytearray(content[100:middle]), content[middle:]]
+    root, path = TenhouDecoder.Game.parse(parts)
+    assert path == 'parts'
+    assert TenhouDecoder.Game.parse(tuple(parts))[1] == 'parts'
+    assert _whole(parts).asdata() == _whole(content).asdata()
+    assert TenhouDecoder.Game.parse([content[:middle]]) == (None, 'failed')
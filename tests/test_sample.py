@@ -0,0 +1,91 @@
+"""
+stratified samples: a full sample gives the exact counts, and a partial one
+brackets them
+"""
+
+# third-party libraries
+import numpy as np
+import pytest
+
+# own imports
+import TenhouSample
+import TenhouYaku
+import synthetic
+
+PLAYERS = ('Aoi', 'Gin')
+
+
+def _population():
+    return [(player, key, log)
+            for seed, player in enumerate(PLAYERS)
+            for key, log in synthetic.random_logs(48, seed=seed + 5, player=player).items()]
+
+
+def _counted(population, winner):
+    """ the cells counted the usual way, with one YakuCounter for each player's archive """
+    out = {}
+    for player in PLAYERS:
+        counter = TenhouYaku.count_logs([(key, log) for (who, key, log) in population if who == player],
+                                        player, winner)
+        cells = {('games',): counter.games}
+        for how in ('closed', 'opened'):
+            cells[('hands', how)] = counter.hands[how]
+            cells[('relevant', how)] = counter.relevantHands[how]
+        for row in range(len(counter.yaku_counts)):
+            for column, how in enumerate(('closed', 'opened')):
+                cells[('yaku', row, how)] = counter.yaku_counts[row, column]
+                cells[('han', row, how)] = counter.yaku_han[row, column]
+        for row in range(len(counter.riichi.NAMES)):
+            for pursuit in range(counter.riichi.PURSUITS):
+                cells[('riichi', row, pursuit)] = counter.riichi.counts[row, pursuit]
+                cells[('points', row, pursuit)] = counter.riichi.points[row, pursuit]
+        for cell, value in cells.items():
+            out[cell] = out.get(cell, 0) + int(value)
+    return out
+
+
+def test_sample_grows_without_dropping_games():
+    labels = [game % 3 for game in range(30)]
+    sample = TenhouSample.StratifiedSample(labels, seed=1)
+    first = sample.grow(0.25)
+    # at least two from each stratum, for a variance
+    assert sorted(labels[i] for i in first) == [0] * 3 + [1] * 3 + [2] * 3
+    second = sample.grow(0.5)
+    assert not set(first) & set(second)
+    assert len(first + second) == 15
+    assert sorted(first + second + sample.grow(1)) == list(range(30))
+    assert TenhouSample.StratifiedSample(labels, seed=1).grow(0.25) == first
+
+
+@pytest.mark.parametrize('winner', [True, None])
+def test_full_sample_is_exact(winner):
+    population = _population()
+    estimate = TenhouSample.sample_stats(population, winner, rate=1)
+    assert estimate.sampled() == len(population)
+    counted = _counted(population, winner)
+    assert set(cell for (cell, value) in counted.items() if value) <= estimate.cells()
+    for cell, value in counted.items():
+        total, low, high = estimate.total(cell)
+        assert (total, low, high) == pytest.approx((value, value, value))
+
+
+def test_partial_sample_brackets_the_counts():
+    population = _population()
+    estimate = TenhouSample.sample_stats(population, True, rate=0.5, seed=3)
+    assert len(population) / 2 <= estimate.sampled() < len(population)
+    counted = _counted(population, True)
+    hands = counted[('hands', 'closed')] + counted[('hands', 'opened')]
+    relevant = counted[('relevant', 'closed')] + counted[('relevant', 'opened')]
+    assert estimate.total(('games',)) == pytest.approx((len(population),) * 3)
+    for cell, value in ((('hands',), hands), (('relevant',), relevant)):
+        total, low, high = estimate.total(cell)
+        assert low <= value <= high
+        assert low < total < high
+    # the commonest yaku, as a count and as a share of the relevant hands
+    row = max((cell[1] for cell in estimate.cells() if cell[0] == 'yaku'),
+              key=lambda row: counted[('yaku', row, 'closed')] + counted[('yaku', row, 'opened')])
+    value = counted[('yaku', row, 'closed')] + counted[('yaku', row, 'opened')]
+    total, low, high = estimate.total(('yaku', row))
+    assert low <= value <= high
+    ratio, low, high = estimate.ratio(('yaku', row), ('relevant',))
+    assert low <= value / relevant <= high
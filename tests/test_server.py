@@ -0,0 +1,106 @@
+"""
+the query server: which arguments a client sends on, and the replies streamed
+back for a script run on a socket served from this process
+"""
+
+# core libraries
+import json
+import socket
+import socketserver
+import threading
+
+# third-party libraries
+import pytest
+
+# own imports
+import TenhouServer
+
+# stands in for a query script: echoes its arguments, then ends as they ask
+SCRIPT = '''
+import sys
+print('argv', sys.argv[1:])
+print('warning', file=sys.stderr)
+if '--exit' in sys.argv:
+    sys.exit(int(sys.argv[sys.argv.index('--exit') + 1]))
+if '--message' in sys.argv:
+    sys.exit('stopped')
+if '--raise' in sys.argv:
+    raise ValueError('boom')
+'''
+
+
+@pytest.mark.parametrize('argv, sent', [
+    (['-s', 'tanyao', '--server'], ['-s', 'tanyao']),
+    (['--server', '/tmp/logs.sock', '-s', 'tanyao'], ['-s', 'tanyao']),
+    (['--server', '-s', 'tanyao'], ['-s', 'tanyao']),
+    (['--server=/tmp/logs.sock', '-s', 'tanyao'], ['-s', 'tanyao']),
+    (['-s', 'tanyao', '--server', '--since', '20190101'], ['-s', 'tanyao', '--since', '20190101']),
+    (['-s', 'tanyao'], ['-s', 'tanyao']),
+])
+def test_client_argv(argv, sent):
+    assert TenhouServer.client_argv(argv) == sent
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """ the path of a socket served by a thread of this process, that runs SCRIPT as echo.py """
+    (tmp_path / 'echo.py').write_text(SCRIPT)
+    monkeypatch.setattr(TenhouServer, 'HERE', str(tmp_path))
+    monkeypatch.setattr(TenhouServer, 'SCRIPTS', ('echo.py',))
+    path = str(tmp_path / 'test.sock')
+    served = socketserver.UnixStreamServer(path, TenhouServer._Handler)
+    threading.Thread(target=served.serve_forever, daemon=True).start()
+    yield path
+    served.shutdown()
+    served.server_close()
+
+
+def _request(path, request):
+    """ the reply frames to one request, read straight off the socket """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(path)
+    with client, client.makefile('rwb') as stream:
+        stream.write((json.dumps(request) + '\n').encode())
+        stream.flush()
+        return [json.loads(line) for line in stream]
+
+
+def _text(frames, kind):
+    return ''.join(value for (name, value) in frames if name == kind)
+
+
+def test_output_streamed(server):
+    frames = _request(server, {'script': 'echo.py', 'argv': ['-s', 'tanyao']})
+    assert _text(frames, 'out') == "argv ['-s', 'tanyao', '--jobs', '1']\n"
+    assert _text(frames, 'err') == 'warning\n'
+    # each write arrives as its own frame, in order, with the exit last
+    assert frames[0] == ['out', 'argv']
+    assert frames[-1] == ['exit', 0]
+
+
+@pytest.mark.parametrize('argv, code, error', [
+    (['--exit', '3'], 3, ''),
+    (['--exit', '0'], 0, ''),
+    (['--message'], 1, ''),
+    (['--raise'], 1, 'echo.py failed: ValueError: boom\n'),
+])
+def test_exit_codes(server, argv, code, error):
+    frames = _request(server, {'script': 'echo.py', 'argv': argv})
+    assert frames[-1] == ['exit', code]
+    assert _text(frames, 'err') == 'warning\n' + error
+
+
+@pytest.mark.parametrize('request_', [
+    {'script': 'rm.py', 'argv': []},
+    {'argv': []},
+])
+def test_refused(server, request_):
+    frames = _request(server, request_)
+    assert frames[-1] == ['exit', 2]
+    assert [name for (name, _) in frames] == ['err', 'exit']
+
+
+def test_forward(server, capsys):
+    assert TenhouServer.forward(server, '/somewhere/rm.py', ['--server', server]) == 2
+    assert capsys.readouterr().err == 'the server does not run rm.py\n'
+    assert TenhouServer.forward(server + '.missing', 'echo.py', []) == 1
@@ -0,0 +1,68 @@
+"""
+the watcher keeps going past files it cannot import
+"""
+
+# core libraries
+import zipfile
+
+# own imports
+import TenhouImport
+import TenhouWatch
+import synthetic
+
+
+class _Logger():
+    """ the parts of TenhouLogs the watcher uses """
+
+    def __init__(self):
+        self.username = 'Aoi'
+        self.logs = {}
+        self.saves = 0
+
+
+    def add_parsed(self, key, log):
+        self.logs[key] = log
+
+
+    def save(self, release=True):
+        self.saves += 1
+
+
+def test_bad_files_are_skipped(tmp_path, monkeypatch):
+    logs = synthetic.random_logs(3, seed=5)
+    drop = tmp_path / 'drop'
+    drop.mkdir()
+    (drop / 'bad.zip').write_bytes(b'PK not a zip')
+    (drop / 'broken.zip').write_bytes(b'')
+    with zipfile.ZipFile(str(drop / 'good.zip'), 'w') as archive:
+        for key, log in logs.items():
+            archive.writestr(key + '.mjlog', log['content'])
+    discover = TenhouImport.discover
+
+    def failing(paths):
+        if any(path.endswith('broken.zip') for path in paths):
+            raise PermissionError('half copied')
+        return discover(paths)
+
+    monkeypatch.setattr(TenhouImport, 'discover', failing)
+    logger = _Logger()
+    watcher = TenhouWatch.Watcher([logger], drop_dirs=[str(drop)])
+    watcher.run(once=True)
+    assert sorted(logger.logs) == sorted(logs)
+    assert logger.saves == 1
+
+    # a task that fails leaves the others to be imported
+    more = synthetic.random_logs(2, seed=6)
+    for name, (key, log) in zip(['a.zip', 'b.zip'], more.items()):
+        with zipfile.ZipFile(str(drop / name), 'w') as archive:
+            archive.writestr(key + '.mjlog', log['content'])
+    run_task = TenhouImport.run_task
+
+    def failing_task(task, username):
+        if task[1].endswith('a.zip'):
+            raise ValueError('bad task')
+        return run_task(task, username)
+
+    monkeypatch.setattr(TenhouImport, 'run_task', failing_task)
+    watcher.run(once=True)
+    assert sorted(logger.logs) == sorted(list(logs) + list(more)[1:])
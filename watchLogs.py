@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Watch browser localStorage and drop directories, and add new games as they
+appear. Run with  -h  on the command line to get help
+"""
+
+# core libraries
+import argparse
+import os
+import sys
+
+# own imports
+from TenhouConfig import account_names, directory_name
+from tenhoulogs import TenhouLogs
+import TenhouWatch
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '-u', '--user',
+    nargs='+',
+    default=account_names,
+    help='ID(s) of user, space-separated if more than one',
+    action='store')
+parser.add_argument(
+    '-nf', '--no-firefox',
+    help='do not watch firefox',
+    action='store_true')
+parser.add_argument(
+    '-c', '--chrome',
+    help='watch chrome too',
+    action='store_true')
+parser.add_argument(
+    '--firefox-dir',
+    help='firefox profiles directory (default: the standard one on windows)',
+    action='store')
+parser.add_argument(
+    '--chrome-dir',
+    help='chrome Local Storage/leveldb directory (default: the standard one on windows)',
+    action='store')
+parser.add_argument(
+    '--dirs',
+    nargs='+',
+    default=[],
+    help='drop directories to watch for mjlog files and zip or tar archives',
+    action='store')
+parser.add_argument(
+    '--interval',
+    help='seconds between polls (default 2)',
+    type=float,
+    default=2.0,
+    action='store')
+parser.add_argument(
+    '--debounce',
+    help='seconds without changes before a batch is ingested (default 5)',
+    type=float,
+    default=5.0,
+    action='store')
+parser.add_argument(
+    '--once',
+    help='ingest what is there now, and stop',
+    action='store_true')
+parser.add_argument(
+    '--no-web',
+    help='do not retrieve anything from the web',
+    action='store_true')
+parser.add_argument(
+    '--cache-size',
+    help='size limit in MB of the cache of downloaded games (default 500, 0 for no cache)',
+    type=int,
+    action='store')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    args.force = False
+    firefox = chrome = None
+    if not args.no_firefox:
+        profiles = args.firefox_dir or (
+            os.path.join(os.environ['APPDATA'], 'Mozilla', 'Firefox') if sys.platform == 'win32' else None)
+        if profiles and os.path.isdir(profiles):
+            firefox = TenhouWatch.firefox_store(profiles)
+        else:
+            print('ERROR: failed to find firefox profile directory, use --firefox-dir')
+    if args.chrome:
+        chrome = args.chrome_dir or (
+            os.path.join(os.environ['LOCALAPPDATA'], 'Google', 'Chrome', 'User Data',
+                         'Default', 'Local Storage', 'leveldb') if sys.platform == 'win32' else None)
+        if not chrome:
+            print('ERROR: failed to find chrome directory, use --chrome-dir')
+
+    loggers = []
+    for one_user in args.user:
+        logger = TenhouLogs(directory_name, one_user, args)
+        logger.load()
+        loggers.append(logger)
+    watcher = TenhouWatch.Watcher(
+        loggers, firefox, chrome, [os.path.abspath(directory) for directory in args.dirs],
+        args.interval, args.debounce)
+    print('watching, end with Ctrl-C')
+    try:
+        watcher.run(args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for logger in loggers:
+            logger.save()